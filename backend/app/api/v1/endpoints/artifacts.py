@@ -0,0 +1,96 @@
+from typing import Any, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from app.api import deps
+from app.core.db import get_session
+from app.models.artifact import Artifact, ArtifactRead
+from app.models.user import User
+from app.worker.artifacts import EXTENSIONS, MEDIA_TYPES, open_artifact
+
+router = APIRouter()
+
+
+def _byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte of a single-range ``Range`` header, or None to send
+    everything (no header, or one this endpoint doesn't handle).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # "bytes=-N": the last N bytes.
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/{artifact_id}", response_model=ArtifactRead)
+def read_artifact(
+    artifact_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Get artifact by ID.
+    """
+    artifact = session.get(Artifact, artifact_id)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return artifact
+
+@router.get("/{artifact_id}/content")
+def download_artifact(
+    artifact_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+    range: Optional[str] = Header(None),
+) -> Any:
+    """
+    Download an artifact as stored (gzipped if it was compressed). Supports a
+    single ``Range: bytes=...`` range, answered with 206.
+    """
+    artifact = session.get(Artifact, artifact_id)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    try:
+        reader = open_artifact(artifact)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=410, detail="Artifact content is no longer stored")
+
+    try:
+        byte_range = _byte_range(range, reader.size)
+    except HTTPException:
+        reader.close()
+        raise
+    start, end = byte_range or (0, reader.size - 1)
+    kind, _, compressed = artifact.format.partition(".")
+    filename = f"{artifact.name}.{EXTENSIONS[kind]}" + (".gz" if compressed else "")
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{end}/{reader.size}"
+    return StreamingResponse(
+        reader.iter_bytes(start, end + 1),
+        status_code=206 if byte_range is not None else 200,
+        media_type="application/gzip" if compressed else MEDIA_TYPES[kind],
+        headers=headers,
+    )
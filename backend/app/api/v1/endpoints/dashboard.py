@@ -1,18 +1,34 @@
 from datetime import datetime, timedelta
 from typing import Any, Dict, List
 
-from fastapi import APIRouter, Depends
+import redis
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import case, func
 from sqlmodel import Session, select
 
 from app.api import deps
 from app.core.db import get_session
 from app.models.job import Job, JobStatus
 from app.models.pipeline import Pipeline, PipelineStatus
+from app.models.rollup import ALL_JOBS
 from app.models.run import JobRun
 from app.models.user import User
+from app.worker.queue_stats import queue_stats
+from app.worker.rollups import Granularity, trend
+
+# Longest window the trend endpoints serve.
+MAX_TREND_DAYS = 366
 
 router = APIRouter()
 
+# A run counts as failed when it recorded a non-zero exit code.
+_failed = func.coalesce(func.sum(case((JobRun.exit_code != 0, 1), else_=0)), 0)
+
+
+def _check_days(days: int) -> None:
+    if not 1 <= days <= MAX_TREND_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {MAX_TREND_DAYS}")
+
 
 @router.get("/summary")
 def dashboard_summary(
@@ -22,27 +38,26 @@ def dashboard_summary(
     """
     High-level summary metrics for the dashboard.
     """
-    total_jobs = session.exec(select(Job)).all()
-    total_pipelines = session.exec(select(Pipeline)).all()
+    total_jobs = session.exec(select(func.count()).select_from(Job)).one()
+    active_pipelines = session.exec(
+        select(func.count())
+        .select_from(Pipeline)
+        .where(Pipeline.status.in_([PipelineStatus.RUNNING, PipelineStatus.DEGRADED]))
+    ).one()
 
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    todays_runs = session.exec(
-        select(JobRun).where(JobRun.started_at >= today_start)
-    ).all()
+    todays_runs, failures_today = session.exec(
+        select(func.count(), _failed).select_from(JobRun).where(JobRun.started_at >= today_start)
+    ).one()
 
-    failures_today = [r for r in todays_runs if r.exit_code and r.exit_code != 0]
     failure_rate = (
-        len(failures_today) / len(todays_runs) * 100 if todays_runs else 0.0
+        failures_today / todays_runs * 100 if todays_runs else 0.0
     )
 
-    active_pipelines = [
-        p for p in total_pipelines if p.status in {PipelineStatus.RUNNING, PipelineStatus.DEGRADED}
-    ]
-
     return {
-        "total_jobs": len(total_jobs),
-        "active_pipelines": len(active_pipelines),
-        "todays_runs": len(todays_runs),
+        "total_jobs": total_jobs,
+        "active_pipelines": active_pipelines,
+        "todays_runs": todays_runs,
         "failure_rate": round(failure_rate, 2),
     }
 
@@ -54,33 +69,51 @@ def runs_per_day(
     current_user: User = Depends(deps.get_current_user),
 ) -> List[Dict[str, Any]]:
     """
-    Number of job runs per day over the last N days.
+    Number of finished job runs per day over the last N days, from the daily
+    rollups (see ``app.worker.rollups``).
     """
-    now = datetime.utcnow()
-    start = now - timedelta(days=days)
+    _check_days(days)
+    first_day = (datetime.utcnow() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    points = trend(session, Granularity.DAY, ALL_JOBS, first_day, first_day + timedelta(days=days))
+    return [
+        {"date": point["bucket_start"][:10], "total": point["total"], "failed": point["failed"]}
+        for point in points
+    ]
 
-    runs = session.exec(
-        select(JobRun).where(JobRun.started_at >= start)
-    ).all()
 
-    buckets: Dict[str, Dict[str, Any]] = {}
-    for r in runs:
-        if not r.started_at:
-            continue
-        day = r.started_at.date().isoformat()
-        if day not in buckets:
-            buckets[day] = {"date": day, "total": 0, "failed": 0}
-        buckets[day]["total"] += 1
-        if r.exit_code and r.exit_code != 0:
-            buckets[day]["failed"] += 1
-
-    # Ensure we return all days in range, even if zero
-    result: List[Dict[str, Any]] = []
-    for i in range(days):
-        day = (start + timedelta(days=i)).date().isoformat()
-        result.append(buckets.get(day, {"date": day, "total": 0, "failed": 0}))
+@router.get("/trend")
+def runs_trend(
+    granularity: Granularity = Granularity.DAY,
+    days: int = 30,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> List[Dict[str, Any]]:
+    """
+    Finished runs of all jobs per hour or day over the last N days: counts,
+    failures and durations, from the rollups.
+    """
+    _check_days(days)
+    now = datetime.utcnow()
+    return trend(session, granularity, ALL_JOBS, now - timedelta(days=days), now)
 
-    return result
+
+@router.get("/jobs/{job_id}/trend")
+def job_trend(
+    job_id: int,
+    granularity: Granularity = Granularity.DAY,
+    days: int = 30,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> List[Dict[str, Any]]:
+    """
+    Finished runs of one job per hour or day over the last N days: counts,
+    failures and durations, from the rollups.
+    """
+    _check_days(days)
+    if not session.get(Job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    now = datetime.utcnow()
+    return trend(session, granularity, job_id, now - timedelta(days=days), now)
 
 
 @router.get("/recent-runs")
@@ -116,3 +149,16 @@ def recent_runs(
     return result
 
 
+
+
+@router.get("/queues")
+def queues(
+    current_user: User = Depends(deps.get_current_user),
+) -> List[Dict[str, Any]]:
+    """
+    Depth and wait times for each worker queue, manual queues included.
+    """
+    try:
+        return queue_stats()
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Queue broker unavailable: {e}")
@@ -1,16 +1,37 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlmodel import Session, select
 
 from app.api import deps
 from app.core.db import get_session
-from app.models.job import Job, JobCreate, JobRead, JobStatus, JobType
+from app.models.artifact import Artifact, ArtifactRead
+from app.models.job import Job, JobCreate, JobRead, JobStatus, JobType, JobUpdate
 from app.models.run import JobRun, JobRunRead
 from app.models.user import User
-from app.worker.tasks import test_task, scrape_task
+from app.services.cron import check_schedule_configuration
+from app.services.job_events import publish_job_change
+from app.worker import artifacts, job_locks, registry, rollups
+from app.worker.crawl import crawl_settings
+from app.worker.rate_limit import job_limit
+from app.worker.retries import policy_from_configuration
+from app.worker.routing import MANUAL
+from app.worker.scraping import validate_configuration
 
 router = APIRouter()
 
+
+def _check_configuration(job_type: JobType, configuration: Any) -> None:
+    try:
+        policy_from_configuration(configuration)
+        job_limit(configuration)
+        job_locks.overlap_policy(configuration)
+        check_schedule_configuration(configuration)
+        if job_type == JobType.SCRAPER:
+            validate_configuration(configuration)
+            crawl_settings(configuration)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/", response_model=List[JobRead])
 def read_jobs(
     session: Session = Depends(get_session),
@@ -34,11 +55,13 @@ def create_job(
     """
     Create new job.
     """
+    _check_configuration(job_in.type, job_in.configuration)
     job = Job.from_orm(job_in)
     job.owner_id = current_user.id
     session.add(job)
     session.commit()
     session.refresh(job)
+    publish_job_change(job.id, "created")
     return job
 
 @router.get("/{job_id}", response_model=JobRead)
@@ -55,26 +78,84 @@ def read_job(
         raise HTTPException(status_code=404, detail="Job not found")
     return job
 
+@router.put("/{job_id}", response_model=JobRead)
+def update_job(
+    job_id: int,
+    job_in: JobUpdate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Update a job.
+    """
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    update_data = job_in.model_dump(exclude_unset=True)
+    _check_configuration(
+        update_data.get("type") or job.type,
+        update_data["configuration"] if "configuration" in update_data else job.configuration,
+    )
+    if "schedule" in update_data and update_data["schedule"] != job.schedule:
+        # Let the scheduler compute the next fire time for the new expression.
+        job.next_run_at = None
+    for field, value in update_data.items():
+        setattr(job, field, value)
+
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    publish_job_change(job.id, "updated")
+    return job
+
 @router.post("/{job_id}/run", response_model=JobRead)
 def run_job(
     job_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(deps.get_current_user),
+    idempotency_key: Optional[str] = Header(None),
 ) -> Any:
     """
     Trigger a job run manually.
+
+    Repeating a request with the same ``Idempotency-Key`` header doesn't
+    enqueue again. A run that the job's overlap policy doesn't admit (one is
+    already queued or running) is rejected with 409.
     """
     job = session.get(Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    # Trigger Celery task
-    if job.type == JobType.SCRAPER:
-        url = job.configuration.get("url", "https://example.com")
-        task = scrape_task.delay(job.id, url)
-    else:
-        task = test_task.delay(job.id, job.name)
-    
+
+    key = f"run:{job_id}:{idempotency_key}" if idempotency_key else None
+    if key is not None:
+        previous = job_locks.claim_idempotency_key(key)
+        if previous:
+            return job
+        if previous is not None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is already being handled")
+
+    try:
+        if not job_locks.admit(job):
+            policy = job_locks.overlap_policy(job.configuration).value
+            raise HTTPException(
+                status_code=409,
+                detail=f"Job already has a run queued or running (overlap policy '{policy}')",
+            )
+        try:
+            # Manual runs go to the priority queue, ahead of any scheduled backlog.
+            task = registry.dispatch(job, trigger=MANUAL)
+        except Exception:
+            job_locks.release_slots({job.id: 1})
+            raise
+    except Exception:
+        # Nothing was enqueued, so a retry with the same key must not be turned away.
+        if key is not None:
+            job_locks.release_idempotency_key(key)
+        raise
+    if key is not None:
+        job_locks.store_idempotency_result(key, task.id)
+
     job.status = JobStatus.RUNNING
     job.last_celery_task_id = task.id
     session.add(job)
@@ -101,6 +182,8 @@ def cancel_job(
     if job.last_celery_task_id:
         from app.worker.celery_app import celery_app
         celery_app.control.revoke(job.last_celery_task_id, terminate=True)
+    # The revoked task won't release its run lock and admission slot itself.
+    job_locks.finish_run(job)
     
     job.status = JobStatus.FAILED
     session.add(job)
@@ -132,10 +215,17 @@ def delete_job(
     ).all()
     for run in runs:
         session.delete(run)
+    stored = session.exec(select(Artifact).where(Artifact.job_id == job_id)).all()
+    for artifact in stored:
+        session.delete(artifact)
+    rollups.delete_job(session, job_id)
     
     # Then delete the job
     session.delete(job)
     session.commit()
+    job_locks.clear(job)
+    artifacts.remove_files(stored)
+    publish_job_change(job_id, "deleted")
     return {"message": "Job deleted successfully"}
 
 
@@ -156,3 +246,19 @@ def read_job_runs(
     )
     runs = session.exec(statement).all()
     return runs
+
+
+@router.get("/{job_id}/runs/{run_id}/artifacts", response_model=List[ArtifactRead])
+def read_job_run_artifacts(
+    job_id: int,
+    run_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    List the artifacts a run wrote its large outputs to (see ``/artifacts``).
+    """
+    run = session.get(JobRun, run_id)
+    if not run or run.job_id != job_id:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return artifacts.run_artifacts(session, [run.run_key])
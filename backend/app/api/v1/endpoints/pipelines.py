@@ -5,10 +5,19 @@ from sqlmodel import Session, select
 from app.api import deps
 from app.core.db import get_session
 from app.models.pipeline import Pipeline, PipelineCreate, PipelineRead, PipelineStatus
+from app.models.run import PipelineRun, PipelineRunRead, RunStatus
 from app.models.user import User
+from app.worker.pipelines import cancel_run, check_steps, start_pipeline
 
 router = APIRouter()
 
+
+def _check_steps(session: Session, steps: Any) -> None:
+    try:
+        check_steps(session, steps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/", response_model=List[PipelineRead])
 def read_pipelines(
     session: Session = Depends(get_session),
@@ -32,6 +41,7 @@ def create_pipeline(
     """
     Create new pipeline.
     """
+    _check_steps(session, pipeline_in.steps)
     pipeline = Pipeline.from_orm(pipeline_in)
     session.add(pipeline)
     session.commit()
@@ -55,20 +65,76 @@ def read_pipeline(
 @router.post("/{pipeline_id}/run", response_model=PipelineRead)
 def run_pipeline(
     pipeline_id: int,
+    refresh: bool = False,
     session: Session = Depends(get_session),
     current_user: User = Depends(deps.get_current_user),
 ) -> Any:
     """
     Trigger a pipeline run manually.
+
+    Steps run as soon as their dependencies have completed (see
+    ``app.worker.pipelines``); the run is recorded as a ``PipelineRun``.
+    Steps whose job and inputs haven't changed since a previous run reuse its
+    output instead of running, unless ``refresh`` is set.
     """
     pipeline = session.get(Pipeline, pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
-    
-    # Logic to trigger pipeline steps would go here
-    # For now, just update status
-    pipeline.status = PipelineStatus.RUNNING
-    session.add(pipeline)
-    session.commit()
+    if pipeline.status == PipelineStatus.RUNNING:
+        raise HTTPException(status_code=409, detail="Pipeline is already running")
+
+    try:
+        start_pipeline(session, pipeline, refresh=refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     session.refresh(pipeline)
     return pipeline
+
+
+@router.post("/{pipeline_id}/cancel", response_model=PipelineRead)
+def cancel_pipeline(
+    pipeline_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Cancel a pipeline's running run: its queued steps are revoked, the rest
+    are skipped, and the pipeline can be started again.
+    """
+    pipeline = session.get(Pipeline, pipeline_id)
+    if not pipeline:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    if pipeline.status != PipelineStatus.RUNNING:
+        raise HTTPException(status_code=400, detail="Pipeline is not running")
+
+    runs = session.exec(
+        select(PipelineRun).where(PipelineRun.pipeline_id == pipeline_id, PipelineRun.status == RunStatus.RUNNING)
+    ).all()
+    for run in runs:
+        cancel_run(session, run)
+    # A pipeline left RUNNING without a run (e.g. its first commit failed) is reset too.
+    session.refresh(pipeline)
+    if pipeline.status == PipelineStatus.RUNNING:
+        pipeline.status = PipelineStatus.FAILED
+        session.add(pipeline)
+        session.commit()
+        session.refresh(pipeline)
+    return pipeline
+
+@router.get("/{pipeline_id}/runs", response_model=List[PipelineRunRead])
+def read_pipeline_runs(
+    pipeline_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    List recent runs for a pipeline, with per-step status and timing.
+    """
+    statement = (
+        select(PipelineRun)
+        .where(PipelineRun.pipeline_id == pipeline_id)
+        .order_by(PipelineRun.started_at.desc())
+        .limit(50)
+    )
+    runs = session.exec(statement).all()
+    return runs
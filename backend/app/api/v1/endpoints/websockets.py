@@ -1,15 +1,12 @@
-from typing import List
+from typing import List, Optional, Tuple
 
 import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlmodel import Session
-
-from celery.result import AsyncResult
+from sqlmodel import Session, select
 
 from app.core.db import engine
-from app.models.job import Job
-from app.models.run import JobRun
-from app.worker.celery_app import celery_app
+from app.models.job import Job, JobStatus
+from app.models.run import JobRun, RunStatus
 
 router = APIRouter()
 
@@ -34,52 +31,48 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+def _job_and_last_run(job_id: int) -> Tuple[Optional[Job], Optional[JobRun]]:
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        last_run = session.exec(
+            select(JobRun).where(JobRun.job_id == job_id).order_by(JobRun.started_at.desc())
+        ).first()
+        return job, last_run
+
+
 @router.websocket("/jobs/{job_id}/logs")
 async def websocket_endpoint(websocket: WebSocket, job_id: int) -> None:
     await manager.connect(websocket)
     try:
-        # Create a new session for the websocket connection
-        task_id: str | None = None
-        with Session(engine) as session:
-            job = session.get(Job, job_id)
-            if job and job.last_celery_task_id:
-                task_id = job.last_celery_task_id
+        # Progress comes from the job and its runs, not the Celery result
+        # backend: tasks that record runs don't store results (see app.worker.results).
+        job, last_run = _job_and_last_run(job_id)
+        if not job or job.status != JobStatus.RUNNING:
+            # No active task, but we can stream the latest JobRun logs if present
+            if last_run and last_run.logs:
+                await websocket.send_text(last_run.logs)
             else:
-                # No active task, but we can stream the latest JobRun logs if present
-                last_run = (
-                    session.query(JobRun)  # type: ignore[attr-defined]
-                    .filter(JobRun.job_id == job_id)
-                    .order_by(JobRun.started_at.desc())
-                    .first()
-                )
-                if last_run and last_run.logs:
-                    await websocket.send_text(last_run.logs)
-                else:
-                    await websocket.send_text(f"Job {job_id}: No active task found.")
-                # Keep connection open but don't poll task status
-                while True:
-                    await asyncio.sleep(10)
-
-        if not task_id:
-            return
+                await websocket.send_text(f"Job {job_id}: No active task found.")
+            # Keep connection open but don't poll task status
+            while True:
+                await asyncio.sleep(10)
 
         while True:
-            result = AsyncResult(task_id, app=celery_app)
-            status = result.status
-
-            if status == "SUCCESS":
-                output = result.result
-                await websocket.send_text(f"Task Finished: {output}")
+            job, last_run = _job_and_last_run(job_id)
+            if job is None:
+                await websocket.send_text(f"Job {job_id}: deleted.")
                 break
-            if status == "FAILURE":
-                await websocket.send_text(f"Task Failed: {result.result}")
+            if job.status != JobStatus.RUNNING:
+                summary = last_run.summary if last_run else None
+                if job.status == JobStatus.FAILED:
+                    await websocket.send_text(f"Task Failed: {summary}")
+                else:
+                    await websocket.send_text(f"Task Finished: {summary}")
                 break
-            if status == "PENDING":
-                await websocket.send_text("Task Pending...")
-            elif status == "STARTED":
+            if last_run and last_run.status == RunStatus.RUNNING:
                 await websocket.send_text("Task Started...")
             else:
-                await websocket.send_text(f"Task Status: {status}")
+                await websocket.send_text("Task Pending...")
 
             await asyncio.sleep(1)
             
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "DataFlow Control"
@@ -11,8 +11,89 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str = "dataflow"
     DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
 
     REDIS_URL: str = "redis://redis:6379/0"
+
+    SCHEDULER_INTERVAL_SECONDS: int = 10
+    SCHEDULER_BATCH_SIZE: int = 500
+    SCHEDULER_MODE: str = "poll"  # "poll" or "event"
+    SCHEDULER_RESYNC_SECONDS: int = 300
+    SCHEDULER_CATCHUP_POLICY: str = "fire_once"  # "skip", "fire_once" or "fire_all"
+    SCHEDULER_CATCHUP_MAX: int = 10
+    SCHEDULER_MISFIRE_GRACE_SECONDS: int = 60
+    CRON_CACHE_SIZE: int = 1024
+    SCHEDULER_SPREAD_SECONDS: int = 0
+    SCHEDULER_HISTOGRAM_LOG_SECONDS: int = 60
+
+    SCRAPE_BATCH_SIZE: int = 50
+    SCRAPE_CONCURRENCY: int = 50
+    SCRAPE_PER_HOST_CONCURRENCY: int = 4
+    SCRAPE_HTTP2: bool = False
+    SCRAPE_TIMEOUT_SECONDS: float = 10.0
+    SCRAPE_MAX_BYTES: int = 5 * 1024 * 1024
+    SCRAPE_CHUNK_BYTES: int = 64 * 1024
+    EXTRACTION_RULES_CACHE_SIZE: int = 1024
+
+    RETRY_MAX_RETRIES: int = 2
+    RETRY_BACKOFF_SECONDS: float = 4.0
+    RETRY_MAX_BACKOFF_SECONDS: float = 60.0
+    RETRY_JITTER: float = 0.5
+    RETRY_ON_STATUS: List[int] = [429, 500, 502, 503, 504]
+
+    RATE_LIMIT_BACKEND: str = "redis"  # "redis" or "local"
+    RATE_LIMIT_HOST_PER_SECOND: float = 5.0
+    RATE_LIMIT_HOST_BURST: int = 10
+    RATE_LIMIT_HOST_CONCURRENCY: int = 8
+    RATE_LIMIT_HOSTS: Dict[str, Dict[str, Any]] = {}  # host -> {"per_second", "burst", "concurrency"}
+    RATE_LIMIT_LEASE_SECONDS: float = 60.0
+    RATE_LIMIT_CONCURRENCY_WAIT_SECONDS: float = 1.0
+    RATE_LIMIT_JITTER: float = 0.25
+
+    CRAWL_MAX_DEPTH: int = 2
+    CRAWL_MAX_PAGES: int = 100
+    CRAWL_MAX_DEPTH_LIMIT: int = 10
+    CRAWL_MAX_PAGES_LIMIT: int = 5000
+    CRAWL_MAX_FRONTIER: int = 1000
+    CRAWL_MAX_LINKS_PER_PAGE: int = 500
+    SCHEDULER_SHARDS: int = 1
+    SCHEDULER_INSTANCE_ID: Optional[str] = None
+    SCHEDULER_LEASE_SECONDS: int = 30
+    WORKER_IO_QUEUE: str = "io"
+    WORKER_IO_JOB_TYPES: List[str] = ["scraper", "api_sync"]
+    WORKER_IO_CONCURRENCY: int = 200  # coroutines in flight per worker process
+    WORKER_TYPE_QUEUES: Dict[str, str] = {}  # job type -> base queue, overriding the io/default split
+    WORKER_MANUAL_QUEUE_SUFFIX: str = ".manual"
+    # io threads hold a database connection only while they read or write,
+    # never across a fetch, so DB_POOL_SIZE + DB_MAX_OVERFLOW needs to cover
+    # the writes in flight at once rather than the io concurrency.
+    WORKER_QUEUE_OPTIONS: Dict[str, Dict[str, Any]] = {
+        "celery": {"pool": "prefork", "concurrency": 4, "prefetch_multiplier": 1},
+        "io": {"pool": "threads", "concurrency": 200, "prefetch_multiplier": 1},
+    }
+    JOB_EVENTS_BACKEND: str = "redis"  # "redis" or "local"
+    JOB_OVERLAP_POLICY: str = "skip"  # "skip", "queue_one" or "allow"
+    JOB_LOCK_BACKEND: str = "redis"  # "redis" or "local"
+    JOB_LOCK_TTL_SECONDS: float = 3600.0
+    JOB_LOCK_RETRY_SECONDS: float = 5.0
+    JOB_IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    RUN_WRITE_BEHIND: bool = False  # workers emit run events instead of writing JobRun rows
+    RUN_EVENTS_BACKEND: str = "redis"  # "redis" or "local"
+    RUN_EVENTS_BATCH_SIZE: int = 500
+    RUN_EVENTS_FLUSH_SECONDS: float = 0.5
+    CELERY_IGNORE_PERSISTED_RESULTS: bool = True  # tasks that record a JobRun store no Celery result
+    CELERY_COMPACT_RESULTS: bool = True  # (status, job_id) instead of (status, job_id, summary)
+    CELERY_RESULT_EXPIRES_SECONDS: int = 3600
+    PIPELINE_CACHE_ENABLED: bool = True
+    PIPELINE_CACHE_DIR: str = ".cache/pipeline-steps"  # shared by workers and the API
+    PIPELINE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    ARTIFACT_BACKEND: str = "local"  # only "local" so far
+    ARTIFACT_DIR: str = "artifacts"  # shared by workers and the API
+    ARTIFACT_INLINE_MAX_BYTES: int = 16 * 1024  # larger metric lists and logs become artifacts
+    ARTIFACT_COMPRESS: bool = False  # gzip; uncompressed artifacts are memory-mapped when read
     
     SECRET_KEY: str = "changethis"
     ALGORITHM: str = "HS256"
@@ -1,11 +1,79 @@
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import func, inspect, literal_column, text
 from sqlmodel import create_engine, Session, SQLModel
 from app.core.config import settings
 
-engine = create_engine(settings.assemble_db_url(), echo=True)
+logger = logging.getLogger(__name__)
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+_db_url = settings.assemble_db_url()
+engine = create_engine(_db_url, echo=True, **_engine_options(_db_url))
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+# Columns added to tables that existed before. create_all only creates
+# missing tables, so upgrade_schema adds these in place.
+ADDED_COLUMNS = [
+    ("jobrun", "attempts", "INTEGER NOT NULL DEFAULT 1"),
+    ("jobrun", "run_key", "VARCHAR"),
+]
+
+def upgrade_schema():
+    """
+    Add the columns and indexes that tables created by an earlier version
+    lack. Idempotent; runs after ``create_all``.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table in tables and column not in {c["name"] for c in inspector.get_columns(table)}:
+                logger.info(f"Adding column {table}.{column}")
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
 def init_db():
     SQLModel.metadata.create_all(engine)
+    upgrade_schema()
+
+# strftime patterns emulating date_trunc on SQLite, which lacks it, in the
+# format SQLAlchemy stores SQLite datetimes in so the results compare equal.
+_SQLITE_TRUNC = {"hour": "%Y-%m-%d %H:00:00.000000", "day": "%Y-%m-%d 00:00:00.000000"}
+
+def date_trunc(session: Session, unit: str, column: Any) -> Any:
+    """``date_trunc(unit, column)`` for GROUP BY, on Postgres or SQLite (``unit`` is "hour" or "day")."""
+    if unit not in _SQLITE_TRUNC:
+        raise ValueError(f"Unsupported date_trunc unit '{unit}'")
+    if session.get_bind().dialect.name == "sqlite":
+        return func.strftime(_SQLITE_TRUNC[unit], column)
+    # The unit is inlined: as a bound parameter, Postgres can't match the
+    # GROUP BY expression to the selected one.
+    return func.date_trunc(literal_column(f"'{unit}'"), column)
+
+def as_datetime(value: Any) -> datetime:
+    """A :func:`date_trunc` result as a datetime (SQLite returns text)."""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+if __name__ == "__main__":
+    # Upgrade the schema without starting the API, e.g. before rolling out workers.
+    import app.models  # noqa: F401
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
@@ -2,3 +2,7 @@ from .user import User, UserRole
 from .job import Job, JobType, JobStatus
 from .pipeline import Pipeline, PipelineStatus
 from .run import JobRun, JobRunRead, PipelineRun, PipelineRunRead, RunStatus
+from .scheduler import SchedulerLease, SchedulerMember
+from .scrape import ScrapeValidator
+from .artifact import Artifact, ArtifactRead
+from .rollup import RunRollupDaily, RunRollupHourly
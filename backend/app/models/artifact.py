@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+
+class ArtifactBase(SQLModel):
+    job_id: int = Field(foreign_key="job.id", index=True)
+    # The producing run's JobRun.run_key: written before a write-behind run has an id.
+    run_key: str = Field(index=True)
+    name: str
+    format: str  # "ndjson" or "text", with ".gz" when compressed
+    size_bytes: int
+    rows: Optional[int] = None
+    sha256: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Artifact(ArtifactBase, table=True):
+    """A run output kept in the artifact store; only the reference lives in the database."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    backend: str = "local"
+    key: str
+
+
+class ArtifactRead(ArtifactBase):
+    id: int
@@ -27,7 +27,7 @@ class Job(JobBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     status: JobStatus = Field(default=JobStatus.IDLE)
     last_run_at: Optional[datetime] = None
-    next_run_at: Optional[datetime] = None
+    next_run_at: Optional[datetime] = Field(default=None, index=True)
     last_duration_ms: Optional[int] = None
     last_exit_code: Optional[int] = None
     last_celery_task_id: Optional[str] = None
@@ -38,6 +38,13 @@ class Job(JobBase, table=True):
 class JobCreate(JobBase):
     pass
 
+class JobUpdate(SQLModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    type: Optional[JobType] = None
+    schedule: Optional[str] = None
+    configuration: Optional[Dict[str, Any]] = None
+
 class JobRead(JobBase):
     id: int
     status: JobStatus
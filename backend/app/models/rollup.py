@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+# job_id of the rollup rows covering all jobs.
+ALL_JOBS = 0
+
+
+class RunRollupBase(SQLModel):
+    # Not a foreign key: ALL_JOBS rows have no job.
+    job_id: int = Field(primary_key=True)
+    bucket_start: datetime = Field(primary_key=True)
+    total: int = 0
+    failed: int = 0  # non-zero exit code, as the dashboard counts them
+    duration_count: int = 0  # runs with a duration, for the average
+    duration_sum_ms: int = 0
+    duration_min_ms: Optional[int] = None
+    duration_max_ms: Optional[int] = None
+
+
+class RunRollupHourly(RunRollupBase, table=True):
+    """Finished runs per job and overall, by the hour they started in."""
+
+
+class RunRollupDaily(RunRollupBase, table=True):
+    """Finished runs per job and overall, by the day they started on."""
@@ -4,6 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
+from sqlalchemy import Index
 from sqlmodel import Column, Field, JSON, Relationship, SQLModel
 
 from .job import Job, JobStatus
@@ -27,11 +28,18 @@ class JobRunBase(SQLModel):
     exit_code: Optional[int] = None
     summary: Optional[str] = None
     logs: Optional[str] = None
+    attempts: int = Field(default=1)
     metrics: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
 
 
 class JobRun(JobRunBase, table=True):
+    # Dashboard counts filter on started_at and read exit_code; with both in
+    # the index they don't touch the table.
+    __table_args__ = (Index("ix_jobrun_started_at_exit_code", "started_at", "exit_code"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Assigned by the worker so a run can be referred to before it has an id.
+    run_key: Optional[str] = Field(default=None, unique=True, index=True)
 
     # Plain "Job" annotation avoids SQLAlchemy treating Optional[...] as a generic.
     job: Job = Relationship(back_populates="runs")
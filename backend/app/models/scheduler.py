@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+
+class SchedulerLease(SQLModel, table=True):
+    """Ownership of one scheduler shard (``Job.id % SCHEDULER_SHARDS``)."""
+
+    shard: int = Field(primary_key=True)
+    owner: Optional[str] = Field(default=None, index=True)
+    expires_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SchedulerMember(SQLModel, table=True):
+    """Heartbeat row for a running scheduler instance."""
+
+    instance_id: str = Field(primary_key=True)
+    heartbeat_at: datetime = Field(default_factory=datetime.utcnow, index=True)
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlmodel import Column, Field, JSON, SQLModel
+
+
+class ScrapeValidator(SQLModel, table=True):
+    """HTTP validators and last parsed output for a scraped URL."""
+
+    # The URL, or the URL plus requested fields for partial extractions (see cache_key).
+    url: str = Field(primary_key=True)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    # Set when the last parse only needed a prefix of the body: content_hash
+    # then covers just these first bytes.
+    hashed_bytes: Optional[int] = None
+    content_length: Optional[int] = None
+    summary: Optional[str] = None
+    logs: Optional[str] = None
+    metrics: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,81 @@
+"""
+Job change notifications.
+
+The API publishes a small message whenever a job is created, edited or
+deleted so an event-driven scheduler can wake up and re-read that job instead
+of polling the table. Messages go over Redis pub/sub; the ``local`` backend is
+an in-process queue stand-in for single-process setups and tests.
+"""
+import json
+import logging
+import queue
+from typing import Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_CHANNEL = "dataflow:jobs:changed"
+
+_local_queue: "queue.Queue[str]" = queue.Queue()
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def publish_job_change(job_id: int, action: str) -> None:
+    """Notify schedulers that ``job_id`` was created, updated or deleted.
+
+    Publishing is best-effort: the scheduler periodically resyncs, so a lost
+    message only delays a change instead of dropping it.
+    """
+    message = json.dumps({"job_id": job_id, "action": action})
+    if settings.JOB_EVENTS_BACKEND == "local":
+        _local_queue.put(message)
+        return
+    try:
+        _get_redis().publish(JOB_EVENTS_CHANNEL, message)
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish change for job {job_id}: {e}")
+
+
+class JobEventSubscriber:
+    """Blocking reader for job change messages."""
+
+    def __init__(self) -> None:
+        self._pubsub = None
+        if settings.JOB_EVENTS_BACKEND != "local":
+            self._pubsub = _get_redis().pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(JOB_EVENTS_CHANNEL)
+
+    def get(self, timeout: float) -> Optional[Tuple[int, str]]:
+        """Wait up to ``timeout`` seconds for the next change."""
+        timeout = max(timeout, 0.0)
+        if self._pubsub is None:
+            try:
+                raw = _local_queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        else:
+            message = self._pubsub.get_message(timeout=timeout)
+            if not message or message.get("type") != "message":
+                return None
+            raw = message["data"]
+
+        try:
+            payload = json.loads(raw)
+            return int(payload["job_id"]), payload.get("action", "updated")
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed job event: {raw!r}")
+            return None
+
+    def close(self) -> None:
+        if self._pubsub is not None:
+            self._pubsub.close()
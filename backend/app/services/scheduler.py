@@ -1,63 +1,432 @@
+import heapq
 import time
 import logging
-from datetime import datetime
-from croniter import croniter
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AbstractSet, Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from celery.canvas import Signature
+from sqlalchemy import true
 from sqlmodel import Session, select
+from app.core.config import settings
 from app.core.db import engine
 from app.models.job import Job, JobStatus
-from app.worker.tasks import test_task
+from app.services import cron
+from app.services.job_events import JobEventSubscriber
+from app.services.shard_leases import ShardLeaseManager
+from app.worker import job_locks, registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def check_and_enqueue_jobs():
-    with Session(engine) as session:
-        jobs = session.exec(select(Job)).all()
-        now = datetime.utcnow()
-        
-        for job in jobs:
-            if not job.schedule:
-                continue
-                
-            # Calculate next run if not set
-            if not job.next_run_at:
-                try:
-                    iter = croniter(job.schedule, now)
-                    job.next_run_at = iter.get_next(datetime)
+
+class ClaimedJob(NamedTuple):
+    job_id: int
+    name: str
+    next_run_at: Optional[datetime]
+    fires: int  # runs to enqueue under the job's catch-up policy
+
+
+class DispatchHistogram:
+    """
+    Runs enqueued per second over a sliding window.
+
+    Used to check how well spread windows flatten top-of-the-minute spikes;
+    a summary is logged every ``SCHEDULER_HISTOGRAM_LOG_SECONDS``.
+    """
+
+    def __init__(self, window_seconds: int = 3600) -> None:
+        self.window_seconds = window_seconds
+        self._buckets: Counter = Counter()
+        self._last_logged = time.time()
+
+    def record(self, runs: int, at: Optional[float] = None) -> None:
+        if runs <= 0:
+            return
+        second = int(at if at is not None else time.time())
+        self._buckets[second] += runs
+        cutoff = second - self.window_seconds
+        if min(self._buckets) < cutoff:
+            for bucket in [b for b in self._buckets if b < cutoff]:
+                del self._buckets[bucket]
+
+    def snapshot(self, since: Optional[float] = None) -> Dict[str, Any]:
+        """Dispatch-rate histogram: how many seconds saw N runs enqueued."""
+        buckets = {s: n for s, n in self._buckets.items() if since is None or s >= since}
+        rates = Counter(buckets.values())
+        total = sum(buckets.values())
+        return {
+            "total_runs": total,
+            "active_seconds": len(buckets),
+            "peak_per_second": max(buckets.values(), default=0),
+            "mean_per_active_second": round(total / len(buckets), 2) if buckets else 0.0,
+            "histogram": dict(sorted(rates.items())),
+        }
+
+    def maybe_log(self) -> None:
+        now = time.time()
+        if now - self._last_logged < settings.SCHEDULER_HISTOGRAM_LOG_SECONDS:
+            return
+        summary = self.snapshot(since=self._last_logged)
+        self._last_logged = now
+        if summary["total_runs"]:
+            logger.info(f"Dispatch rate: {summary}")
+
+
+dispatch_histogram = DispatchHistogram()
+
+
+def _spread_offset(job: Job) -> timedelta:
+    try:
+        return cron.spread_offset(job.id, job.schedule, cron.spread_window(job.configuration))
+    except (ValueError, KeyError):
+        return timedelta(0)
+
+
+def _next_runs(jobs: Iterable[Job], now: datetime) -> Dict[int, Optional[datetime]]:
+    """
+    Next dispatch time for each job, including its spread offset.
+
+    The cron slot is looked up relative to ``now - offset`` so a slot whose
+    shifted time is still ahead of ``now`` isn't skipped.
+    """
+    offsets = {job.id: (job.schedule, _spread_offset(job)) for job in jobs}
+    fires = cron.next_fire_times((expr, now - offset) for expr, offset in offsets.values())
+    result: Dict[int, Optional[datetime]] = {}
+    for job_id, (expr, offset) in offsets.items():
+        fire = fires[(expr, now - offset)]
+        result[job_id] = fire + offset if fire else None
+    return result
+
+
+def _next_run(job: Job, now: datetime) -> Optional[datetime]:
+    return _next_runs([job], now)[job.id]
+
+
+def _shard_filter(shards: Optional[AbstractSet[int]]):
+    if shards is None:
+        return true()
+    return (Job.id % settings.SCHEDULER_SHARDS).in_(sorted(shards))
+
+
+def _scheduled_jobs(shards: Optional[AbstractSet[int]] = None):
+    return select(Job).where(Job.schedule.is_not(None), Job.schedule != "", _shard_filter(shards))
+
+
+def initialize_next_runs(
+    now: datetime, batch_size: int, shards: Optional[AbstractSet[int]] = None
+) -> int:
+    """Fill in ``next_run_at`` for scheduled jobs that don't have one yet."""
+    initialized = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            jobs = session.exec(
+                _scheduled_jobs(shards)
+                .where(Job.next_run_at.is_(None), Job.id > last_id)
+                .order_by(Job.id)
+                .limit(batch_size)
+            ).all()
+            if not jobs:
+                return initialized
+
+            next_runs = _next_runs(jobs, now)
+            for job in jobs:
+                job.next_run_at = next_runs[job.id]
+                if job.next_run_at:
                     session.add(job)
-                    session.commit()
-                except Exception as e:
-                    logger.error(f"Error parsing schedule for job {job.id}: {e}")
-                    continue
-
-            # Check if due
-            if job.next_run_at and job.next_run_at <= now:
-                logger.info(f"Enqueuing job {job.id}: {job.name}")
-
-                # Enqueue task, recording run history
-                test_task.delay(job.id, job.name)
-                
-                # Update job status and next run
-                job.last_run_at = now
-                job.status = JobStatus.RUNNING
-                
-                try:
-                    iter = croniter(job.schedule, now)
-                    job.next_run_at = iter.get_next(datetime)
-                except Exception as e:
-                    logger.error(f"Error calculating next run for job {job.id}: {e}")
-                
+                    initialized += 1
+            last_id = jobs[-1].id
+            session.commit()
+
+
+def claim_due_jobs(
+    session: Session,
+    now: datetime,
+    batch_size: int,
+    shards: Optional[AbstractSet[int]] = None,
+) -> Tuple[List[ClaimedJob], List[Signature]]:
+    """
+    Claim up to ``batch_size`` due jobs in the current transaction.
+
+    Rows are locked with ``FOR UPDATE SKIP LOCKED`` (a no-op on SQLite) and
+    their ``next_run_at`` is moved past ``now`` before the caller commits, so
+    each job is claimed exactly once per due time. Fires missed while the
+    scheduler was down are resolved through the job's catch-up policy, then
+    limited by its overlap policy (see ``app.worker.job_locks``), with one
+    admission call for the whole batch.
+
+    Returns the claimed jobs and the Celery signatures to send once the
+    transaction has been committed. The claimed fires hold admission slots;
+    if the commit or the enqueue fails, give them back with
+    :func:`release_claimed`.
+    """
+    jobs = session.exec(
+        _scheduled_jobs(shards)
+        .where(Job.next_run_at <= now)
+        .order_by(Job.next_run_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    next_runs = _next_runs(jobs, now)
+    due: List[int] = []
+    for job in jobs:
+        fires = 0
+        if next_runs[job.id]:
+            # Catch-up works on unshifted cron slots.
+            offset = _spread_offset(job)
+            policy, cap = cron.catchup_policy(job.configuration)
+            fires = cron.runs_to_fire(
+                job.schedule, job.next_run_at - offset, now - offset, policy, cap
+            )
+        due.append(fires)
+
+    # Fires beyond what the job's overlap policy admits are dropped.
+    admitted = job_locks.admit_many(zip(jobs, due))
+    claimed: List[ClaimedJob] = []
+    to_run: List[Job] = []
+    for job, wanted, fires in zip(jobs, due, admitted):
+        if fires < wanted:
+            logger.info(f"Job {job.id}: skipping {wanted - fires} fire(s), previous run still queued or running")
+        if fires:
+            job.last_run_at = now
+            job.status = JobStatus.RUNNING
+            to_run.extend([job] * fires)
+        job.next_run_at = next_runs[job.id]
+        session.add(job)
+        claimed.append(ClaimedJob(job.id, job.name, job.next_run_at, fires))
+
+    # Task ids are fixed before commit so each job points at its latest task.
+    signatures: List[Signature] = []
+    try:
+        for signature, covered in registry.plan_signatures(to_run):
+            task_id = signature.freeze().id
+            for job in covered:
+                job.last_celery_task_id = task_id
+            signatures.append(signature)
+    except Exception:
+        release_claimed(claimed)
+        raise
+    return claimed, signatures
+
+
+def release_claimed(claimed: Iterable[ClaimedJob]) -> None:
+    """Give back the admission slots of claimed fires that were never enqueued."""
+    job_locks.release_slots({job.job_id: job.fires for job in claimed})
+
+
+def check_and_enqueue_jobs(
+    batch_size: Optional[int] = None,
+    shards: Optional[AbstractSet[int]] = None,
+) -> List[ClaimedJob]:
+    """
+    Enqueue every job whose ``next_run_at`` has passed.
+
+    Only due rows are read (through the ``next_run_at`` index), in batches of
+    ``batch_size`` with one transaction per batch. A batch is enqueued only
+    after its claim has been committed, as Celery groups through the job type
+    registry. ``shards`` restricts the tick to the
+    shards this instance holds leases for; ``None`` means every job.
+    """
+    batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+    if shards is not None and not shards:
+        return []
+    now = datetime.utcnow()
+    initialize_next_runs(now, batch_size, shards)
+
+    enqueued: List[ClaimedJob] = []
+    while True:
+        with Session(engine) as session:
+            claimed, signatures = claim_due_jobs(session, now, batch_size, shards)
+            try:
+                session.commit()
+                registry.enqueue_many(signatures, chunk_size=batch_size)
+            except Exception:
+                # Otherwise the slots would block these jobs until JOB_LOCK_TTL_SECONDS.
+                release_claimed(claimed)
+                raise
+        dispatch_histogram.record(sum(job.fires for job in claimed))
+        enqueued.extend(claimed)
+
+        if len(claimed) < batch_size:
+            break
+
+    if enqueued:
+        runs = sum(job.fires for job in enqueued)
+        logger.info(f"Enqueued {runs} runs for {len(enqueued)} due jobs")
+    return enqueued
+
+
+class TimerHeap:
+    """Min-heap of next fire times with lazy invalidation.
+
+    Rescheduling or removing a job leaves its old heap entry in place; stale
+    entries are recognised by comparing against ``_fire_times`` and dropped
+    when they reach the top.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[datetime, int]] = []
+        self._fire_times: Dict[int, datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self._fire_times)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._fire_times.clear()
+
+    def set(self, job_id: int, fire_at: Optional[datetime]) -> None:
+        if fire_at is None:
+            self._fire_times.pop(job_id, None)
+            return
+        self._fire_times[job_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, job_id))
+
+    def peek(self) -> Optional[datetime]:
+        while self._heap:
+            fire_at, job_id = self._heap[0]
+            if self._fire_times.get(job_id) == fire_at:
+                return fire_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        due: List[int] = []
+        while (fire_at := self.peek()) is not None and fire_at <= now:
+            _, job_id = heapq.heappop(self._heap)
+            del self._fire_times[job_id]
+            due.append(job_id)
+        return due
+
+
+class EventScheduler:
+    """
+    Scheduler that sleeps until the earliest known fire time.
+
+    Fire times are kept in a :class:`TimerHeap` loaded once at start-up and
+    kept current from job change notifications, so the database is only
+    queried when something is due, when a job changes, or on the periodic
+    resync that covers lost notifications. Only jobs in shards leased by
+    ``leases`` are tracked; the heap is rebuilt whenever ownership changes.
+    """
+
+    def __init__(
+        self,
+        subscriber: Optional[JobEventSubscriber] = None,
+        leases: Optional[ShardLeaseManager] = None,
+    ) -> None:
+        self.timers = TimerHeap()
+        self.subscriber = subscriber or JobEventSubscriber()
+        self.leases = leases or ShardLeaseManager()
+        self._next_resync = 0.0
+
+    def _owns(self, job_id: int) -> bool:
+        return job_id % self.leases.shards in self.leases.owned
+
+    def resync(self) -> None:
+        shards = self.leases.owned
+        initialize_next_runs(datetime.utcnow(), settings.SCHEDULER_BATCH_SIZE, shards)
+        self.timers.clear()
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Job.id, Job.next_run_at).where(
+                    Job.schedule.is_not(None),
+                    Job.schedule != "",
+                    Job.next_run_at.is_not(None),
+                    _shard_filter(shards),
+                )
+            ).all()
+        for job_id, next_run_at in rows:
+            self.timers.set(job_id, next_run_at)
+        self._next_resync = time.monotonic() + settings.SCHEDULER_RESYNC_SECONDS
+        logger.info(f"Scheduler resynced {len(self.timers)} timers")
+
+    def reload_job(self, job_id: int) -> None:
+        if not self._owns(job_id):
+            self.timers.set(job_id, None)
+            return
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+            if not job or not job.schedule:
+                self.timers.set(job_id, None)
+                return
+            if job.next_run_at is None:
+                job.next_run_at = _next_run(job, datetime.utcnow())
                 session.add(job)
                 session.commit()
+            self.timers.set(job_id, job.next_run_at)
 
-def run_scheduler():
-    logger.info("Starting Scheduler Service...")
-    while True:
+    def dispatch_due(self) -> None:
+        due = set(self.timers.pop_due(datetime.utcnow()))
+        for job in check_and_enqueue_jobs(shards=self.leases.owned):
+            self.timers.set(job.job_id, job.next_run_at)
+            due.discard(job.job_id)
+        # Jobs claimed elsewhere or edited since they were loaded.
+        for job_id in due:
+            self.reload_job(job_id)
+
+    def _timeout(self) -> float:
+        timeout = min(self._next_resync - time.monotonic(), self.leases.lease_seconds / 3)
+        fire_at = self.timers.peek()
+        if fire_at is not None:
+            timeout = min(timeout, (fire_at - datetime.utcnow()).total_seconds())
+        return max(timeout, 0.0)
+
+    def run_once(self) -> None:
+        if self.leases.heartbeat_due:
+            previously_owned = self.leases.owned
+            if self.leases.heartbeat() != previously_owned:
+                self._next_resync = 0.0
+        if time.monotonic() >= self._next_resync:
+            self.resync()
+
+        fire_at = self.timers.peek()
+        if fire_at is not None and fire_at <= datetime.utcnow():
+            self.dispatch_due()
+            return
+
+        dispatch_histogram.maybe_log()
+        event = self.subscriber.get(timeout=self._timeout())
+        while event is not None:
+            job_id, action = event
+            logger.info(f"Job {job_id} {action}; refreshing its timer")
+            self.reload_job(job_id)
+            event = self.subscriber.get(timeout=0)
+
+    def run_forever(self) -> None:
         try:
-            check_and_enqueue_jobs()
-        except Exception as e:
-            logger.error(f"Scheduler error: {e}")
-        time.sleep(10) # Check every 10 seconds
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Scheduler error: {e}")
+                    time.sleep(1)
+        finally:
+            self.leases.release()
+
+
+def run_scheduler():
+    leases = ShardLeaseManager()
+    logger.info(
+        f"Starting Scheduler Service {leases.instance_id} "
+        f"({settings.SCHEDULER_MODE} mode, {leases.shards} shards)..."
+    )
+    if settings.SCHEDULER_MODE == "event":
+        EventScheduler(leases=leases).run_forever()
+        return
+
+    try:
+        while True:
+            try:
+                shards = leases.heartbeat()
+                check_and_enqueue_jobs(shards=shards)
+                dispatch_histogram.maybe_log()
+            except Exception as e:
+                logger.error(f"Scheduler error: {e}")
+            time.sleep(settings.SCHEDULER_INTERVAL_SECONDS)
+    finally:
+        leases.release()
 
 if __name__ == "__main__":
     run_scheduler()
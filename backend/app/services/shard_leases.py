@@ -0,0 +1,164 @@
+"""
+Shard leases for running several scheduler instances.
+
+The job space is split into ``SCHEDULER_SHARDS`` shards by ``Job.id % shards``.
+Each instance heartbeats a ``SchedulerMember`` row and holds time-limited
+``SchedulerLease`` rows for the shards it dispatches. Leases are taken with a
+conditional UPDATE, so only one instance can hold a shard at a time; when an
+instance stops heartbeating its leases expire and the survivors pick them up.
+"""
+import logging
+import math
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, or_, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.scheduler import SchedulerLease, SchedulerMember
+
+logger = logging.getLogger(__name__)
+
+
+def default_instance_id() -> str:
+    return settings.SCHEDULER_INSTANCE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardLeaseManager:
+    def __init__(
+        self,
+        instance_id: Optional[str] = None,
+        shards: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+    ) -> None:
+        self.instance_id = instance_id or default_instance_id()
+        self.shards = shards or settings.SCHEDULER_SHARDS
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LEASE_SECONDS
+        self.owned: Set[int] = set()
+        self._last_heartbeat: Optional[datetime] = None
+
+    @property
+    def heartbeat_due(self) -> bool:
+        if self._last_heartbeat is None:
+            return True
+        elapsed = (datetime.utcnow() - self._last_heartbeat).total_seconds()
+        return elapsed >= self.lease_seconds / 3
+
+    def _ensure_shard_rows(self, session: Session) -> None:
+        existing = set(session.exec(select(SchedulerLease.shard)).all())
+        missing = [shard for shard in range(self.shards) if shard not in existing]
+        if not missing:
+            return
+        for shard in missing:
+            session.add(SchedulerLease(shard=shard, expires_at=datetime.min))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another instance created them first.
+            session.rollback()
+
+    def heartbeat(self) -> Set[int]:
+        """Renew membership and leases, rebalancing towards a fair share.
+
+        Returns the set of shards this instance owns until the next heartbeat.
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        live_after = now - timedelta(seconds=self.lease_seconds)
+
+        with Session(engine) as session:
+            self._ensure_shard_rows(session)
+
+            member = session.get(SchedulerMember, self.instance_id)
+            if member is None:
+                member = SchedulerMember(instance_id=self.instance_id)
+            member.heartbeat_at = now
+            session.add(member)
+            session.commit()
+
+            session.exec(
+                delete(SchedulerMember).where(
+                    SchedulerMember.heartbeat_at < now - timedelta(seconds=self.lease_seconds * 10)
+                )
+            )
+            live = session.exec(
+                select(func.count())
+                .select_from(SchedulerMember)
+                .where(SchedulerMember.heartbeat_at > live_after)
+            ).one()
+            fair_share = math.ceil(self.shards / max(live, 1))
+
+            owned = set(
+                session.exec(
+                    select(SchedulerLease.shard).where(
+                        SchedulerLease.owner == self.instance_id,
+                        SchedulerLease.expires_at > now,
+                        SchedulerLease.shard < self.shards,
+                    )
+                ).all()
+            )
+
+            # Hand surplus shards back so newly started instances can take them.
+            for shard in sorted(owned)[fair_share:]:
+                session.exec(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.shard == shard, SchedulerLease.owner == self.instance_id)
+                    .values(owner=None, expires_at=now)
+                )
+                owned.discard(shard)
+
+            if owned:
+                session.exec(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.shard.in_(owned), SchedulerLease.owner == self.instance_id)
+                    .values(expires_at=expires_at)
+                )
+
+            if len(owned) < fair_share:
+                free = session.exec(
+                    select(SchedulerLease.shard)
+                    .where(
+                        SchedulerLease.shard < self.shards,
+                        or_(SchedulerLease.owner.is_(None), SchedulerLease.expires_at <= now),
+                    )
+                    .order_by(SchedulerLease.shard)
+                ).all()
+                for shard in free:
+                    if len(owned) >= fair_share:
+                        break
+                    result = session.exec(
+                        update(SchedulerLease)
+                        .where(
+                            SchedulerLease.shard == shard,
+                            or_(SchedulerLease.owner.is_(None), SchedulerLease.expires_at <= now),
+                        )
+                        .values(owner=self.instance_id, expires_at=expires_at)
+                    )
+                    if result.rowcount == 1:
+                        owned.add(shard)
+            session.commit()
+
+        if owned != self.owned:
+            logger.info(f"Scheduler {self.instance_id} owns shards {sorted(owned)} of {self.shards}")
+        self.owned = owned
+        self._last_heartbeat = now
+        return owned
+
+    def release(self) -> None:
+        """Give up all leases, e.g. on clean shutdown."""
+        with Session(engine) as session:
+            session.exec(
+                update(SchedulerLease)
+                .where(SchedulerLease.owner == self.instance_id)
+                .values(owner=None, expires_at=datetime.utcnow())
+            )
+            session.exec(
+                delete(SchedulerMember).where(SchedulerMember.instance_id == self.instance_id)
+            )
+            session.commit()
+        self.owned = set()
@@ -0,0 +1,81 @@
+"""
+Per-process event loop for the network I/O of I/O-bound job types.
+
+Each worker process runs one asyncio loop in a background thread. Tasks hand
+their fetches to it with :func:`run` and block until the coroutine is done,
+so with the ``threads`` pool (see ``app.worker.routing``) many tasks wait on
+the network at once as coroutines on a single loop, sharing one keep-alive
+``httpx.AsyncClient``, instead of one blocking fetch per process. At most
+``WORKER_IO_CONCURRENCY`` coroutines run at a time per process; the rest
+wait on the loop's semaphore.
+
+On prefork workers the same path is used with one task per process, so the
+task code doesn't depend on the pool it runs in. A forked child never
+inherits the parent's loop thread; the loop is created per process id.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Coroutine, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class EventLoopThread:
+    """An event loop running forever in a daemon thread, with a concurrency cap."""
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dataflow-io-loop", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._started.set()
+        self.loop.run_forever()
+
+    async def _limited(self, coro: Awaitable[T]) -> T:
+        async with self._semaphore:
+            return await coro
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run ``coro`` on the loop and wait for its result from the calling thread."""
+        return asyncio.run_coroutine_threadsafe(self._limited(coro), self.loop).result(timeout)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_lock = threading.Lock()
+_loop: Optional[EventLoopThread] = None
+_pid: Optional[int] = None
+
+
+def io_loop() -> EventLoopThread:
+    global _loop, _pid
+    if _loop is None or _pid != os.getpid():
+        with _lock:
+            if _loop is None or _pid != os.getpid():
+                _loop = EventLoopThread(settings.WORKER_IO_CONCURRENCY)
+                _pid = os.getpid()
+    return _loop
+
+
+def run(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    return io_loop().run(coro, timeout)
+
+
+def shutdown() -> None:
+    global _loop
+    with _lock:
+        if _loop is not None and _pid == os.getpid():
+            _loop.stop()
+        _loop = None
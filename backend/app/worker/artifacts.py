@@ -0,0 +1,333 @@
+"""
+Artifact store for large run outputs.
+
+When a run finishes, metric lists (a crawl's pages, say) and logs larger than
+``ARTIFACT_INLINE_MAX_BYTES`` are written to the store instead of the
+``JobRun`` row: lists as NDJSON, one row per line, logs as text, gzipped
+when ``ARTIFACT_COMPRESS`` is set. The run keeps a reference in their place
+(``{"artifact": name, "rows", "size_bytes", "sha256"}`` in ``metrics``, a
+preview in ``logs``) and an ``Artifact`` row records where the file is.
+
+Readers memory-map uncompressed artifacts: :meth:`ArtifactReader.lines`
+yields each row as a ``memoryview`` into the mapping and
+:meth:`ArtifactReader.matching_lines` searches the mapping for rows
+containing a byte pattern, so a consumer can filter rows without copying or
+decoding the rest. Compressed artifacts are decompressed as they are read.
+
+``LocalArtifactStore`` keeps files under ``ARTIFACT_DIR``, which workers and
+the API must share. Another backend only needs ``write``, ``open`` and
+``delete``.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.artifact import Artifact
+from app.models.run import JobRun
+
+from . import run_events
+
+logger = logging.getLogger(__name__)
+
+# What an offloaded run keeps of its logs.
+LOG_PREVIEW_CHARS = 2000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "text": "text/plain; charset=utf-8",
+}
+EXTENSIONS = {"ndjson": "ndjson", "text": "txt"}
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+class LocalArtifactStore:
+    """Artifacts as files under ``root``, written atomically and read through ``mmap``."""
+
+    name = "local"
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def write(self, key: str, chunks: Iterable[bytes]) -> int:
+        """Store ``chunks`` under ``key``, replacing any earlier version; returns the size."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial artifact.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return size
+
+    def open(self, key: str) -> Buffer:
+        """The artifact's bytes, mapped read-only (``mmap`` can't map an empty file)."""
+        with open(self._path(key), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+_store: Optional[LocalArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> LocalArtifactStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.ARTIFACT_BACKEND != LocalArtifactStore.name:
+                raise ValueError(f"Unknown ARTIFACT_BACKEND '{settings.ARTIFACT_BACKEND}'")
+            _store = LocalArtifactStore(settings.ARTIFACT_DIR)
+        return _store
+
+
+def _store_for(artifact: Artifact) -> LocalArtifactStore:
+    store = get_artifact_store()
+    if artifact.backend != store.name:
+        raise ValueError(f"Artifact {artifact.id} is in the '{artifact.backend}' store, not '{store.name}'")
+    return store
+
+
+def _ndjson(rows: Iterable[Any]) -> Iterator[bytes]:
+    for row in rows:
+        yield json.dumps(row, default=str, separators=(",", ":")).encode() + b"\n"
+
+
+def _gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # zlib's gzip header has no timestamp, so equal content gives equal files.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _hashed(chunks: Iterable[bytes], hasher: Any) -> Iterator[bytes]:
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+def write_artifact(
+    session: Session, run: JobRun, name: str, kind: str, chunks: Iterable[bytes], rows: Optional[int] = None
+) -> Artifact:
+    """
+    Store ``chunks`` as the run's artifact ``name`` (``kind`` is ``"ndjson"``
+    or ``"text"``) and add its ``Artifact`` row to ``session``. Writing the
+    same name for a run again replaces the artifact.
+    """
+    if run.run_key is None:
+        run.run_key = run_events.new_run_key()
+    compress = settings.ARTIFACT_COMPRESS
+    key = f"{run.job_id}/{run.run_key}/{name}.{EXTENSIONS[kind]}" + (".gz" if compress else "")
+    store = get_artifact_store()
+    # The hash covers the content, so it doesn't change with ARTIFACT_COMPRESS.
+    hasher = hashlib.sha256()
+    hashed = _hashed(chunks, hasher)
+    size = store.write(key, _gzipped(hashed) if compress else hashed)
+
+    fields = {
+        "backend": store.name,
+        "key": key,
+        "format": f"{kind}.gz" if compress else kind,
+        "size_bytes": size,
+        "rows": rows,
+        "sha256": hasher.hexdigest(),
+    }
+    artifact = session.exec(
+        select(Artifact).where(Artifact.run_key == run.run_key, Artifact.name == name)
+    ).first()
+    if artifact is None:
+        artifact = Artifact(job_id=run.job_id, run_key=run.run_key, name=name, **fields)
+    else:
+        if artifact.key != key:
+            store.delete(artifact.key)
+        for field, value in fields.items():
+            setattr(artifact, field, value)
+    session.add(artifact)
+    return artifact
+
+
+def reference(artifact: Artifact) -> Dict[str, Any]:
+    """What a run's metrics keep in place of an offloaded value."""
+    return {"artifact": artifact.name, "rows": artifact.rows, "size_bytes": artifact.size_bytes, "sha256": artifact.sha256}
+
+
+def offload(session: Session, run: JobRun) -> List[Artifact]:
+    """
+    Move the run's metric lists and logs over ``ARTIFACT_INLINE_MAX_BYTES``
+    into artifacts; call once its output is final.
+    """
+    limit = settings.ARTIFACT_INLINE_MAX_BYTES
+    artifacts = []
+    metrics = dict(run.metrics or {})
+    for name, value in metrics.items():
+        if not isinstance(value, list):
+            continue
+        lines = list(_ndjson(value))
+        if sum(map(len, lines)) <= limit:
+            continue
+        artifact = write_artifact(session, run, name, "ndjson", lines, rows=len(value))
+        metrics[name] = reference(artifact)
+        artifacts.append(artifact)
+    if artifacts:
+        run.metrics = metrics
+
+    if run.logs:
+        data = run.logs.encode()
+        if len(data) > limit:
+            artifact = write_artifact(session, run, "logs", "text", [data])
+            run.logs = run.logs[:LOG_PREVIEW_CHARS] + f"\n[... {len(data)} bytes in total, see artifact 'logs']"
+            artifacts.append(artifact)
+    return artifacts
+
+
+def run_artifacts(session: Session, run_keys: Iterable[str]) -> List[Artifact]:
+    run_keys = {key for key in run_keys if key}
+    if not run_keys:
+        return []
+    return list(session.exec(select(Artifact).where(Artifact.run_key.in_(run_keys)).order_by(Artifact.id)).all())
+
+
+def remove_files(artifacts: Iterable[Artifact]) -> None:
+    """Delete stored files once their ``Artifact`` rows are gone."""
+    for artifact in artifacts:
+        try:
+            _store_for(artifact).delete(artifact.key)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not delete artifact {artifact.id} ({artifact.key}): {e}")
+
+
+class ArtifactReader:
+    """
+    Read access to one artifact. Views it hands out point into the mapped
+    file and are only valid until the reader is closed.
+    """
+
+    def __init__(self, artifact: Artifact, buffer: Buffer) -> None:
+        self.artifact = artifact
+        self.buffer = buffer
+        self.compressed = artifact.format.endswith(".gz")
+
+    def __enter__(self) -> "ArtifactReader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                # A caller still holds a view; the mapping goes with it.
+                pass
+
+    @property
+    def size(self) -> int:
+        """Stored size in bytes (compressed, if the artifact is)."""
+        return len(self.buffer)
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None, chunk_bytes: int = 64 * 1024) -> Iterator[bytes]:
+        """Stored bytes ``[start, end)`` in chunks, closing the reader when done."""
+        end = self.size if end is None else min(end, self.size)
+        try:
+            for offset in range(start, end, chunk_bytes):
+                yield self.buffer[offset:min(offset + chunk_bytes, end)]
+        finally:
+            self.close()
+
+    def lines(self) -> Iterator[memoryview]:
+        """Each line without its newline; views into the mapping unless compressed."""
+        if self.compressed:
+            if isinstance(self.buffer, mmap.mmap):
+                self.buffer.seek(0)
+                source = self.buffer
+            else:
+                source = io.BytesIO(self.buffer)
+            with gzip.GzipFile(fileobj=source) as f:
+                for line in f:
+                    yield memoryview(line.rstrip(b"\n"))
+            return
+        view = memoryview(self.buffer)
+        try:
+            position = 0
+            size = len(view)
+            while position < size:
+                newline = self.buffer.find(b"\n", position)
+                if newline == -1:
+                    newline = size
+                yield view[position:newline]
+                position = newline + 1
+        finally:
+            view.release()
+
+    def matching_lines(self, pattern: bytes) -> Iterator[memoryview]:
+        """
+        Lines containing ``pattern``. Uncompressed artifacts are searched in
+        the mapping itself, so lines without a match are never touched.
+        """
+        if self.compressed:
+            for line in self.lines():
+                if pattern in line.obj:
+                    yield line
+            return
+        view = memoryview(self.buffer)
+        try:
+            position = self.buffer.find(pattern)
+            while position != -1:
+                start = self.buffer.rfind(b"\n", 0, position) + 1
+                end = self.buffer.find(b"\n", position)
+                if end == -1:
+                    end = len(view)
+                yield view[start:end]
+                position = self.buffer.find(pattern, end)
+        finally:
+            view.release()
+
+    def rows(self) -> Iterator[Any]:
+        """Decoded NDJSON rows, one at a time."""
+        for line in self.lines():
+            if line:
+                yield json.loads(line.tobytes())
+
+    def text(self) -> str:
+        data = gzip.decompress(self.buffer) if self.compressed else self.buffer[:]
+        return data.decode()
+
+
+def open_artifact(artifact: Artifact) -> ArtifactReader:
+    """``FileNotFoundError`` if the artifact's file is gone."""
+    return ArtifactReader(artifact, _store_for(artifact).open(artifact.key))
@@ -1,13 +1,25 @@
 from celery import Celery
+from celery.concurrency import get_implementation
+from celery.concurrency.thread import TaskPool as ThreadTaskPool
+from celery.signals import (
+    before_task_publish,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 import os
 
+from app.core.config import settings
+
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 celery_app = Celery(
     "worker",
     broker=redis_url,
     backend=redis_url,
-    include=["app.worker.tasks"]
+    include=["app.worker.tasks", "app.worker.pipelines"]
 )
 
 celery_app.conf.update(
@@ -16,4 +28,63 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Run outcomes live in JobRun; stored results are small and short-lived
+    # (see app.worker.results).
+    result_expires=settings.CELERY_RESULT_EXPIRES_SECONDS,
+    # Workers poll their queues in the order given to -Q, so a queue's
+    # ".manual" twin is always drained first (see app.worker.routing).
+    broker_transport_options={"queue_order_strategy": "priority"},
 )
+
+
+def _uses_threads(worker) -> bool:
+    return get_implementation(worker.pool_cls) is ThreadTaskPool
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    # Imported here so loading the Celery app doesn't pull in the task modules.
+    from app.worker import resources
+    resources.warm_up()
+
+
+@worker_init.connect
+def warm_up_thread_worker(sender=None, **kwargs):
+    # Thread-pool workers (the I/O queue) run tasks in this process: there is
+    # no fork and no worker_process_init.
+    if sender is not None and _uses_threads(sender):
+        from app.worker import resources
+        resources.warm_up()
+
+
+@worker_process_shutdown.connect
+def shut_down_worker_process(**kwargs):
+    from app.worker import resources
+    resources.shutdown()
+
+
+@worker_shutdown.connect
+def shut_down_thread_worker(sender=None, **kwargs):
+    if sender is not None and _uses_threads(sender):
+        from app.worker import resources
+        resources.shutdown()
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    from app.worker import queue_stats
+    if headers is not None:
+        queue_stats.stamp(headers)
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    from app.worker import queue_stats
+    request = task.request
+    if request.is_eager:
+        return
+    queue_stats.record_start(
+        (request.delivery_info or {}).get("routing_key"),
+        request.get("enqueued_at"),
+        request.eta,
+    )
@@ -0,0 +1,164 @@
+"""
+Multi-page crawl support for scraper jobs.
+
+A scraper job with ``configuration["crawl"]`` starts at its ``url`` and
+follows links breadth-first::
+
+    "crawl": {"max_depth": 2, "max_pages": 200, "same_domain": true, "exclude": ["/logout"]}
+
+Each depth level is one wave of page tasks fanned out across workers as a
+Celery chord; the chord callback merges the wave into the job's single
+``JobRun``, dedups the discovered links and queues the next wave. The crawl
+state that travels between waves is small: the pending frontier (bounded by
+``CRAWL_MAX_FRONTIER``) and the seen-URL set, kept as 64-bit URL hashes.
+"""
+import base64
+import hashlib
+import re
+import struct
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+
+from app.core.config import settings
+from app.models.job import Job
+
+from .extraction import FIELDS, PageExtractor
+from .extraction_rules import ExtractionRule, RuleExtractor, compile_selector
+from .scraping import ScrapeSpec
+
+LINKS_RULE = "__links__"
+
+
+class CrawlSettings(NamedTuple):
+    max_depth: int
+    max_pages: int
+    same_domain: bool
+    exclude: Tuple[Pattern, ...]
+
+
+def crawl_settings(configuration: Optional[Dict[str, Any]]) -> Optional[CrawlSettings]:
+    """The job's crawl settings, or None for a single-page scrape; ``ValueError`` if invalid."""
+    raw = (configuration or {}).get("crawl")
+    if not raw:
+        return None
+    if raw is True:
+        raw = {}
+    try:
+        return CrawlSettings(
+            max_depth=min(max(int(raw.get("max_depth", settings.CRAWL_MAX_DEPTH)), 0), settings.CRAWL_MAX_DEPTH_LIMIT),
+            max_pages=min(max(int(raw.get("max_pages", settings.CRAWL_MAX_PAGES)), 1), settings.CRAWL_MAX_PAGES_LIMIT),
+            same_domain=bool(raw.get("same_domain", True)),
+            exclude=tuple(re.compile(pattern) for pattern in raw.get("exclude", [])),
+        )
+    except (TypeError, ValueError, AttributeError, re.error) as e:
+        raise ValueError(f"Invalid crawl settings: {e}")
+
+
+def is_crawl(job: Job) -> bool:
+    return bool((job.configuration or {}).get("crawl"))
+
+
+def normalize_url(base: str, href: str) -> Optional[str]:
+    """Absolute http(s) URL for ``href`` without its fragment, or None if it isn't crawlable."""
+    url, _ = urldefrag(urljoin(base, href.strip()))
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+class SeenUrls:
+    """
+    Set of URLs already queued, stored as 64-bit hashes so it stays compact
+    when passed between waves (8 bytes per URL, collisions negligible at
+    crawl sizes).
+    """
+
+    def __init__(self, hashes: Iterable[int] = ()) -> None:
+        self._hashes = set(hashes)
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), "big")
+
+    def add(self, url: str) -> bool:
+        """Add ``url``; False if it was already seen."""
+        digest = self._hash(url)
+        if digest in self._hashes:
+            return False
+        self._hashes.add(digest)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def dumps(self) -> str:
+        return base64.b64encode(struct.pack(f">{len(self._hashes)}Q", *sorted(self._hashes))).decode()
+
+    @classmethod
+    def loads(cls, data: str) -> "SeenUrls":
+        raw = base64.b64decode(data)
+        return cls(struct.unpack(f">{len(raw) // 8}Q", raw))
+
+
+def next_frontier(
+    crawl: CrawlSettings,
+    root: str,
+    seen: SeenUrls,
+    links: Iterable[Tuple[str, str]],
+    budget: int,
+) -> List[str]:
+    """
+    New URLs to fetch from ``(page url, href)`` pairs, in discovery order:
+    deduped against ``seen``, restricted to the root's host when
+    ``same_domain`` is set, minus excluded patterns, and at most ``budget``
+    (pages left) or ``CRAWL_MAX_FRONTIER`` of them.
+    """
+    root_host = urlsplit(root).netloc.lower()
+    limit = min(budget, settings.CRAWL_MAX_FRONTIER)
+    frontier: List[str] = []
+    for page_url, href in links:
+        if len(frontier) >= limit:
+            break
+        url = normalize_url(page_url, href)
+        if url is None:
+            continue
+        if crawl.same_domain and urlsplit(url).netloc != root_host:
+            continue
+        if any(pattern.search(url) for pattern in crawl.exclude):
+            continue
+        if seen.add(url):
+            frontier.append(url)
+    return frontier
+
+
+def crawl_extractor(spec: ScrapeSpec):
+    """The job's extractor, also collecting up to ``CRAWL_MAX_LINKS_PER_PAGE`` links to follow."""
+    max_links = settings.CRAWL_MAX_LINKS_PER_PAGE
+    if spec.rules:
+        links_rule = ExtractionRule(LINKS_RULE, compile_selector("a[href]"), "href", max_links, 0)
+        return RuleExtractor(spec.rules + (links_rule,))
+    fields = tuple(spec.fields or FIELDS)
+    if "links" not in fields:
+        fields += ("links",)
+    return PageExtractor(max_links=max_links, fields=fields)
+
+
+def split_links(spec: ScrapeSpec, page: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Separate the followed links from the job's own extraction result."""
+    if spec.rules:
+        page = dict(page)
+        return page, page.pop(LINKS_RULE) or []
+    return page, list(page["links"])
+
+
+def page_entry(url: str, depth: int, status_code: Optional[int], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact per-page record kept in the crawl run's metrics."""
+    entry: Dict[str, Any] = {"url": url, "depth": depth, "status_code": status_code}
+    if "data" in metrics:
+        entry["data"] = metrics["data"]
+    else:
+        entry["title"] = metrics.get("title")
+        entry["links_count"] = metrics.get("links_count")
+    entry["content_length"] = metrics.get("content_length")
+    return entry
@@ -0,0 +1,150 @@
+"""
+Targeted, incremental HTML extraction for scrapes.
+
+``PageExtractor`` is an ``html.parser`` subclass that keeps only the fields a
+scrape records (title, meta description, the first N links and images and the
+first paragraph) instead of building a full document tree. It can be fed the
+document in chunks and reports ``done`` once every requested field is
+settled, so callers can stop reading and parsing the rest of the page; a job
+that only wants the title and meta description stops at ``</head>``.
+"""
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional
+
+FIELDS = ("title", "meta_description", "links", "images", "first_paragraph")
+NO_TITLE = "No title found"
+FEED_CHUNK_CHARS = 64 * 1024
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class PageExtractor(HTMLParser):
+    def __init__(
+        self,
+        max_links: int = 20,
+        max_images: int = 10,
+        paragraph_chars: int = 200,
+        fields: Optional[Iterable[str]] = None,
+    ) -> None:
+        super().__init__(convert_charrefs=True)
+        self.fields = frozenset(fields) if fields else frozenset(FIELDS)
+        unknown = self.fields - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown extraction fields: {', '.join(sorted(unknown))}")
+        self.max_links = max_links if "links" in self.fields else 0
+        self.max_images = max_images if "images" in self.fields else 0
+        self.paragraph_chars = paragraph_chars
+
+        self.title: Optional[str] = None
+        self.meta_description: Optional[str] = None
+        self.links: List[str] = []
+        self.images: List[str] = []
+        self.first_paragraph: Optional[str] = None
+
+        self._head_closed = False
+        self._in_title = False
+        self._title_parts: List[str] = []
+        self._paragraph_depth = 0
+        self._paragraph_parts: List[str] = []
+        self._paragraph_len = 0
+        self.done = False
+
+    def _check_done(self) -> None:
+        fields = self.fields
+        self.done = (
+            ("title" not in fields or self.title is not None or self._head_closed)
+            and ("meta_description" not in fields or self.meta_description is not None or self._head_closed)
+            and len(self.links) >= self.max_links
+            and len(self.images) >= self.max_images
+            and ("first_paragraph" not in fields or self.first_paragraph is not None)
+        )
+        if self.done:
+            raise _StopParsing
+
+    def _finish_paragraph(self) -> None:
+        self.first_paragraph = "".join(self._paragraph_parts)[: self.paragraph_chars]
+        self._paragraph_depth = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag == "a" and len(self.links) < self.max_links:
+            attributes = dict(attrs)
+            if "href" in attributes:
+                self.links.append(attributes["href"] or "")
+        elif tag == "img" and len(self.images) < self.max_images:
+            attributes = dict(attrs)
+            if "src" in attributes:
+                self.images.append(attributes["src"] or "")
+        elif tag == "meta" and self.meta_description is None and "meta_description" in self.fields:
+            attributes = dict(attrs)
+            if attributes.get("name") == "description":
+                self.meta_description = attributes.get("content") or ""
+        elif tag == "title" and self.title is None and "title" in self.fields:
+            self._in_title = True
+        elif tag == "p" and self.first_paragraph is None and "first_paragraph" in self.fields:
+            if self._paragraph_depth:
+                # An unclosed <p> is implicitly ended by the next one.
+                self._finish_paragraph()
+            else:
+                self._paragraph_depth = 1
+        elif tag == "body":
+            self._head_closed = True
+        self._check_done()
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = "".join(self._title_parts)
+        elif tag == "p" and self._paragraph_depth:
+            self._finish_paragraph()
+        elif tag == "head":
+            self._head_closed = True
+        self._check_done()
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._paragraph_depth and self._paragraph_len < self.paragraph_chars:
+            stripped = data.strip()
+            if stripped:
+                self._paragraph_parts.append(stripped)
+                self._paragraph_len += len(stripped)
+
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        try:
+            super().feed(data)
+        except _StopParsing:
+            pass
+
+    def result(self) -> Dict[str, Any]:
+        if self._in_title and self.title is None:
+            self.title = "".join(self._title_parts)
+        if self._paragraph_depth and self.first_paragraph is None:
+            self._finish_paragraph()
+        return {
+            "title": self.title or NO_TITLE,
+            "meta_description": self.meta_description or "",
+            "links": self.links,
+            "images": self.images,
+            "first_paragraph": self.first_paragraph or "",
+        }
+
+
+def extract_page(
+    html: str,
+    chunk_chars: int = FEED_CHUNK_CHARS,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Extract the scrape fields from ``html``, stopping as soon as all are found."""
+    extractor = PageExtractor(fields=fields)
+    for start in range(0, len(html), chunk_chars):
+        extractor.feed(html[start:start + chunk_chars])
+        if extractor.done:
+            break
+    return extractor.result()
@@ -0,0 +1,278 @@
+"""
+Declarative extraction rules for scraper jobs.
+
+A job's ``configuration["extract"]`` maps output names to rules::
+
+    "extract": {
+        "headline": "h1",
+        "links": {"selector": "nav a[href]", "attr": "href", "limit": 20},
+        "price": {"selector": "span.price", "max_chars": 40}
+    }
+
+A rule is a selector (tag, ``.class``, ``#id``, ``[attr]``/``[attr=value]``
+and descendant combinators), an optional ``attr`` to read instead of the
+element's text, a ``limit`` (1 gives a single value, more gives a list) and
+``max_chars`` for text. Compiled rules are cached in the worker (an LRU of
+``EXTRACTION_RULES_CACHE_SIZE`` specs), keyed by the spec itself, so an
+edited job is recompiled on its next run. ``RuleExtractor`` applies them while streaming the page and
+is done as soon as every rule has reached its limit.
+"""
+import hashlib
+import json
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+MAX_RULE_LIMIT = 1000
+DEFAULT_MAX_CHARS = 200
+
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+_COMPOUND = re.compile(r"(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<rest>(?:[.#][\w-]+|\[[^\]]*\])*)")
+_QUALIFIER = re.compile(
+    r"\.(?P<cls>[\w-]+)"
+    r"|#(?P<id>[\w-]+)"
+    r"|\[\s*(?P<attr>[\w:-]+)\s*(?:=\s*(?:\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]*))\s*)?\]"
+)
+
+
+class Compound(NamedTuple):
+    tag: Optional[str]
+    element_id: Optional[str]
+    classes: FrozenSet[str]
+    attrs: Tuple[Tuple[str, Optional[str]], ...]
+
+    def matches(self, tag: str, attributes: Dict[str, Optional[str]]) -> bool:
+        if self.tag is not None and self.tag != tag:
+            return False
+        if self.element_id is not None and attributes.get("id") != self.element_id:
+            return False
+        if self.classes and not self.classes <= set((attributes.get("class") or "").split()):
+            return False
+        for name, value in self.attrs:
+            if name not in attributes or (value is not None and attributes[name] != value):
+                return False
+        return True
+
+
+class Selector(NamedTuple):
+    # Outermost ancestor first; the last compound matches the element itself.
+    compounds: Tuple[Compound, ...]
+
+    def matches(self, tag: str, attributes: Dict[str, Optional[str]], ancestors: List[Tuple[str, Dict]]) -> bool:
+        if not self.compounds[-1].matches(tag, attributes):
+            return False
+        pending = len(self.compounds) - 2
+        for ancestor_tag, ancestor_attrs in reversed(ancestors):
+            if pending < 0:
+                break
+            if self.compounds[pending].matches(ancestor_tag, ancestor_attrs):
+                pending -= 1
+        return pending < 0
+
+
+class ExtractionRule(NamedTuple):
+    name: str
+    selector: Selector
+    attr: Optional[str]
+    limit: int
+    max_chars: int
+
+
+CompiledRules = Tuple[ExtractionRule, ...]
+
+
+def _compile_compound(text: str) -> Compound:
+    match = _COMPOUND.fullmatch(text)
+    if not match or not text:
+        raise ValueError(f"Unsupported selector {text!r}")
+    tag = match.group("tag")
+    element_id = None
+    classes = set()
+    attrs = []
+    for qualifier in _QUALIFIER.finditer(match.group("rest") or ""):
+        if qualifier.group("cls"):
+            classes.add(qualifier.group("cls"))
+        elif qualifier.group("id"):
+            element_id = qualifier.group("id")
+        else:
+            value = next((v for v in qualifier.group("dq", "sq", "bare") if v is not None), None)
+            attrs.append((qualifier.group("attr").lower(), value))
+    return Compound(
+        None if tag in (None, "*") else tag.lower(),
+        element_id,
+        frozenset(classes),
+        tuple(attrs),
+    )
+
+
+def compile_selector(text: str) -> Selector:
+    """Compile a CSS-like selector; raises ``ValueError`` for unsupported syntax."""
+    parts = text.split()
+    if not parts:
+        raise ValueError("Empty selector")
+    if any(part in (">", "+", "~") or "," in part for part in parts):
+        raise ValueError(f"Only descendant combinators are supported: {text!r}")
+    return Selector(tuple(_compile_compound(part) for part in parts))
+
+
+def _compile_rule(name: str, raw: Any) -> ExtractionRule:
+    if isinstance(raw, str):
+        raw = {"selector": raw}
+    if not isinstance(raw, dict) or not isinstance(raw.get("selector"), str):
+        raise ValueError(f"Extraction rule {name!r} needs a 'selector' string")
+    try:
+        limit = int(raw.get("limit", 1))
+        max_chars = int(raw.get("max_chars", DEFAULT_MAX_CHARS))
+    except (TypeError, ValueError):
+        raise ValueError(f"Extraction rule {name!r} has a non-integer limit or max_chars")
+    if not 1 <= limit <= MAX_RULE_LIMIT:
+        raise ValueError(f"Extraction rule {name!r}: limit must be between 1 and {MAX_RULE_LIMIT}")
+    if max_chars < 1:
+        raise ValueError(f"Extraction rule {name!r}: max_chars must be positive")
+    attr = raw.get("attr")
+    if attr is not None and not isinstance(attr, str):
+        raise ValueError(f"Extraction rule {name!r}: 'attr' must be a string")
+    return ExtractionRule(name, compile_selector(raw["selector"]), attr.lower() if attr else None, limit, max_chars)
+
+
+def compile_rules(spec: Dict[str, Any]) -> CompiledRules:
+    """Compile a job's ``extract`` spec; raises ``ValueError`` if it is invalid."""
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("'extract' must be a non-empty object of name -> rule")
+    return tuple(_compile_rule(name, raw) for name, raw in spec.items())
+
+
+@lru_cache(maxsize=settings.EXTRACTION_RULES_CACHE_SIZE)
+def _compile_canonical(canonical: str) -> Tuple[str, CompiledRules]:
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16], compile_rules(json.loads(canonical))
+
+
+def rules_for_spec(spec: Dict[str, Any]) -> Tuple[str, CompiledRules]:
+    """
+    Fingerprint and compiled rules for an ``extract`` spec, from the
+    worker-local cache when the spec is unchanged; raises ``ValueError`` if
+    it is invalid.
+    """
+    return _compile_canonical(json.dumps(spec, sort_keys=True))
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _Capture:
+    __slots__ = ("rule", "depth", "parts", "length")
+
+    def __init__(self, rule: ExtractionRule, depth: int) -> None:
+        self.rule = rule
+        self.depth = depth
+        self.parts: List[str] = []
+        self.length = 0
+
+
+class RuleExtractor(HTMLParser):
+    """Streaming extractor for compiled rules, with the ``PageExtractor`` interface."""
+
+    def __init__(self, rules: CompiledRules) -> None:
+        super().__init__(convert_charrefs=True)
+        self.rules = rules
+        self.values: Dict[str, List[str]] = {rule.name: [] for rule in rules}
+        # Only rules whose last compound can match a tag are tried on it.
+        self._any_tag = [rule for rule in rules if rule.selector.compounds[-1].tag is None]
+        self._by_tag: Dict[str, List[ExtractionRule]] = {}
+        for rule in rules:
+            tag = rule.selector.compounds[-1].tag
+            if tag is not None:
+                self._by_tag.setdefault(tag, []).append(rule)
+        self._stack: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        self._captures: List[_Capture] = []
+        self.done = False
+
+    def _full(self, rule: ExtractionRule) -> bool:
+        return len(self.values[rule.name]) >= rule.limit
+
+    def _check_done(self) -> None:
+        self.done = not self._captures and all(self._full(rule) for rule in self.rules)
+        if self.done:
+            raise _StopParsing
+
+    def _close_capture(self, capture: _Capture) -> None:
+        values = self.values[capture.rule.name]
+        if len(values) < capture.rule.limit:
+            values.append(" ".join(capture.parts)[: capture.rule.max_chars])
+
+    def _open(self, tag: str, attrs) -> Dict[str, Optional[str]]:
+        attributes = dict(attrs)
+        candidates = self._by_tag.get(tag)
+        if candidates is None and not self._any_tag:
+            return attributes
+        for rule in (candidates or []) + self._any_tag:
+            if self._full(rule) or not rule.selector.matches(tag, attributes, self._stack):
+                continue
+            if rule.attr:
+                value = attributes.get(rule.attr)
+                if value is not None:
+                    self.values[rule.name].append(value)
+            elif not any(capture.rule is rule for capture in self._captures):
+                self._captures.append(_Capture(rule, len(self._stack)))
+        return attributes
+
+    def _close_to(self, depth: int) -> None:
+        del self._stack[depth:]
+        remaining = []
+        for capture in self._captures:
+            if capture.depth >= depth:
+                self._close_capture(capture)
+            else:
+                remaining.append(capture)
+        self._captures = remaining
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        attributes = self._open(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._close_to(len(self._stack))
+        else:
+            self._stack.append((tag, attributes))
+        self._check_done()
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self._open(tag, attrs)
+        self._close_to(len(self._stack))
+        self._check_done()
+
+    def handle_endtag(self, tag: str) -> None:
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                self._close_to(depth)
+                break
+        self._check_done()
+
+    def handle_data(self, data: str) -> None:
+        for capture in self._captures:
+            if capture.length < capture.rule.max_chars:
+                stripped = data.strip()
+                if stripped:
+                    capture.parts.append(stripped)
+                    capture.length += len(stripped) + 1
+
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        try:
+            super().feed(data)
+        except _StopParsing:
+            pass
+
+    def result(self) -> Dict[str, Any]:
+        self._close_to(0)
+        return {
+            rule.name: self.values[rule.name] if rule.limit > 1 else next(iter(self.values[rule.name]), None)
+            for rule in self.rules
+        }
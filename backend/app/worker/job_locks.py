@@ -0,0 +1,348 @@
+"""
+Overlap control for job runs.
+
+A job's ``configuration["overlap"]`` (default ``JOB_OVERLAP_POLICY``) decides
+what happens when it is triggered while a run is already queued or running:
+
+- ``skip``: the trigger is dropped; at most one run is queued or running.
+- ``queue_one``: one more run may wait behind the running one; further
+  triggers are dropped.
+- ``allow``: every trigger runs, in parallel if workers are free.
+
+Triggers take an admission slot before anything is enqueued (scheduler and
+``POST /jobs/{id}/run``), so duplicates never reach the workers. A run also
+holds the job's execution lock while it runs, so a queued run waits (its task
+re-queues itself) until the previous one has finished. Both are released when
+the run reaches a final status, and both expire after
+``JOB_LOCK_TTL_SECONDS`` so a worker that dies mid-run can't block its job
+forever.
+
+Manual runs can also send an ``Idempotency-Key``: a repeated request with the
+same key within ``JOB_IDEMPOTENCY_TTL_SECONDS`` returns the first request's
+task instead of enqueuing again.
+
+State lives in Redis so every scheduler, API process and worker shares it;
+the ``local`` backend is an in-process stand-in for single-process setups
+and tests.
+"""
+import logging
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "dataflow:job"
+
+
+class OverlapPolicy(str, Enum):
+    SKIP = "skip"
+    QUEUE_ONE = "queue_one"
+    ALLOW = "allow"
+
+
+# Runs that may be queued or running at once under each policy.
+CAPACITY = {OverlapPolicy.SKIP: 1, OverlapPolicy.QUEUE_ONE: 2}
+
+
+def overlap_policy(configuration: Optional[Dict[str, Any]]) -> OverlapPolicy:
+    """The job's overlap policy; ``ValueError`` if invalid."""
+    raw = (configuration or {}).get("overlap", settings.JOB_OVERLAP_POLICY)
+    try:
+        return OverlapPolicy(raw)
+    except ValueError:
+        choices = ", ".join(policy.value for policy in OverlapPolicy)
+        raise ValueError(f"Invalid overlap policy {raw!r}; expected one of {choices}")
+
+
+def _policy(job: Job) -> OverlapPolicy:
+    try:
+        return overlap_policy(job.configuration)
+    except ValueError as e:
+        logger.warning(f"Job {job.id}: {e}; using {settings.JOB_OVERLAP_POLICY}")
+        return OverlapPolicy(settings.JOB_OVERLAP_POLICY)
+
+
+class LocalJobLocks:
+    """Single-process locks with the same semantics as the Redis ones."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._slots: Dict[int, Dict[str, float]] = {}  # job id -> slot id -> expires at
+        self._runs: Dict[int, float] = {}  # job id -> expires at
+        self._keys: Dict[str, Tuple[str, float]] = {}  # idempotency key -> (value, expires at)
+
+    def admit(self, job_id: int, capacity: int, count: int, ttl: float) -> int:
+        return self.admit_many([(job_id, capacity, count)], ttl)[0]
+
+    def admit_many(self, requests: List[Tuple[int, int, int]], ttl: float) -> List[int]:
+        with self._lock:
+            now = time.monotonic()
+            admitted = []
+            for job_id, capacity, count in requests:
+                slots = {s: e for s, e in self._slots.get(job_id, {}).items() if e > now}
+                taken = max(min(count, capacity - len(slots)), 0)
+                for _ in range(taken):
+                    slots[uuid.uuid4().hex] = now + ttl
+                self._slots[job_id] = slots
+                admitted.append(taken)
+            return admitted
+
+    def release_slot(self, job_id: int, count: int = 1) -> None:
+        with self._lock:
+            slots = self._slots.get(job_id)
+            for _ in range(min(count, len(slots or ()))):
+                del slots[min(slots, key=slots.get)]
+
+    def release_slots(self, counts: Dict[int, int]) -> None:
+        for job_id, count in counts.items():
+            self.release_slot(job_id, count)
+
+    def acquire_run(self, job_id: int, ttl: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._runs.get(job_id, 0.0) > now:
+                return False
+            self._runs[job_id] = now + ttl
+            return True
+
+    def release_run(self, job_id: int) -> None:
+        with self._lock:
+            self._runs.pop(job_id, None)
+
+    def clear(self, job_id: int) -> None:
+        with self._lock:
+            self._slots.pop(job_id, None)
+            self._runs.pop(job_id, None)
+
+    def claim_key(self, key: str, ttl: float) -> Optional[str]:
+        with self._lock:
+            now = time.monotonic()
+            current = self._keys.get(key)
+            if current and current[1] > now:
+                return current[0]
+            self._keys[key] = ("", now + ttl)
+            return None
+
+    def delete_key(self, key: str) -> None:
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def set_key(self, key: str, value: str) -> None:
+        with self._lock:
+            if key in self._keys:
+                self._keys[key] = (value, self._keys[key][1])
+
+    def reset(self) -> None:
+        with self._lock:
+            self._slots.clear()
+            self._runs.clear()
+            self._keys.clear()
+
+
+# KEYS: the job's slot set. ARGV: TTL seconds, capacity, count, slot id
+# prefix. Slots are a sorted set of slot ids scored by expiry; returns how
+# many of ``count`` requested slots were taken.
+_ADMIT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local ttl = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local admitted = math.max(math.min(count, capacity - redis.call('ZCARD', KEYS[1])), 0)
+for i = 1, admitted do
+  redis.call('ZADD', KEYS[1], now + ttl, ARGV[4] .. ':' .. i)
+end
+if admitted > 0 then
+  redis.call('EXPIRE', KEYS[1], math.ceil(ttl) + 1)
+end
+return admitted
+"""
+
+
+class RedisJobLocks:
+    """Locks shared by all schedulers, API processes and workers."""
+
+    def __init__(self, client: Optional[redis.Redis] = None) -> None:
+        self._client = client or redis.Redis.from_url(settings.REDIS_URL)
+        self._admit = self._client.register_script(_ADMIT_SCRIPT)
+
+    def admit(self, job_id: int, capacity: int, count: int, ttl: float) -> int:
+        return int(self._admit(keys=[f"{KEY_PREFIX}:{job_id}:slots"], args=[ttl, capacity, count, uuid.uuid4().hex]))
+
+    def admit_many(self, requests: List[Tuple[int, int, int]], ttl: float) -> List[int]:
+        # One round trip for the whole batch; each job is still admitted atomically.
+        pipe = self._client.pipeline(transaction=False)
+        for job_id, capacity, count in requests:
+            self._admit(
+                keys=[f"{KEY_PREFIX}:{job_id}:slots"], args=[ttl, capacity, count, uuid.uuid4().hex], client=pipe
+            )
+        return [int(admitted) for admitted in pipe.execute()]
+
+    def release_slot(self, job_id: int, count: int = 1) -> None:
+        self._client.zpopmin(f"{KEY_PREFIX}:{job_id}:slots", count)
+
+    def release_slots(self, counts: Dict[int, int]) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for job_id, count in counts.items():
+            pipe.zpopmin(f"{KEY_PREFIX}:{job_id}:slots", count)
+        pipe.execute()
+
+    def acquire_run(self, job_id: int, ttl: float) -> bool:
+        return bool(self._client.set(f"{KEY_PREFIX}:{job_id}:run", "1", nx=True, px=int(ttl * 1000)))
+
+    def release_run(self, job_id: int) -> None:
+        self._client.delete(f"{KEY_PREFIX}:{job_id}:run")
+
+    def clear(self, job_id: int) -> None:
+        self._client.delete(f"{KEY_PREFIX}:{job_id}:slots", f"{KEY_PREFIX}:{job_id}:run")
+
+    def claim_key(self, key: str, ttl: float) -> Optional[str]:
+        full_key = f"{KEY_PREFIX}:idempotency:{key}"
+        if self._client.set(full_key, "", nx=True, ex=int(ttl)):
+            return None
+        value = self._client.get(full_key)
+        return value.decode() if value is not None else ""
+
+    def set_key(self, key: str, value: str) -> None:
+        self._client.set(f"{KEY_PREFIX}:idempotency:{key}", value, xx=True, keepttl=True)
+
+    def delete_key(self, key: str) -> None:
+        self._client.delete(f"{KEY_PREFIX}:idempotency:{key}")
+
+
+_locks = None
+
+
+def get_job_locks():
+    global _locks
+    if _locks is None:
+        _locks = LocalJobLocks() if settings.JOB_LOCK_BACKEND == "local" else RedisJobLocks()
+    return _locks
+
+
+def admit(job: Job, count: int = 1) -> int:
+    """
+    Take admission slots for up to ``count`` triggers of ``job``; returns how
+    many may be enqueued. Fails open if the lock store is unavailable.
+    """
+    return admit_many([(job, count)])[0]
+
+
+def admit_many(triggers: Iterable[Tuple[Job, int]]) -> List[int]:
+    """
+    :func:`admit` for several jobs at once, in one call to the lock store;
+    returns the admitted count for each ``(job, count)`` in order.
+    """
+    triggers = list(triggers)
+    admitted = [count for _, count in triggers]
+    requests, positions = [], []
+    for position, (job, count) in enumerate(triggers):
+        policy = _policy(job)
+        if policy != OverlapPolicy.ALLOW and count > 0:
+            requests.append((job.id, CAPACITY[policy], count))
+            positions.append(position)
+    if not requests:
+        return admitted
+    try:
+        taken = get_job_locks().admit_many(requests, settings.JOB_LOCK_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Job locks unavailable, admitting jobs {[job_id for job_id, _, _ in requests]}: {e}")
+        return admitted
+    for position, count in zip(positions, taken):
+        admitted[position] = count
+    return admitted
+
+
+def release_slots(counts: Dict[int, int]) -> None:
+    """
+    Give back admission slots (``{job_id: count}``) taken for triggers that
+    were never enqueued, e.g. because the dispatch or the claim's commit failed.
+    """
+    counts = {job_id: count for job_id, count in counts.items() if count > 0}
+    if not counts:
+        return
+    try:
+        get_job_locks().release_slots(counts)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release admission slots for jobs {sorted(counts)}: {e}")
+
+
+def acquire_run(job: Job) -> bool:
+    """
+    Take the job's execution lock before starting a new run. False means
+    another run of the job is still going and the caller should re-queue.
+    Retries continue their run and keep the lock; they don't take it again.
+    """
+    if _policy(job) == OverlapPolicy.ALLOW:
+        return True
+    try:
+        return get_job_locks().acquire_run(job.id, settings.JOB_LOCK_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Job locks unavailable, running job {job.id}: {e}")
+        return True
+
+
+def release_run(job: Job) -> None:
+    """Give back an execution lock taken for a run that didn't start after all."""
+    if _policy(job) == OverlapPolicy.ALLOW:
+        return
+    try:
+        get_job_locks().release_run(job.id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release the run lock for job {job.id}: {e}")
+
+
+def finish_run(job: Job) -> None:
+    """Release the job's execution lock and the finished run's admission slot."""
+    if _policy(job) == OverlapPolicy.ALLOW:
+        return
+    try:
+        locks = get_job_locks()
+        locks.release_run(job.id)
+        locks.release_slot(job.id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release locks for job {job.id}: {e}")
+
+
+def clear(job: Job) -> None:
+    """Drop all of a deleted job's lock state, whatever its policy."""
+    try:
+        get_job_locks().clear(job.id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not clear locks for job {job.id}: {e}")
+
+
+def claim_idempotency_key(key: str) -> Optional[str]:
+    """
+    Claim ``key``; returns None if it is new, else what was stored for it
+    (the first request's task id, or "" while that request is in flight).
+    """
+    try:
+        return get_job_locks().claim_key(key, settings.JOB_IDEMPOTENCY_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Idempotency store unavailable, accepting {key}: {e}")
+        return None
+
+
+def store_idempotency_result(key: str, value: str) -> None:
+    try:
+        get_job_locks().set_key(key, value)
+    except redis.RedisError as e:
+        logger.warning(f"Could not store idempotency result for {key}: {e}")
+
+
+def release_idempotency_key(key: str) -> None:
+    """Forget a claimed key whose request failed, so a retry with it is handled afresh."""
+    try:
+        get_job_locks().delete_key(key)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release idempotency key {key}: {e}")
@@ -0,0 +1,477 @@
+"""
+Pipeline execution.
+
+A pipeline's ``steps`` are a DAG of jobs::
+
+    [
+        {"name": "fetch", "job_id": 1},
+        {"name": "parse", "job_id": 2, "depends_on": ["fetch"]},
+        {"name": "thumbnails", "job_id": 3, "depends_on": ["fetch"]},
+        {"name": "publish", "job_id": 4, "depends_on": ["parse", "thumbnails"]},
+    ]
+
+``name`` defaults to ``step-<n>``. When no step has ``depends_on``, the list
+runs in order, one step after the other. A step reuses an unchanged output
+instead of running (see ``app.worker.step_cache``) unless its job reads
+external state (scrapers, API syncs); ``"cache"`` overrides that either way.
+
+Runs are event-driven rather than level by level: every step's job is
+dispatched with a callback (:func:`pipeline_step_done_task`) that records the
+step's outcome on the ``PipelineRun`` and queues, as one group, the steps
+whose dependencies have now all completed. A step waits only for its own
+dependencies, so a run takes about as long as its critical path, not the sum
+of its steps. When a step fails, the steps that depend on it, directly or
+not, are skipped; independent branches run on. Step jobs go through their
+overlap policy like manual runs do, and a step whose job is already busy
+fails.
+
+If the broker refuses a group of steps, the run fails and its pipeline can
+be started again. :func:`cancel_run` (``POST /pipelines/{id}/cancel``) ends a
+run that is stuck, e.g. because a worker died with a step's callback.
+
+A step's task can find the artifacts its upstream steps produced (see
+``app.worker.artifacts``) with :func:`current_step` and
+:func:`upstream_artifacts`, and read them from the store directly.
+
+``PipelineRun.metrics["steps"]`` holds each step's status, timing, run key and
+output hash; ``critical_path_ms``, ``sum_of_steps_ms`` and the step cache's
+``hits`` and ``misses`` are added when the run ends.
+"""
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from celery import group
+from celery.canvas import Signature
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.artifact import Artifact
+from app.models.job import Job, JobStatus
+from app.models.pipeline import Pipeline, PipelineStatus
+from app.models.run import JobRun, PipelineRun, RunStatus
+
+from . import artifacts, job_locks, registry, run_events, step_cache
+from .celery_app import celery_app
+from .crawl import is_crawl
+from .results import ignore_persisted, task_result
+from .routing import DEFAULT_QUEUE, MANUAL, manual_queue
+
+logger = logging.getLogger(__name__)
+
+# Pipeline bookkeeping is short and on every step's path, so it skips any
+# scheduled backlog on the default queue.
+CALLBACK_QUEUE = manual_queue(DEFAULT_QUEUE)
+
+
+class StepStatus(str, Enum):
+    PENDING = "pending"
+    QUEUED = "queued"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
+FINISHED = {StepStatus.COMPLETED, StepStatus.FAILED, StepStatus.SKIPPED}
+
+# What a step's error callback reports instead of a task result: its task
+# raised instead of recording a run.
+TASK_RAISED = "raised"
+
+
+class PipelineStep(NamedTuple):
+    name: str
+    job_id: int
+    depends_on: Tuple[str, ...]
+    cache: Optional[bool] = None  # None: by job type (``step_cache.cacheable``)
+
+
+def parse_steps(steps: Sequence[Any]) -> Dict[str, PipelineStep]:
+    """Pipeline steps by name, in definition order; ``ValueError`` if invalid."""
+    if not isinstance(steps, list):
+        raise ValueError("Pipeline steps must be a list")
+    sequential = not any(isinstance(raw, dict) and "depends_on" in raw for raw in steps)
+    parsed: Dict[str, PipelineStep] = {}
+    previous: Optional[str] = None
+    for index, raw in enumerate(steps):
+        if not isinstance(raw, dict):
+            raise ValueError(f"Step {index + 1}: expected an object")
+        name = str(raw.get("name") or f"step-{index + 1}")
+        if name in parsed:
+            raise ValueError(f"Duplicate step name '{name}'")
+        job_id = raw.get("job_id")
+        if not isinstance(job_id, int) or isinstance(job_id, bool):
+            raise ValueError(f"Step '{name}': job_id must be an integer")
+        if sequential:
+            depends_on = [previous] if previous else []
+        else:
+            depends_on = raw.get("depends_on") or []
+            if not isinstance(depends_on, list) or not all(isinstance(dep, str) for dep in depends_on):
+                raise ValueError(f"Step '{name}': depends_on must be a list of step names")
+        cache = raw.get("cache")
+        if cache is not None and not isinstance(cache, bool):
+            raise ValueError(f"Step '{name}': cache must be true or false")
+        parsed[name] = PipelineStep(name, job_id, tuple(dict.fromkeys(depends_on)), cache)
+        previous = name
+    for step in parsed.values():
+        for dep in step.depends_on:
+            if dep not in parsed:
+                raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+    topological_order(parsed)
+    return parsed
+
+
+def topological_order(steps: Dict[str, PipelineStep]) -> List[str]:
+    """Step names with every step after its dependencies; ``ValueError`` on a cycle."""
+    remaining = {name: len(step.depends_on) for name, step in steps.items()}
+    dependents: Dict[str, List[str]] = {name: [] for name in steps}
+    for step in steps.values():
+        for dep in step.depends_on:
+            dependents[dep].append(step.name)
+    ready = [name for name, count in remaining.items() if count == 0]
+    order: List[str] = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if len(order) < len(steps):
+        cycle = ", ".join(name for name in steps if name not in order)
+        raise ValueError(f"Pipeline steps have a dependency cycle: {cycle}")
+    return order
+
+
+def critical_path_ms(steps: Dict[str, PipelineStep], durations: Dict[str, int]) -> int:
+    """Length of the longest dependency chain, by step duration."""
+    finish: Dict[str, int] = {}
+    for name in topological_order(steps):
+        start = max((finish[dep] for dep in steps[name].depends_on), default=0)
+        finish[name] = start + durations.get(name, 0)
+    return max(finish.values(), default=0)
+
+
+def check_steps(session: Session, steps: Sequence[Any]) -> Dict[str, PipelineStep]:
+    """:func:`parse_steps`, also checking that every step's job exists and can run as a step."""
+    parsed = parse_steps(steps)
+    job_ids = {step.job_id for step in parsed.values()}
+    jobs = {job.id: job for job in session.exec(select(Job).where(Job.id.in_(job_ids))).all()}
+    for step in parsed.values():
+        job = jobs.get(step.job_id)
+        if job is None:
+            raise ValueError(f"Step '{step.name}': job {step.job_id} not found")
+        # A crawl finishes in a later chord callback, not in the task a step waits for.
+        if is_crawl(job):
+            raise ValueError(f"Step '{step.name}': crawl jobs can't run as pipeline steps")
+    return parsed
+
+
+def _steps_of(run: PipelineRun) -> Dict[str, PipelineStep]:
+    """The run's DAG as it was when the run started."""
+    return {
+        name: PipelineStep(name, state["job_id"], tuple(state["depends_on"]), state.get("cache"))
+        for name, state in run.metrics["steps"].items()
+    }
+
+
+def _elapsed_ms(since: str, now: datetime) -> int:
+    return int((now - datetime.fromisoformat(since)).total_seconds() * 1000)
+
+
+def _step_signature(session: Session, run_id: int, step: PipelineStep, job: Job, run_key: str) -> Signature:
+    signature = registry.signature_for(job, MANUAL)
+    signature.set(headers={
+        **signature.options.get("headers", {}),
+        "pipeline_run_id": run_id,
+        "pipeline_step": step.name,
+        # The step's JobRun is recorded under this key, so its callback finds exactly that run.
+        run_events.RUN_KEY_HEADER: run_key,
+    })
+    signature.link(pipeline_step_done_task.s(run_id, step.name).set(queue=CALLBACK_QUEUE))
+    signature.link_error(
+        pipeline_step_done_task.si(TASK_RAISED, run_id, step.name)
+        .set(queue=CALLBACK_QUEUE)
+    )
+    job.status = JobStatus.RUNNING
+    job.last_celery_task_id = signature.freeze().id
+    session.add(job)
+    return signature
+
+
+def _cache_key(step: PipelineStep, job: Job, states: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """The step's cache key, or None when it isn't cached or an upstream output is unknown."""
+    if not step_cache.cacheable(job, step.cache):
+        return None
+    upstream = {dep: states[dep].get("output_hash") for dep in step.depends_on}
+    if not all(upstream.values()):
+        return None
+    return step_cache.step_key(job, upstream)
+
+
+def _advance(session: Session, run: PipelineRun) -> List[Signature]:
+    """
+    Skip the steps behind a failure, queue the steps that are ready and
+    finish the run when nothing is left; returns the signatures to send once
+    the session has been committed.
+    """
+    steps = _steps_of(run)
+    states = {name: dict(state) for name, state in run.metrics["steps"].items()}
+    now = datetime.utcnow()
+    signatures: List[Signature] = []
+    changed = True
+    while changed:
+        changed = False
+        for name in topological_order(steps):
+            state = states[name]
+            if state["status"] != StepStatus.PENDING:
+                continue
+            upstream = [states[dep]["status"] for dep in steps[name].depends_on]
+            if any(status in (StepStatus.FAILED, StepStatus.SKIPPED) for status in upstream):
+                state.update(status=StepStatus.SKIPPED.value, error="an upstream step failed")
+                changed = True
+                continue
+            if not all(status == StepStatus.COMPLETED for status in upstream):
+                continue
+            job = session.get(Job, steps[name].job_id)
+            if job is None:
+                state.update(status=StepStatus.FAILED.value, error=f"job {steps[name].job_id} not found")
+                changed = True
+                continue
+            key = _cache_key(steps[name], job, states)
+            cached = step_cache.lookup(key) if key and not run.metrics.get("refresh") else None
+            if cached:
+                state.update(
+                    status=StepStatus.COMPLETED.value,
+                    cached=True,
+                    cache_key=key,
+                    output_hash=cached["output_hash"],
+                    job_run_id=cached.get("job_run_id"),
+                    duration_ms=0,
+                )
+            elif not job_locks.admit(job):
+                state.update(status=StepStatus.FAILED.value, error="job already has a run queued or running")
+            else:
+                run_key = run_events.new_run_key()
+                signature = _step_signature(session, run.id, steps[name], job, run_key)
+                signatures.append(signature)
+                state.update(
+                    status=StepStatus.QUEUED.value,
+                    queued_at=now.isoformat(),
+                    cache_key=key,
+                    task_id=signature.freeze().id,
+                    run_key=run_key,
+                )
+            changed = True
+
+    metrics = {**run.metrics, "steps": states}
+    if all(state["status"] in FINISHED for state in states.values()):
+        _finish(session, run, steps, states, metrics, now)
+    run.metrics = metrics
+    session.add(run)
+    return signatures
+
+
+def _finish(
+    session: Session,
+    run: PipelineRun,
+    steps: Dict[str, PipelineStep],
+    states: Dict[str, Dict[str, Any]],
+    metrics: Dict[str, Any],
+    now: datetime,
+) -> None:
+    counts = {status: 0 for status in FINISHED}
+    for state in states.values():
+        counts[StepStatus(state["status"])] += 1
+    durations = {name: state["duration_ms"] for name, state in states.items() if state.get("duration_ms") is not None}
+    metrics["critical_path_ms"] = critical_path_ms(steps, durations)
+    metrics["sum_of_steps_ms"] = sum(durations.values())
+    hits = sum(1 for state in states.values() if state.get("cached"))
+    metrics["cache"] = {"hits": hits, "misses": sum(1 for state in states.values() if "queued_at" in state)}
+
+    failed = counts[StepStatus.FAILED] + counts[StepStatus.SKIPPED]
+    run.status = RunStatus.FAILED if failed else RunStatus.COMPLETED
+    run.finished_at = now
+    run.duration_ms = int((now - run.started_at).total_seconds() * 1000)
+    run.summary = (
+        f"{counts[StepStatus.COMPLETED]} of {len(states)} steps completed ({hits} from cache), "
+        f"{counts[StepStatus.FAILED]} failed, {counts[StepStatus.SKIPPED]} skipped"
+    )
+    pipeline = session.get(Pipeline, run.pipeline_id)
+    if pipeline is not None:
+        pipeline.status = PipelineStatus.FAILED if failed else PipelineStatus.IDLE
+        session.add(pipeline)
+
+
+def _end_run(session: Session, run: PipelineRun, reason: str, sent: bool) -> None:
+    """
+    Fail a running run: its queued steps fail with ``reason``, its pending
+    steps are skipped and its pipeline is marked failed. ``sent`` says
+    whether the queued steps' tasks reached the broker; if so they are
+    revoked and their jobs' locks released, otherwise only the admission
+    slots they took are given back.
+    """
+    now = datetime.utcnow()
+    states = {name: dict(state) for name, state in run.metrics["steps"].items()}
+    for name, state in states.items():
+        if state["status"] == StepStatus.QUEUED:
+            job = session.get(Job, state["job_id"])
+            if sent:
+                if state.get("task_id"):
+                    celery_app.control.revoke(state["task_id"], terminate=True)
+                if job is not None:
+                    job_locks.finish_run(job)
+            else:
+                job_locks.release_slots({state["job_id"]: 1})
+            if job is not None and job.status == JobStatus.RUNNING:
+                job.status = JobStatus.FAILED
+                session.add(job)
+            state.update(status=StepStatus.FAILED.value, error=reason, finished_at=now.isoformat())
+        elif state["status"] == StepStatus.PENDING:
+            state.update(status=StepStatus.SKIPPED.value, error=reason)
+    metrics = {**run.metrics, "steps": states}
+    _finish(session, run, _steps_of(run), states, metrics, now)
+    run.summary += f" ({reason})"
+    run.metrics = metrics
+    session.add(run)
+
+
+def _dispatch(run_id: int, signatures: List[Signature]) -> None:
+    """Send the steps ``_advance`` queued; if the broker refuses them, fail the run."""
+    if not signatures:
+        return
+    try:
+        group(signatures).apply_async()
+    except Exception as e:
+        logger.error(f"Pipeline run {run_id}: could not queue {len(signatures)} step(s): {e}")
+        with Session(engine) as session:
+            run = session.exec(select(PipelineRun).where(PipelineRun.id == run_id).with_for_update()).first()
+            if run is not None and run.status == RunStatus.RUNNING:
+                _end_run(session, run, f"could not queue steps: {e}", sent=False)
+                session.commit()
+
+
+def cancel_run(session: Session, run: PipelineRun) -> None:
+    """Fail a running run, revoking its queued steps, and let its pipeline start again; commits."""
+    run = session.exec(select(PipelineRun).where(PipelineRun.id == run.id).with_for_update()).one()
+    if run.status == RunStatus.RUNNING:
+        _end_run(session, run, "cancelled", sent=True)
+    session.commit()
+
+
+def start_pipeline(session: Session, pipeline: Pipeline, refresh: bool = False) -> PipelineRun:
+    """
+    Create a ``PipelineRun`` for ``pipeline`` and queue its first steps;
+    ``ValueError`` if the steps are invalid. With ``refresh`` every step runs,
+    ignoring cached outputs (new outputs are still cached).
+    """
+    steps = check_steps(session, pipeline.steps)
+    run = PipelineRun(
+        pipeline_id=pipeline.id,
+        metrics={
+            "steps": {
+                step.name: {
+                    "job_id": step.job_id,
+                    "depends_on": list(step.depends_on),
+                    "status": StepStatus.PENDING.value,
+                    "cache": step.cache,
+                }
+                for step in steps.values()
+            },
+            "refresh": refresh,
+        },
+    )
+    pipeline.status = PipelineStatus.RUNNING
+    session.add(run)
+    session.add(pipeline)
+    session.commit()
+    session.refresh(run)
+
+    signatures = _advance(session, run)
+    session.commit()
+    _dispatch(run.id, signatures)
+    session.refresh(run)
+    return run
+
+
+def current_step(request: Any) -> Optional[Tuple[int, str]]:
+    """The ``(PipelineRun id, step name)`` a task's ``self.request`` runs for, if it is a pipeline step."""
+    headers = getattr(request, "headers", None) or {}
+    if "pipeline_run_id" not in headers:
+        return None
+    return headers["pipeline_run_id"], headers["pipeline_step"]
+
+
+def upstream_artifacts(session: Session, run_id: int, step_name: str) -> Dict[str, List[Artifact]]:
+    """Artifacts of the runs that the step's dependencies completed with (or reused from the cache), by step."""
+    run = session.get(PipelineRun, run_id)
+    if run is None:
+        return {}
+    states = run.metrics["steps"]
+    job_run_ids = {dep: states[dep].get("job_run_id") for dep in states[step_name]["depends_on"]}
+    run_keys = dict(
+        session.exec(
+            select(JobRun.id, JobRun.run_key).where(JobRun.id.in_([i for i in job_run_ids.values() if i]))
+        ).all()
+    )
+    by_run_key: Dict[str, List[Artifact]] = {}
+    for artifact in artifacts.run_artifacts(session, run_keys.values()):
+        by_run_key.setdefault(artifact.run_key, []).append(artifact)
+    return {dep: by_run_key.get(run_keys.get(job_run_id), []) for dep, job_run_id in job_run_ids.items()}
+
+
+def _step_outcome(session: Session, result: Any, job_id: int) -> StepStatus:
+    # The outcome comes from the task's result, not the job row, which the
+    # run-event writer may not have updated yet in write-behind mode.
+    if result == TASK_RAISED:
+        # Nothing recorded the run, so nothing released the job either.
+        job = session.get(Job, job_id)
+        if job is not None:
+            job.status = JobStatus.FAILED
+            session.add(job)
+            job_locks.finish_run(job)
+        return StepStatus.FAILED
+    if isinstance(result, (list, tuple)) and result:
+        # Job tasks return (status, job_id[, summary]) (see app.worker.results).
+        status = result[0]
+    else:
+        # A task that returns something else and didn't raise has completed.
+        status = RunStatus.COMPLETED.value
+    return StepStatus.COMPLETED if status == RunStatus.COMPLETED.value else StepStatus.FAILED
+
+
+@celery_app.task(acks_late=True, ignore_result=ignore_persisted())
+def pipeline_step_done_task(result: Any, run_id: int, step_name: str) -> Any:
+    """Record a finished step and queue the steps it unblocks."""
+    with Session(engine, expire_on_commit=False) as session:
+        # Steps of one run finish concurrently; the row lock serialises them.
+        run = session.exec(select(PipelineRun).where(PipelineRun.id == run_id).with_for_update()).first()
+        if run is None or run.status != RunStatus.RUNNING:
+            return task_result(RunStatus.FAILED, None, f"Pipeline run {run_id}: no longer running")
+        state = dict(run.metrics["steps"].get(step_name) or {})
+        if state.get("status") != StepStatus.QUEUED:
+            return task_result(run.status, None, f"Pipeline run {run_id}: step '{step_name}' already recorded")
+
+        now = datetime.utcnow()
+        status = _step_outcome(session, result, state["job_id"])
+        job_run = session.exec(select(JobRun).where(JobRun.run_key == state.get("run_key"))).first()
+        state.update(
+            status=status.value,
+            finished_at=now.isoformat(),
+            duration_ms=_elapsed_ms(state["queued_at"], now),
+            job_run_id=job_run.id if job_run else None,
+        )
+        # Without its run (e.g. not written yet in write-behind mode) the
+        # step's output is unknown, and its dependents run uncached.
+        if status == StepStatus.COMPLETED and job_run is not None:
+            output = step_cache.step_output(job_run)
+            key = state.get("cache_key")
+            state["output_hash"] = step_cache.store(key, output, job_run.id) if key else step_cache.output_hash(output)
+        run.metrics = {**run.metrics, "steps": {**run.metrics["steps"], step_name: state}}
+
+        signatures = _advance(session, run)
+        session.commit()
+        summary = f"Pipeline run {run_id}: step '{step_name}' {status.value}, {len(signatures)} step(s) queued"
+    _dispatch(run_id, signatures)
+    return task_result(run.status, None, summary)
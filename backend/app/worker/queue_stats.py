@@ -0,0 +1,107 @@
+"""
+Queue depth and wait time for the Celery queues.
+
+Every published task is stamped with an ``enqueued_at`` header (see the
+signal handlers in ``celery_app``). When a worker starts it, the time spent
+waiting is pushed onto a short per-queue list in the broker's Redis; a
+countdown or ETA doesn't count as waiting. :func:`queue_stats` reports, per
+queue, the number of waiting messages, the age of the oldest one and the
+recent waits, for the dashboard's queue view.
+"""
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from .celery_app import celery_app
+from .routing import all_queues
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "dataflow:queue"
+WAIT_SAMPLES = 200
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(celery_app.conf.broker_url)
+    return _redis_client
+
+
+def stamp(headers: Dict[str, Any]) -> None:
+    headers.setdefault("enqueued_at", time.time())
+
+
+def record_start(queue: Optional[str], enqueued_at: Optional[float], eta: Any) -> Optional[float]:
+    """Record how long a task waited in ``queue`` before starting; returns the wait."""
+    if not queue or enqueued_at is None:
+        return None
+    ready_at = float(enqueued_at)
+    if eta:
+        try:
+            eta = eta if isinstance(eta, datetime) else datetime.fromisoformat(eta)
+            ready_at = max(ready_at, eta.timestamp())
+        except (TypeError, ValueError):
+            pass
+    wait = max(time.time() - ready_at, 0.0)
+    key = f"{KEY_PREFIX}:{queue}:waits"
+    try:
+        with _get_redis().pipeline(transaction=False) as pipe:
+            pipe.lpush(key, round(wait, 3))
+            pipe.ltrim(key, 0, WAIT_SAMPLES - 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not record queue wait for {queue}: {e}")
+    return wait
+
+
+def _oldest_enqueued_at(raw: Optional[bytes]) -> Optional[float]:
+    if raw is None:
+        return None
+    try:
+        return float(json.loads(raw)["headers"]["enqueued_at"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def queue_stats(queues: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Depth, oldest waiting message and recent waits (seconds) for each queue."""
+    queues = queues or all_queues()
+    client = _get_redis()
+    with client.pipeline(transaction=False) as pipe:
+        for queue in queues:
+            pipe.llen(queue)
+            # Messages are pushed on the left and consumed from the right.
+            pipe.lindex(queue, -1)
+            pipe.lrange(f"{KEY_PREFIX}:{queue}:waits", 0, -1)
+        replies = pipe.execute()
+
+    now = time.time()
+    stats = []
+    for index, queue in enumerate(queues):
+        depth, oldest, waits = replies[index * 3:index * 3 + 3]
+        enqueued_at = _oldest_enqueued_at(oldest)
+        waits = sorted(float(wait) for wait in waits)
+        stats.append({
+            "queue": queue,
+            "depth": depth,
+            "oldest_wait_seconds": round(now - enqueued_at, 3) if enqueued_at is not None else None,
+            "recent_wait_seconds": {
+                "count": len(waits),
+                "mean": round(sum(waits) / len(waits), 3) if waits else None,
+                "p50": _percentile(waits, 0.5) if waits else None,
+                "p95": _percentile(waits, 0.95) if waits else None,
+                "max": waits[-1] if waits else None,
+            },
+        })
+    return stats
@@ -0,0 +1,265 @@
+"""
+Distributed rate limiting for scrapes, keyed by host and by job.
+
+Each key has a token bucket (``per_second`` refill, ``burst`` capacity) and
+an optional cap on concurrent fetches. All keys for a fetch are checked and
+taken in one step, so a fetch either gets every token and slot it needs or
+none of them. A throttled caller gets back how long to wait and is expected
+to re-queue itself rather than sleep in a worker slot.
+
+State lives in Redis so every worker shares it. The ``local`` backend is an
+in-process stand-in for single-process setups and tests. Concurrency slots
+are leases that expire after ``RATE_LIMIT_LEASE_SECONDS``, so a worker that
+dies mid-fetch can't hold a slot forever.
+
+Host limits come from ``RATE_LIMIT_HOST_*`` (with per-host overrides in
+``RATE_LIMIT_HOSTS``); a job can add its own with
+``configuration["rate_limit"] = {"per_second": 1, "burst": 2, "concurrency": 1}``.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import redis
+
+from app.core.config import settings
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "dataflow:ratelimit"
+
+
+class RateLimit(NamedTuple):
+    per_second: float  # 0 disables the token bucket
+    burst: int
+    concurrency: int  # 0 means unlimited
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_second > 0 or self.concurrency > 0
+
+
+Limits = Sequence[Tuple[str, RateLimit]]
+
+
+def _limit_from(raw: Dict[str, Any], default: RateLimit) -> RateLimit:
+    try:
+        per_second = max(float(raw.get("per_second", default.per_second)), 0.0)
+        burst = max(int(raw.get("burst", default.burst)), 1)
+        concurrency = max(int(raw.get("concurrency", default.concurrency)), 0)
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f"Invalid rate limit: {raw!r}")
+    return RateLimit(per_second, burst, concurrency)
+
+
+def host_limit(host: str) -> RateLimit:
+    default = RateLimit(
+        settings.RATE_LIMIT_HOST_PER_SECOND,
+        settings.RATE_LIMIT_HOST_BURST,
+        settings.RATE_LIMIT_HOST_CONCURRENCY,
+    )
+    override = settings.RATE_LIMIT_HOSTS.get(host)
+    return _limit_from(override, default) if override else default
+
+
+def job_limit(configuration: Optional[Dict[str, Any]]) -> Optional[RateLimit]:
+    """The job's own limit from ``configuration["rate_limit"]``; ``ValueError`` if invalid."""
+    raw = (configuration or {}).get("rate_limit")
+    if not raw:
+        return None
+    return _limit_from(raw, RateLimit(0.0, 1, 0))
+
+
+def limits_for(job: Job, url: str) -> List[Tuple[str, RateLimit]]:
+    """Keys and limits a fetch of ``url`` for ``job`` has to pass."""
+    limits = []
+    host = urlsplit(url).netloc.lower()
+    limit = host_limit(host)
+    if limit.enabled:
+        limits.append((f"host:{host}", limit))
+    limit = job_limit(job.configuration)
+    if limit is not None and limit.enabled:
+        limits.append((f"job:{job.id}", limit))
+    return limits
+
+
+class Lease(NamedTuple):
+    lease_id: str
+    limits: Tuple[Tuple[str, RateLimit], ...]
+
+
+class LocalRateLimiter:
+    """Single-process limiter with the same semantics as the Redis one."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated at)
+        self._slots: Dict[str, Dict[str, float]] = {}  # key -> lease id -> expires at
+
+    def acquire(self, limits: Limits, lease_seconds: float) -> Tuple[float, Optional[Lease]]:
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            tokens: Dict[str, float] = {}
+            for key, limit in limits:
+                if limit.per_second > 0:
+                    available, updated = self._buckets.get(key, (float(limit.burst), now))
+                    available = min(float(limit.burst), available + (now - updated) * limit.per_second)
+                    tokens[key] = available
+                    if available < 1:
+                        wait = max(wait, (1 - available) / limit.per_second)
+                if limit.concurrency > 0:
+                    slots = self._slots.setdefault(key, {})
+                    for held, expires in list(slots.items()):
+                        if expires <= now:
+                            del slots[held]
+                    if len(slots) >= limit.concurrency:
+                        wait = max(wait, settings.RATE_LIMIT_CONCURRENCY_WAIT_SECONDS)
+            if wait > 0:
+                return wait, None
+            for key, limit in limits:
+                if limit.per_second > 0:
+                    self._buckets[key] = (tokens[key] - 1, now)
+                if limit.concurrency > 0:
+                    self._slots[key][lease_id] = now + lease_seconds
+        return 0.0, Lease(lease_id, tuple(limits))
+
+    def release(self, lease: Lease) -> None:
+        with self._lock:
+            for key, limit in lease.limits:
+                if limit.concurrency > 0:
+                    self._slots.get(key, {}).pop(lease.lease_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._slots.clear()
+
+
+# KEYS: bucket and slot key for each limit, interleaved.
+# ARGV: lease id, lease seconds, concurrency wait, then per_second, burst and
+# concurrency for each limit. Returns the wait in seconds as a string ("0"
+# when everything was taken).
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local lease = ARGV[1]
+local lease_seconds = tonumber(ARGV[2])
+local concurrency_wait = tonumber(ARGV[3])
+local count = #KEYS / 2
+local wait = 0
+local tokens = {}
+for i = 1, count do
+  local rate = tonumber(ARGV[1 + i * 3])
+  local burst = tonumber(ARGV[2 + i * 3])
+  local concurrency = tonumber(ARGV[3 + i * 3])
+  if rate > 0 then
+    local state = redis.call('HMGET', KEYS[i * 2 - 1], 'tokens', 'ts')
+    local available = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    available = math.min(burst, available + math.max(now - ts, 0) * rate)
+    tokens[i] = available
+    if available < 1 then
+      wait = math.max(wait, (1 - available) / rate)
+    end
+  end
+  if concurrency > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[i * 2], '-inf', now)
+    if redis.call('ZCARD', KEYS[i * 2]) >= concurrency then
+      wait = math.max(wait, concurrency_wait)
+    end
+  end
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i = 1, count do
+  local rate = tonumber(ARGV[1 + i * 3])
+  local burst = tonumber(ARGV[2 + i * 3])
+  local concurrency = tonumber(ARGV[3 + i * 3])
+  if rate > 0 then
+    redis.call('HSET', KEYS[i * 2 - 1], 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i * 2 - 1], math.ceil(burst / rate) + 1)
+  end
+  if concurrency > 0 then
+    redis.call('ZADD', KEYS[i * 2], now + lease_seconds, lease)
+    redis.call('EXPIRE', KEYS[i * 2], math.ceil(lease_seconds) + 1)
+  end
+end
+return '0'
+"""
+
+
+class RedisRateLimiter:
+    """Limiter shared by all workers; one Lua script call per acquire."""
+
+    def __init__(self, client: Optional[redis.Redis] = None) -> None:
+        self._client = client or redis.Redis.from_url(settings.REDIS_URL)
+        self._acquire = self._client.register_script(_ACQUIRE_SCRIPT)
+
+    def acquire(self, limits: Limits, lease_seconds: float) -> Tuple[float, Optional[Lease]]:
+        lease_id = uuid.uuid4().hex
+        keys: List[str] = []
+        args: List[Any] = [lease_id, lease_seconds, settings.RATE_LIMIT_CONCURRENCY_WAIT_SECONDS]
+        for key, limit in limits:
+            keys += [f"{KEY_PREFIX}:{key}:bucket", f"{KEY_PREFIX}:{key}:slots"]
+            args += [limit.per_second, limit.burst, limit.concurrency]
+        try:
+            wait = float(self._acquire(keys=keys, args=args))
+        except redis.RedisError as e:
+            # Fail open: an unavailable limiter shouldn't stop all scraping.
+            logger.warning(f"Rate limiter unavailable, not throttling: {e}")
+            wait = 0.0
+        if wait > 0:
+            return wait, None
+        return 0.0, Lease(lease_id, tuple(limits))
+
+    def release(self, lease: Lease) -> None:
+        slot_keys = [f"{KEY_PREFIX}:{key}:slots" for key, limit in lease.limits if limit.concurrency > 0]
+        if not slot_keys:
+            return
+        try:
+            with self._client.pipeline(transaction=False) as pipe:
+                for key in slot_keys:
+                    pipe.zrem(key, lease.lease_id)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not release rate limit lease {lease.lease_id}: {e}")
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = LocalRateLimiter() if settings.RATE_LIMIT_BACKEND == "local" else RedisRateLimiter()
+    return _limiter
+
+
+def acquire(limits: Limits) -> Tuple[float, Optional[Lease]]:
+    """
+    Take a token and a concurrency slot for every limit, or none of them.
+
+    Returns ``(0, lease)`` on success, else ``(seconds to wait, None)``.
+    Pass the lease to :func:`release` once the fetch is done.
+    """
+    if not limits:
+        return 0.0, Lease("", ())
+    return get_rate_limiter().acquire(limits, settings.RATE_LIMIT_LEASE_SECONDS)
+
+
+def release(lease: Lease) -> None:
+    if lease.limits:
+        get_rate_limiter().release(lease)
+
+
+def requeue_delay(wait: float) -> float:
+    """Countdown for a throttled task: the limiter's wait plus jitter, so re-queued tasks spread out."""
+    return round(wait * (1 + settings.RATE_LIMIT_JITTER * random.random()), 3)
@@ -0,0 +1,151 @@
+"""
+Job type to Celery task registry.
+
+Both the API (manual runs) and the scheduler go through :func:`signature_for`
+so a job type is always executed by the same task with the same arguments.
+Job types that also have a batch task (scrapers) can be folded into fewer,
+larger tasks with :func:`plan_signatures`.
+"""
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from celery import Task, group
+from celery.canvas import Signature
+from celery.result import AsyncResult
+
+from app.core.config import settings
+from app.models.job import Job, JobType
+
+from .celery_app import celery_app
+from .crawl import is_crawl
+from .routing import SCHEDULED, queue_for
+from .tasks import crawl_task, scrape_batch_task, scrape_task, test_task
+
+ArgsBuilder = Callable[[Job], Tuple[Any, ...]]
+
+
+class TaskSpec(NamedTuple):
+    task: Task
+    build_args: ArgsBuilder
+
+
+class BatchSpec(NamedTuple):
+    task: Task
+    build_item: ArgsBuilder
+    size: int
+
+
+def _scrape_args(job: Job) -> Tuple[Any, ...]:
+    return (job.id, (job.configuration or {}).get("url", "https://example.com"))
+
+
+def _default_args(job: Job) -> Tuple[Any, ...]:
+    return (job.id, job.name)
+
+
+DEFAULT_SPEC = TaskSpec(test_task, _default_args)
+
+_registry: Dict[JobType, TaskSpec] = {
+    JobType.SCRAPER: TaskSpec(scrape_task, _scrape_args),
+}
+
+# Per-type alternatives chosen by the job's configuration, checked in order.
+_variants: Dict[JobType, List[Tuple[Callable[[Job], bool], TaskSpec]]] = {
+    JobType.SCRAPER: [(is_crawl, TaskSpec(crawl_task, _scrape_args))],
+}
+
+_batch_registry: Dict[JobType, BatchSpec] = {
+    JobType.SCRAPER: BatchSpec(scrape_batch_task, _scrape_args, settings.SCRAPE_BATCH_SIZE),
+}
+
+
+def register(job_type: JobType, task: Task, build_args: ArgsBuilder = _default_args) -> None:
+    _registry[job_type] = TaskSpec(task, build_args)
+
+
+def register_batch(job_type: JobType, task: Task, build_item: ArgsBuilder, size: int) -> None:
+    _batch_registry[job_type] = BatchSpec(task, build_item, size)
+
+
+def register_variant(job_type: JobType, predicate: Callable[[Job], bool], task: Task, build_args: ArgsBuilder) -> None:
+    _variants.setdefault(job_type, []).append((predicate, TaskSpec(task, build_args)))
+
+
+def spec_for(job_type: JobType) -> TaskSpec:
+    return _registry.get(job_type, DEFAULT_SPEC)
+
+
+def _variant_for(job: Job) -> Optional[TaskSpec]:
+    for predicate, spec in _variants.get(job.type, ()):
+        if predicate(job):
+            return spec
+    return None
+
+
+def spec_for_job(job: Job) -> TaskSpec:
+    return _variant_for(job) or spec_for(job.type)
+
+
+def signature_for(job: Job, trigger: str = SCHEDULED) -> Signature:
+    """
+    Celery signature that runs ``job`` on the queue for its type and
+    ``trigger`` (see ``app.worker.routing``); call ``freeze()`` to get its
+    task id early.
+    """
+    spec = spec_for_job(job)
+    return spec.task.s(*spec.build_args(job)).set(queue=queue_for(job.type, trigger))
+
+
+def plan_signatures(jobs: Sequence[Job]) -> List[Tuple[Signature, List[Job]]]:
+    """
+    Signatures that run ``jobs``, each paired with the jobs it covers.
+
+    Jobs whose type has a batch task are chunked into one batch signature per
+    ``BatchSpec.size`` jobs; a chunk of one still uses the regular task. Jobs
+    that resolve to a variant (e.g. crawls) always get their own signature. A
+    job may appear more than once (catch-up fires).
+    """
+    plans: List[Tuple[Signature, List[Job]]] = []
+    batchable: Dict[JobType, List[Job]] = defaultdict(list)
+    for job in jobs:
+        if job.type in _batch_registry and _variant_for(job) is None:
+            batchable[job.type].append(job)
+        else:
+            plans.append((signature_for(job), [job]))
+
+    for job_type, typed_jobs in batchable.items():
+        spec = _batch_registry[job_type]
+        for start in range(0, len(typed_jobs), spec.size):
+            chunk = typed_jobs[start:start + spec.size]
+            if len(chunk) == 1:
+                plans.append((signature_for(chunk[0]), chunk))
+            else:
+                items = [list(spec.build_item(job)) for job in chunk]
+                plans.append((spec.task.s(items).set(queue=queue_for(job_type)), chunk))
+    return plans
+
+
+def dispatch(job: Job, trigger: str = SCHEDULED) -> AsyncResult:
+    return signature_for(job, trigger).apply_async()
+
+
+def enqueue_many(signatures: Iterable[Signature], chunk_size: int = 500) -> int:
+    """
+    Send signatures as Celery groups of up to ``chunk_size`` tasks.
+
+    A group is published over a single producer connection, so the broker
+    writes are pipelined instead of one round trip per ``.delay()``.
+    """
+    pending: List[Signature] = []
+    sent = 0
+    with celery_app.producer_or_acquire() as producer:
+        for signature in signatures:
+            pending.append(signature)
+            if len(pending) >= chunk_size:
+                group(pending).apply_async(producer=producer)
+                sent += len(pending)
+                pending = []
+        if pending:
+            group(pending).apply_async(producer=producer)
+            sent += len(pending)
+    return sent
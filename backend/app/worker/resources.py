@@ -0,0 +1,141 @@
+"""
+Process-wide resources for worker processes.
+
+Building a ``UserAgent`` loads its browser dataset, and a fresh HTTP client
+per fetch means a new connection pool, TLS context and handshake every time.
+These are created once per worker process instead: ``warm_up`` runs from
+Celery's ``worker_process_init`` signal (see ``celery_app``), after the fork,
+so every child gets its own copies, I/O loop (see ``app.worker.aio``) and
+database connections; thread-pool workers warm up once in ``worker_init``.
+Outside a worker (API, scheduler, scripts) they are created lazily on first
+use.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fake_useragent import UserAgent
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.job import Job, JobType
+
+from . import aio
+from .extraction_rules import rules_for_spec
+from .scraping import build_async_client
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT_POOL_SIZE = 20
+
+_lock = threading.Lock()
+_user_agents: Optional[List[str]] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[aio.EventLoopThread] = None  # a forked child gets a new loop, and so a new client
+_tasks_started = 0
+
+# Filled in by warm_up; reported with each run's timing.
+warm_up_ms: Optional[float] = None
+
+
+def user_agents() -> List[str]:
+    """
+    A fixed sample of user-agent strings. ``UserAgent().random`` filters the
+    whole browser dataset on every call (several ms), so it is sampled once.
+    """
+    global _user_agents
+    if _user_agents is None:
+        with _lock:
+            if _user_agents is None:
+                ua = UserAgent()
+                _user_agents = list({ua.random for _ in range(USER_AGENT_POOL_SIZE)})
+    return _user_agents
+
+
+def random_user_agent() -> str:
+    return random.choice(user_agents())
+
+
+def async_client() -> httpx.AsyncClient:
+    """
+    Keep-alive client shared by the process's fetches. It belongs to the
+    process's I/O loop: only use it in coroutines run with ``aio.run``.
+    """
+    global _async_client, _client_loop
+    loop = aio.io_loop()
+    if _async_client is None or _client_loop is not loop:
+        with _lock:
+            if _async_client is None or _client_loop is not loop:
+                max_connections = max(settings.SCRAPE_CONCURRENCY, settings.WORKER_IO_CONCURRENCY)
+                _async_client = build_async_client(max_connections=max_connections)
+                _client_loop = loop
+    return _async_client
+
+
+def _preload_rules() -> int:
+    """Compile the extraction rules of every scraper job into the worker cache."""
+    count = 0
+    with Session(engine) as session:
+        jobs = session.exec(select(Job).where(Job.type == JobType.SCRAPER)).all()
+    for job in jobs:
+        spec = (job.configuration or {}).get("extract")
+        if not spec:
+            continue
+        try:
+            rules_for_spec(spec)
+            count += 1
+        except ValueError:
+            continue
+    return count
+
+
+def warm_up() -> None:
+    """Build this process's shared resources; called once per worker process after fork."""
+    global warm_up_ms
+    start = time.perf_counter()
+    # Connections inherited from the parent must not be shared with it.
+    engine.dispose(close=False)
+    user_agents()
+    async_client()
+    try:
+        rules = _preload_rules()
+    except Exception as e:
+        # The worker still works without preloaded rules; they compile on first use.
+        logger.warning(f"Could not preload extraction rules: {e}")
+        rules = 0
+    warm_up_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Worker process warmed up in {warm_up_ms}ms ({rules} rule sets compiled)")
+
+
+def shutdown() -> None:
+    global _async_client
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        try:
+            aio.run(client.aclose(), timeout=5)
+        except Exception as e:
+            logger.warning(f"Could not close the HTTP client cleanly: {e}")
+    aio.shutdown()
+
+
+def task_timing(task_started: float, request_started: float, first_byte: float) -> Dict[str, Any]:
+    """
+    Timing for a run's metrics: time spent before the request went out
+    (``setup_ms``), time to first byte, and whether this was the process's
+    first task (``cold_start``) and how long its warm-up took.
+    """
+    global _tasks_started
+    with _lock:
+        _tasks_started += 1
+        cold_start = _tasks_started == 1
+    return {
+        "setup_ms": round((request_started - task_started) * 1000, 1),
+        "ttfb_ms": round((first_byte - request_started) * 1000, 1),
+        "cold_start": cold_start,
+        "warm_up_ms": warm_up_ms,
+    }
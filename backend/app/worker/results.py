@@ -0,0 +1,33 @@
+"""
+What tasks leave in the Celery result backend.
+
+A run's outcome is recorded in its ``JobRun`` and nothing reads it back from
+Celery (the job log websocket follows the job and its runs), so by default:
+
+- tasks that record a ``JobRun`` don't store a result at all
+  (``CELERY_IGNORE_PERSISTED_RESULTS``);
+- task return values are a compact ``(status, job_id)`` tuple instead of
+  ``(status, job_id, summary)`` (``CELERY_COMPACT_RESULTS``), for results
+  that are stored, for eager callers and for linked callbacks such as a
+  pipeline step's, which read the status from it;
+- whatever is stored expires after ``CELERY_RESULT_EXPIRES_SECONDS``
+  (``result_expires``, which the Redis backend sets as the key's TTL).
+
+Crawl page results are the exception: a crawl wave's chord hands them to its
+callback through the backend, so they're always stored in full, then expire.
+"""
+from typing import Any, Optional
+
+from app.core.config import settings
+
+
+def ignore_persisted() -> bool:
+    return settings.CELERY_IGNORE_PERSISTED_RESULTS
+
+
+def task_result(status: str, job_id: Optional[int], summary: str) -> Any:
+    """A task's return value: ``(status, job_id, summary)``, or ``(status, job_id)`` when compact."""
+    status = str(getattr(status, "value", status))
+    if settings.CELERY_COMPACT_RESULTS:
+        return (status, job_id)
+    return (status, job_id, summary)
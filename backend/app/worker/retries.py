@@ -0,0 +1,102 @@
+"""
+Retry policies for job tasks.
+
+Failed attempts are retried with ``Task.retry(countdown=...)``: the message is
+re-queued with a delay and the worker slot is released straight away instead
+of sleeping inside the task. Delays back off exponentially with jitter, and a
+job can override the defaults with ``configuration["retry"]``::
+
+    "retry": {"max_retries": 5, "backoff_seconds": 2, "max_backoff_seconds": 120, "jitter": 0.5}
+
+Every attempt is recorded on the ``JobRun`` (``attempts`` and
+``metrics["attempts"]``) so the run history shows what was retried and why.
+"""
+import random
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.models.job import Job
+from app.models.run import JobRun
+
+
+class RetryPolicy(NamedTuple):
+    max_retries: int
+    backoff_seconds: float
+    max_backoff_seconds: float
+    jitter: float
+    retry_on_status: FrozenSet[int]
+
+
+def policy_from_configuration(configuration: Optional[Dict[str, Any]]) -> RetryPolicy:
+    """Defaults from settings, overridden by ``configuration["retry"]``; ``ValueError`` if invalid."""
+    raw = (configuration or {}).get("retry") or {}
+    try:
+        return RetryPolicy(
+            max_retries=max(int(raw.get("max_retries", settings.RETRY_MAX_RETRIES)), 0),
+            backoff_seconds=max(float(raw.get("backoff_seconds", settings.RETRY_BACKOFF_SECONDS)), 0.0),
+            max_backoff_seconds=max(float(raw.get("max_backoff_seconds", settings.RETRY_MAX_BACKOFF_SECONDS)), 0.0),
+            jitter=min(max(float(raw.get("jitter", settings.RETRY_JITTER)), 0.0), 1.0),
+            retry_on_status=frozenset(int(s) for s in raw.get("retry_on_status", settings.RETRY_ON_STATUS)),
+        )
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f"Invalid retry policy: {raw!r}")
+
+
+def retry_policy(job: Optional[Job]) -> RetryPolicy:
+    return policy_from_configuration(job.configuration if job is not None else None)
+
+
+def is_retryable(exc: BaseException, policy: RetryPolicy) -> bool:
+    """Transport errors and the policy's retryable HTTP statuses (429, 5xx by default)."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in policy.retry_on_status
+    return isinstance(exc, httpx.RequestError)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("retry-after")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max((parsedate_to_datetime(value).replace(tzinfo=None) - datetime.utcnow()).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(policy: RetryPolicy, retries: int, exc: Optional[BaseException] = None) -> float:
+    """
+    Delay before retry number ``retries + 1``: exponential backoff capped at
+    ``max_backoff_seconds``, with up to ``jitter`` of it randomly shaved off so
+    jobs failing on the same host don't come back in lockstep. A server's
+    ``Retry-After`` is honoured as a floor (still capped).
+    """
+    delay = min(policy.backoff_seconds * (2 ** retries), policy.max_backoff_seconds)
+    delay *= 1 - policy.jitter * random.random()
+    retry_after = _retry_after(exc) if exc is not None else None
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, policy.max_backoff_seconds))
+    return round(delay, 3)
+
+
+def record_attempt(run: JobRun, error: BaseException, retry_in: Optional[float]) -> Dict[str, Any]:
+    """Append a failed attempt to ``run``; ``retry_in`` is None when giving up."""
+    attempt = {
+        "attempt": run.attempts,
+        "at": datetime.utcnow().isoformat(),
+        "error": (str(error) or error.__class__.__name__).splitlines()[0],
+        "retry_in": retry_in,
+    }
+    metrics = dict(run.metrics or {})
+    metrics["attempts"] = list(metrics.get("attempts", [])) + [attempt]
+    run.metrics = metrics
+    outcome = f"retrying in {retry_in:.1f}s" if retry_in is not None else "giving up"
+    run.logs = (run.logs or "") + f"Attempt {run.attempts} failed: {attempt['error']} ({outcome})\n"
+    return attempt
@@ -0,0 +1,231 @@
+"""
+Hourly and daily run rollups for time-series charts.
+
+``RunRollupHourly`` and ``RunRollupDaily`` hold, per job and for all jobs
+(``job_id`` ``ALL_JOBS``), the number of finished runs that started in each
+bucket, how many failed, and their duration sum, count, min and max. Charts
+read one row per bucket instead of scanning ``JobRun``.
+
+Rows are maintained incrementally: a run is added to its buckets in the
+transaction that records it as finished (``_update_job_after_run``, or the
+run-event writer in write-behind mode), with upserts that add to the
+existing counts. Runs recorded some other way, or before the tables
+existed, are counted by rebuilding the rollups from ``JobRun``::
+
+    python -m app.worker.rollups --since 2024-01-01
+
+A rebuild replaces the buckets from ``--since`` (by default all of them)
+in one transaction, in SQL; runs that finish while it runs may be missed,
+so run it when the workers are quiet.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+from sqlalchemy import case, delete, func, insert, literal, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.core.db import date_trunc, engine
+from app.models.run import JobRun, RunStatus
+from app.models.rollup import ALL_JOBS, RunRollupBase, RunRollupDaily, RunRollupHourly
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("total", "failed", "duration_count", "duration_sum_ms", "duration_min_ms", "duration_max_ms")
+
+
+class Granularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+TABLES: Dict[Granularity, Type[RunRollupBase]] = {
+    Granularity.HOUR: RunRollupHourly,
+    Granularity.DAY: RunRollupDaily,
+}
+STEPS = {Granularity.HOUR: timedelta(hours=1), Granularity.DAY: timedelta(days=1)}
+
+
+class FinishedRun(NamedTuple):
+    job_id: int
+    started_at: datetime
+    exit_code: Optional[int]
+    duration_ms: Optional[int]
+
+
+def finished(run: JobRun) -> FinishedRun:
+    return FinishedRun(run.job_id, run.started_at, run.exit_code, run.duration_ms)
+
+
+def bucket_start(granularity: Granularity, moment: datetime) -> datetime:
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == Granularity.DAY else moment
+
+
+def _deltas(runs: Iterable[FinishedRun], granularity: Granularity) -> List[Dict[str, Any]]:
+    buckets: Dict[Tuple[int, datetime], Dict[str, Any]] = defaultdict(
+        lambda: {"total": 0, "failed": 0, "duration_count": 0, "duration_sum_ms": 0,
+                 "duration_min_ms": None, "duration_max_ms": None}
+    )
+    for run in runs:
+        start = bucket_start(granularity, run.started_at)
+        for job_id in (run.job_id, ALL_JOBS):
+            bucket = buckets[job_id, start]
+            bucket["total"] += 1
+            if run.exit_code:
+                bucket["failed"] += 1
+            if run.duration_ms is not None:
+                bucket["duration_count"] += 1
+                bucket["duration_sum_ms"] += run.duration_ms
+                if bucket["duration_min_ms"] is None or run.duration_ms < bucket["duration_min_ms"]:
+                    bucket["duration_min_ms"] = run.duration_ms
+                if bucket["duration_max_ms"] is None or run.duration_ms > bucket["duration_max_ms"]:
+                    bucket["duration_max_ms"] = run.duration_ms
+    # A fixed order keeps concurrent writers from deadlocking on these rows.
+    return [
+        {"job_id": job_id, "bucket_start": start, **counters}
+        for (job_id, start), counters in sorted(buckets.items())
+    ]
+
+
+def _upsert(session: Session, model: Type[RunRollupBase], rows: List[Dict[str, Any]]) -> None:
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    statement = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+    new = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=["job_id", "bucket_start"],
+        set_={
+            "total": table.c.total + new.total,
+            "failed": table.c.failed + new.failed,
+            "duration_count": table.c.duration_count + new.duration_count,
+            "duration_sum_ms": table.c.duration_sum_ms + new.duration_sum_ms,
+            "duration_min_ms": case(
+                (or_(table.c.duration_min_ms.is_(None), new.duration_min_ms < table.c.duration_min_ms),
+                 new.duration_min_ms),
+                else_=table.c.duration_min_ms,
+            ),
+            "duration_max_ms": case(
+                (or_(table.c.duration_max_ms.is_(None), new.duration_max_ms > table.c.duration_max_ms),
+                 new.duration_max_ms),
+                else_=table.c.duration_max_ms,
+            ),
+        },
+    )
+    session.execute(statement, rows)
+
+
+def record(session: Session, runs: Iterable[FinishedRun]) -> None:
+    """Add newly finished runs to their rollup buckets, without committing."""
+    runs = [run for run in runs if run.started_at is not None]
+    if not runs:
+        return
+    for granularity, model in TABLES.items():
+        _upsert(session, model, _deltas(runs, granularity))
+
+
+def delete_job(session: Session, job_id: int) -> None:
+    """Delete a deleted job's own rollup rows, without committing."""
+    for model in TABLES.values():
+        session.execute(delete(model).where(model.job_id == job_id))
+
+
+def _counters_from_runs():
+    return [
+        func.count(),
+        func.coalesce(func.sum(case((JobRun.exit_code != 0, 1), else_=0)), 0),
+        func.count(JobRun.duration_ms),
+        func.coalesce(func.sum(JobRun.duration_ms), 0),
+        func.min(JobRun.duration_ms),
+        func.max(JobRun.duration_ms),
+    ]
+
+
+def _counters_from_rollups(model: Type[RunRollupBase]):
+    return [
+        func.sum(model.total),
+        func.sum(model.failed),
+        func.sum(model.duration_count),
+        func.sum(model.duration_sum_ms),
+        func.min(model.duration_min_ms),
+        func.max(model.duration_max_ms),
+    ]
+
+
+def rebuild(session: Session, since: Optional[datetime] = None) -> None:
+    """
+    Recompute the rollups from ``JobRun`` for the days from ``since`` (all
+    of them when None), without committing.
+    """
+    since = bucket_start(Granularity.DAY, since) if since is not None else None
+    columns = ["job_id", "bucket_start", *COUNTERS]
+    hourly, daily = RunRollupHourly, RunRollupDaily
+    for model in (hourly, daily):
+        statement = delete(model)
+        if since is not None:
+            statement = statement.where(model.bucket_start >= since)
+        session.execute(statement)
+
+    # Per-job hours from the runs, per-job days from the hours, and the
+    # ALL_JOBS rows from the per-job ones.
+    hour = date_trunc(session, Granularity.HOUR.value, JobRun.started_at)
+    runs = select(JobRun.job_id, hour, *_counters_from_runs()).where(JobRun.status != RunStatus.RUNNING)
+    if since is not None:
+        runs = runs.where(JobRun.started_at >= since)
+    session.execute(insert(hourly).from_select(columns, runs.group_by(JobRun.job_id, hour)))
+
+    day = date_trunc(session, Granularity.DAY.value, hourly.bucket_start)
+    hours = select(hourly.job_id, day, *_counters_from_rollups(hourly)).where(hourly.job_id != ALL_JOBS)
+    if since is not None:
+        hours = hours.where(hourly.bucket_start >= since)
+    session.execute(insert(daily).from_select(columns, hours.group_by(hourly.job_id, day)))
+
+    for model in (hourly, daily):
+        per_job = (
+            select(literal(ALL_JOBS), model.bucket_start, *_counters_from_rollups(model))
+            .where(model.job_id != ALL_JOBS)
+        )
+        if since is not None:
+            per_job = per_job.where(model.bucket_start >= since)
+        session.execute(insert(model).from_select(columns, per_job.group_by(model.bucket_start)))
+
+
+def trend(
+    session: Session, granularity: Granularity, job_id: int, start: datetime, end: datetime
+) -> List[Dict[str, Any]]:
+    """One entry per bucket from ``start`` up to ``end``, zero-filled, from the rollups."""
+    model = TABLES[granularity]
+    start = bucket_start(granularity, start)
+    rows = session.exec(
+        select(model).where(model.job_id == job_id, model.bucket_start >= start, model.bucket_start < end)
+    ).all()
+    by_start = {row.bucket_start: row for row in rows}
+    points = []
+    moment = start
+    while moment < end:
+        row = by_start.get(moment)
+        points.append({
+            "bucket_start": moment.isoformat(),
+            "total": row.total if row else 0,
+            "failed": row.failed if row else 0,
+            "avg_duration_ms": round(row.duration_sum_ms / row.duration_count) if row and row.duration_count else None,
+            "min_duration_ms": row.duration_min_ms if row else None,
+            "max_duration_ms": row.duration_max_ms if row else None,
+        })
+        moment += STEPS[granularity]
+    return points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the run rollup tables from JobRun.")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="first day to rebuild (UTC)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with Session(engine) as session:
+        rebuild(session, args.since)
+        session.commit()
+    logger.info(f"Rebuilt run rollups since {args.since.date() if args.since else 'the first run'}")
@@ -0,0 +1,86 @@
+"""
+Queue routing by job type and trigger source.
+
+Each job type has a base queue: ``WORKER_TYPE_QUEUES`` overrides, else
+``WORKER_IO_QUEUE`` for I/O-bound types (``WORKER_IO_JOB_TYPES``: scrapers
+and API syncs by default, run as coroutines on a per-process event loop, see
+``app.worker.aio``) and the default queue for the rest, e.g. CPU-bound PDF
+processing. Manual runs go to the base queue's ``.manual`` twin, which the
+queue's workers consume first (the broker polls queues in listed order), so
+a manual run jumps ahead of a scheduled backlog instead of waiting behind it.
+
+Pool, concurrency and prefetch are per queue (``WORKER_QUEUE_OPTIONS``).
+Start one worker per base queue with::
+
+    python -m app.worker.routing io
+    python -m app.worker.routing celery
+"""
+import sys
+from typing import List
+
+from app.core.config import settings
+from app.models.job import JobType
+
+DEFAULT_QUEUE = "celery"
+
+MANUAL = "manual"
+SCHEDULED = "scheduled"
+
+
+def is_io_bound(job_type: JobType) -> bool:
+    return job_type.value in settings.WORKER_IO_JOB_TYPES
+
+
+def base_queue(job_type: JobType) -> str:
+    override = settings.WORKER_TYPE_QUEUES.get(job_type.value)
+    if override:
+        return override
+    return settings.WORKER_IO_QUEUE if is_io_bound(job_type) else DEFAULT_QUEUE
+
+
+def manual_queue(base: str) -> str:
+    return f"{base}{settings.WORKER_MANUAL_QUEUE_SUFFIX}"
+
+
+def queue_for(job_type: JobType, trigger: str = SCHEDULED) -> str:
+    base = base_queue(job_type)
+    return manual_queue(base) if trigger == MANUAL else base
+
+
+def worker_queues(base: str) -> List[str]:
+    """Queues a worker for ``base`` consumes, highest priority first."""
+    return [manual_queue(base), base]
+
+
+def base_queues() -> List[str]:
+    queues = [DEFAULT_QUEUE, settings.WORKER_IO_QUEUE]
+    queues += list(settings.WORKER_TYPE_QUEUES.values()) + list(settings.WORKER_QUEUE_OPTIONS)
+    return list(dict.fromkeys(queues))
+
+
+def all_queues() -> List[str]:
+    return [queue for base in base_queues() for queue in worker_queues(base)]
+
+
+def worker_argv(base: str) -> List[str]:
+    """``celery worker`` arguments for the workers serving ``base``."""
+    options = settings.WORKER_QUEUE_OPTIONS.get(base, {})
+    argv = [
+        "worker",
+        "--queues", ",".join(worker_queues(base)),
+        "--hostname", f"{base}@%h",
+        "--loglevel", options.get("loglevel", "info"),
+    ]
+    if options.get("pool"):
+        argv += ["--pool", str(options["pool"])]
+    if options.get("concurrency"):
+        argv += ["--concurrency", str(options["concurrency"])]
+    if options.get("prefetch_multiplier"):
+        argv += ["--prefetch-multiplier", str(options["prefetch_multiplier"])]
+    return argv
+
+
+if __name__ == "__main__":
+    from app.worker.celery_app import celery_app
+
+    celery_app.worker_main(worker_argv(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_QUEUE))
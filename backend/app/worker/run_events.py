@@ -0,0 +1,302 @@
+"""
+Write-behind path for ``JobRun`` rows.
+
+By default a worker writes each run itself: insert and commit when it
+starts, update the run and its job and commit again when it finishes. With
+``RUN_WRITE_BEHIND`` on, workers instead push a snapshot of the run (a run
+event) onto a Redis list whenever it starts, schedules a retry or finishes,
+and a single writer process applies them in batches::
+
+    python -m app.worker.run_events
+
+The writer takes up to ``RUN_EVENTS_BATCH_SIZE`` events at a time and
+applies them in one transaction: one bulk insert for new runs, one bulk
+update for known ones, one bulk update of the finished runs' jobs and the
+finished runs' rollup upserts (see ``app.worker.rollups``). When fewer
+events are waiting it sleeps ``RUN_EVENTS_FLUSH_SECONDS``, so a run
+reaches the database within about that long of its event.
+
+Runs are identified by ``run_key``, set by the worker (or by whoever sent
+its task, in the task's ``run_key`` header), and every event is
+the run's full state, so applying an event twice gives the same rows.
+Durability follows from that: an event is durable once the push returns
+(as far as Redis persistence goes); a batch moves atomically from the event
+list to a processing list and is only dropped from there after its
+transaction has committed. A writer that dies mid-batch re-applies the
+processing list when it restarts. If the push fails, the worker writes the
+run directly instead.
+
+The ``local`` backend keeps events in memory and flushes them from a thread
+in the worker's own process, for single-process setups and benchmarks.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.job import Job, JobStatus
+from app.models.run import JobRun, RunStatus
+
+from . import rollups
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "dataflow:run-events"
+
+# Run columns carried by an event; ``id`` is the database's, not the worker's.
+FIELDS = (
+    "run_key", "job_id", "status", "started_at", "finished_at", "duration_ms",
+    "exit_code", "summary", "logs", "attempts", "metrics",
+)
+
+
+def enabled() -> bool:
+    return settings.RUN_WRITE_BEHIND
+
+
+RUN_KEY_HEADER = "run_key"
+
+
+def new_run_key() -> str:
+    return uuid.uuid4().hex
+
+
+def assigned_run_key(request: Any) -> Optional[str]:
+    """The run key a task's sender chose for its run, if any (e.g. a pipeline step's)."""
+    headers = getattr(request, "headers", None) or {}
+    return headers.get(RUN_KEY_HEADER)
+
+
+def encode(run: JobRun) -> str:
+    event = {field: getattr(run, field) for field in FIELDS}
+    event["status"] = RunStatus(event["status"]).value
+    for field in ("started_at", "finished_at"):
+        if event[field] is not None:
+            event[field] = event[field].isoformat()
+    return json.dumps(event)
+
+
+def _decode(raw: Any) -> Dict[str, Any]:
+    row = json.loads(raw)
+    row["status"] = RunStatus(row["status"])
+    for field in ("started_at", "finished_at"):
+        if row[field] is not None:
+            row[field] = datetime.fromisoformat(row[field])
+    row["metrics"] = row["metrics"] or {}
+    return row
+
+
+def apply(session: Session, events: Iterable[Any]) -> int:
+    """
+    Write ``events`` (oldest first) with bulk statements, without committing;
+    returns how many runs were written. The last event of a run wins.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for raw in events:
+        row = _decode(raw)
+        latest.pop(row["run_key"], None)
+        latest[row["run_key"]] = row
+    if not latest:
+        return 0
+
+    runs = JobRun.__table__
+    existing = {}
+    already_finished = set()
+    for run_key, run_id, status in session.execute(
+        select(runs.c.run_key, runs.c.id, runs.c.status).where(runs.c.run_key.in_(list(latest)))
+    ).all():
+        existing[run_key] = run_id
+        if RunStatus(status) != RunStatus.RUNNING:
+            already_finished.add(run_key)
+    inserts = [row for key, row in latest.items() if key not in existing]
+    updates = [
+        {**{field: row[field] for field in FIELDS if field != "run_key"}, "existing_id": existing[key]}
+        for key, row in latest.items() if key in existing
+    ]
+    if inserts:
+        session.execute(insert(runs), inserts)
+    if updates:
+        session.execute(update(runs).where(runs.c.id == bindparam("existing_id")), updates)
+
+    # The finished runs' jobs, as ``_update_job_after_run`` sets them.
+    jobs: Dict[int, Dict[str, Any]] = {}
+    for row in latest.values():
+        if row["status"] == RunStatus.RUNNING:
+            continue
+        jobs[row["job_id"]] = {
+            "finished_job_id": row["job_id"],
+            "last_run_at": row["finished_at"],
+            "last_duration_ms": row["duration_ms"],
+            "last_exit_code": row["exit_code"],
+            "status": JobStatus.COMPLETED if row["status"] == RunStatus.COMPLETED else JobStatus.FAILED,
+        }
+    if jobs:
+        table = Job.__table__
+        session.execute(update(table).where(table.c.id == bindparam("finished_job_id")), list(jobs.values()))
+    # Only runs finishing now, so that applying an event again doesn't count it twice.
+    rollups.record(session, [
+        rollups.FinishedRun(row["job_id"], row["started_at"], row["exit_code"], row["duration_ms"])
+        for key, row in latest.items()
+        if row["status"] != RunStatus.RUNNING and key not in already_finished
+    ])
+    return len(latest)
+
+
+class LocalRunEvents:
+    """In-process event list with the same take/ack semantics as Redis."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._events: List[str] = []
+        self._processing: List[str] = []
+
+    def push(self, events: List[str]) -> None:
+        with self._lock:
+            self._events.extend(events)
+
+    def take(self, limit: int) -> List[str]:
+        with self._lock:
+            batch, self._events = self._events[:limit], self._events[limit:]
+            self._processing.extend(batch)
+            return batch
+
+    def processing(self) -> List[str]:
+        with self._lock:
+            return list(self._processing)
+
+    def ack(self) -> None:
+        with self._lock:
+            self._processing.clear()
+
+
+# KEYS: event list, processing list. ARGV: batch size. Moves up to ARGV[1]
+# events from the head of the event list to the processing list and returns them.
+_TAKE_SCRIPT = """
+local events = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #events > 0 then
+  redis.call('LTRIM', KEYS[1], #events, -1)
+  redis.call('RPUSH', KEYS[2], unpack(events))
+end
+return events
+"""
+
+
+class RedisRunEvents:
+    """Event list shared by all workers and the writer."""
+
+    def __init__(self, client: Optional[redis.Redis] = None) -> None:
+        self._client = client or redis.Redis.from_url(settings.REDIS_URL)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self._events_key = KEY_PREFIX
+        self._processing_key = f"{KEY_PREFIX}:processing"
+
+    def push(self, events: List[str]) -> None:
+        self._client.rpush(self._events_key, *events)
+
+    def take(self, limit: int) -> List[bytes]:
+        return self._take(keys=[self._events_key, self._processing_key], args=[limit])
+
+    def processing(self) -> List[bytes]:
+        return self._client.lrange(self._processing_key, 0, -1)
+
+    def ack(self) -> None:
+        self._client.delete(self._processing_key)
+
+
+class RunEventWriter:
+    """Applies run events in batches; run one per deployment."""
+
+    def __init__(
+        self,
+        events=None,
+        batch_size: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+    ) -> None:
+        self.events = events or get_run_events()
+        self.batch_size = batch_size or settings.RUN_EVENTS_BATCH_SIZE
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.RUN_EVENTS_FLUSH_SECONDS
+
+    def flush(self) -> int:
+        """
+        Apply one batch; returns how many events it held. A batch left over
+        from a failed flush is retried before new events are taken.
+        """
+        batch = self.events.processing() or self.events.take(self.batch_size)
+        if not batch:
+            return 0
+        with Session(engine) as session:
+            written = apply(session, batch)
+            session.commit()
+        self.events.ack()
+        logger.debug(f"Run events: wrote {written} run(s) from {len(batch)} event(s)")
+        return len(batch)
+
+    def run_forever(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                count = self.flush()
+            except (redis.RedisError, SQLAlchemyError) as e:
+                logger.error(f"Run event flush failed, retrying: {e}")
+                count = 0
+            # A full batch means more are waiting; otherwise wait for the next flush.
+            if count < self.batch_size:
+                stop.wait(self.flush_seconds)
+
+
+_events = None
+_local_writer: Optional[threading.Thread] = None
+_init_lock = threading.Lock()
+
+
+def get_run_events():
+    global _events
+    with _init_lock:
+        if _events is None:
+            _events = LocalRunEvents() if settings.RUN_EVENTS_BACKEND == "local" else RedisRunEvents()
+        return _events
+
+
+def _ensure_local_writer() -> None:
+    global _local_writer
+    with _init_lock:
+        if _local_writer is None or not _local_writer.is_alive():
+            _local_writer = threading.Thread(
+                target=RunEventWriter(_events).run_forever, name="run-event-writer", daemon=True,
+            )
+            _local_writer.start()
+
+
+def record(session: Session, runs: List[JobRun]) -> None:
+    """
+    Emit the current state of ``runs``. If the event list is unavailable
+    they're written through ``session`` instead, and committed.
+    """
+    events = [encode(run) for run in runs]
+    try:
+        get_run_events().push(events)
+        if settings.RUN_EVENTS_BACKEND == "local":
+            _ensure_local_writer()
+        return
+    except redis.RedisError as e:
+        logger.warning(f"Run events unavailable, writing {len(runs)} run(s) directly: {e}")
+    apply(session, events)
+    session.commit()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info(
+        f"Run event writer: batches of {settings.RUN_EVENTS_BATCH_SIZE}, "
+        f"flushing every {settings.RUN_EVENTS_FLUSH_SECONDS}s"
+    )
+    RunEventWriter().run_forever()
@@ -0,0 +1,199 @@
+"""
+Per-URL validator cache for scrapes.
+
+Scrapes send ``If-None-Match``/``If-Modified-Since`` from the last successful
+response. When the server answers 304, or the part of the body the last parse
+needed hashes to the same value as last time, the previous output is reused
+and the page is not parsed again. Each run's metrics record what the cache
+saved.
+"""
+import copy
+import hashlib
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.models.scrape import ScrapeValidator
+
+from .scraping import DEFAULT_SCRAPE_SPEC, ScrapeSpec, StreamingPage, reported_length
+
+RunOutput = Tuple[str, str, Dict[str, Any]]
+
+
+def cache_key(url: str, spec: ScrapeSpec = DEFAULT_SCRAPE_SPEC) -> str:
+    """
+    Validator key for a scrape: the URL, plus the extraction variant when a
+    job doesn't use the default fields, since the cached output depends on both.
+    """
+    variant = spec.cache_variant
+    return f"{url}#{variant}" if variant else url
+
+
+def load_validators(session: Session, keys: Iterable[str]) -> Dict[str, ScrapeValidator]:
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = session.exec(select(ScrapeValidator).where(ScrapeValidator.url.in_(keys))).all()
+    return {row.url: row for row in rows}
+
+
+def conditional_headers(validator: Optional[ScrapeValidator]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if validator is None:
+        return headers
+    if validator.etag:
+        headers["If-None-Match"] = validator.etag
+    if validator.last_modified:
+        headers["If-Modified-Since"] = validator.last_modified
+    return headers
+
+
+def _upsert(session: Session, validator: ScrapeValidator) -> None:
+    """
+    Write a validator that wasn't loaded from the database. Another scrape
+    of the same URL may have inserted it since, so it's an upsert.
+    """
+    table = ScrapeValidator.__table__
+    values = {column.name: getattr(validator, column.name) for column in table.columns}
+    dialect = session.get_bind().dialect.name
+    statement = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table).values(**values)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=["url"],
+        set_={name: statement.excluded[name] for name in values if name != "url"},
+    ))
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _reuse(validator: ScrapeValidator, status_code: int, reason: str, bytes_saved: int) -> RunOutput:
+    metrics = copy.deepcopy(validator.metrics or {})
+    metrics["cache"] = {"hit": reason, "bytes_saved": bytes_saved, "parse_ms": 0}
+    logs = f"HTTP {status_code} ({reason}; reusing output from {validator.updated_at.isoformat()})\n"
+    return validator.summary or "", logs + (validator.logs or ""), metrics
+
+
+class BodyReader:
+    """
+    Streams a scrape response body through the validator cache.
+
+    When the URL's last parse only needed a prefix of the body
+    (``hashed_bytes``), that prefix is buffered and hashed first; if it is
+    unchanged the previous output is reused and the rest of the body is
+    neither downloaded nor parsed. When the last parse read the whole body,
+    the body is buffered (it was under ``max_bytes`` then) and hashed when it
+    ends, so an unchanged page is still not parsed. Otherwise chunks go to a
+    ``StreamingPage`` and every byte it consumes is hashed for the next run.
+    """
+
+    def __init__(
+        self,
+        validators: Dict[str, ScrapeValidator],
+        url: str,
+        encoding: Optional[str],
+        spec: ScrapeSpec = DEFAULT_SCRAPE_SPEC,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.validators = validators
+        self.url = url
+        self.spec = spec
+        self.key = cache_key(url, spec)
+        self.validator = validators.get(self.key)
+        self.page = StreamingPage(encoding, spec, max_bytes)
+        self.hasher = hashlib.sha256()
+        self.reused = False
+        self._prefix: Optional[bytearray] = None
+        if self.validator is not None and self.validator.content_hash:
+            prefix_bytes = self.validator.hashed_bytes
+            if prefix_bytes is None or prefix_bytes <= self.page.max_bytes:
+                self._prefix = bytearray()
+        self._parse_seconds = 0.0
+
+    def _consume(self, chunk: bytes) -> bool:
+        before = self.page.bytes_read
+        started = time.perf_counter()
+        done = self.page.feed(chunk)
+        self._parse_seconds += time.perf_counter() - started
+        self.hasher.update(chunk[:self.page.bytes_read - before])
+        return done
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume one chunk; True means the rest of the body is not needed."""
+        if self.reused:
+            return True
+        if self._prefix is None:
+            return self._consume(chunk)
+
+        self._prefix += chunk
+        wanted = self.validator.hashed_bytes
+        if wanted is None:
+            # The whole body was read last time; one that outgrows what could
+            # be read then has changed.
+            if len(self._prefix) <= self.page.max_bytes:
+                return False
+            buffered, self._prefix = bytes(self._prefix), None
+            return self._consume(buffered)
+        if len(self._prefix) < wanted:
+            return False
+        buffered, self._prefix = bytes(self._prefix), None
+        if content_hash(buffered[:wanted]) == self.validator.content_hash:
+            self.reused = True
+            return True
+        return self._consume(buffered)
+
+    def finish(self, session: Session, status_code: int, headers: Mapping[str, str]) -> RunOutput:
+        """
+        Summary, logs and metrics for the fetched page, reusing cached output
+        when the page is unchanged.
+
+        New validators are added to the caller's ``validators`` map so
+        several runs for the same URL in one transaction share a row, and
+        are upserted rather than added to ``session``, so concurrent first
+        scrapes of a URL don't conflict.
+        """
+        validator = self.validator
+        if validator is not None and status_code == 304:
+            return _reuse(validator, status_code, "not_modified", validator.content_length or 0)
+        if self.reused:
+            saved = max(reported_length(headers, 0) - validator.hashed_bytes, 0)
+            return _reuse(validator, status_code, "content_hash", saved)
+        if self._prefix is not None:
+            buffered, self._prefix = bytes(self._prefix), None
+            if validator.hashed_bytes is None and content_hash(buffered) == validator.content_hash:
+                # Same whole body as last time: it was downloaded, but not parsed.
+                return _reuse(validator, status_code, "content_hash", 0)
+            # Changed, or it ended before the cached prefix length.
+            self._consume(buffered)
+
+        started = time.perf_counter()
+        page = self.page.result()
+        self._parse_seconds += time.perf_counter() - started
+        content_length = reported_length(headers, self.page.bytes_read)
+        summary, logs, metrics = self.spec.build_output(self.url, status_code, content_length, page)
+        metrics["body"] = self.page.body_metrics()
+
+        if validator is None:
+            validator = ScrapeValidator(url=self.key)
+            self.validators[self.key] = validator
+        validator.etag = headers.get("etag")
+        validator.last_modified = headers.get("last-modified")
+        validator.content_hash = self.hasher.hexdigest()
+        # The output only depends on what was read, so a later run can stop
+        # at the same offset if that prefix is unchanged.
+        validator.hashed_bytes = self.page.bytes_read if self.page.done else None
+        validator.content_length = content_length
+        validator.summary = summary
+        validator.logs = logs
+        validator.metrics = copy.deepcopy(metrics)
+        validator.updated_at = datetime.utcnow()
+        if validator in session:
+            session.add(validator)
+        else:
+            _upsert(session, validator)
+
+        metrics["cache"] = {"hit": None, "bytes_saved": 0, "parse_ms": round(self._parse_seconds * 1000, 2)}
+        return summary, logs, metrics
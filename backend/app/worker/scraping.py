@@ -0,0 +1,346 @@
+"""
+Page fetching and extraction shared by the scraper tasks.
+"""
+import asyncio
+import codecs
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.models.job import Job
+
+from .extraction import FIELDS, PageExtractor
+from .extraction_rules import CompiledRules, RuleExtractor, compile_rules, rules_for_spec
+
+logger = logging.getLogger(__name__)
+
+
+class FetchResult(NamedTuple):
+    url: str
+    status_code: Optional[int]
+    content: bytes
+    encoding: Optional[str]
+    headers: Dict[str, str]
+    error: Optional[str]
+    reader: Any = None
+    exception: Optional[BaseException] = None
+
+
+def raise_for_status(response: httpx.Response) -> None:
+    """Like ``response.raise_for_status()`` but accepts 304 Not Modified."""
+    if response.status_code != 304:
+        response.raise_for_status()
+
+
+class ScrapeSpec(NamedTuple):
+    """What a scrape extracts: built-in ``fields`` (None means all) or compiled ``rules``."""
+    fields: Optional[Tuple[str, ...]] = None
+    rules: Optional[CompiledRules] = None
+    fingerprint: Optional[str] = None
+
+    @property
+    def cache_variant(self) -> Optional[str]:
+        if self.rules:
+            return f"rules={self.fingerprint}"
+        if self.fields:
+            return f"fields={','.join(sorted(self.fields))}"
+        return None
+
+    def extractor(self):
+        return RuleExtractor(self.rules) if self.rules else PageExtractor(fields=self.fields)
+
+    def build_output(
+        self, url: str, status_code: int, content_length: int, page: Dict[str, Any]
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        if self.rules:
+            return build_rule_output(url, status_code, content_length, page)
+        return build_run_output(url, status_code, content_length, page)
+
+
+DEFAULT_SCRAPE_SPEC = ScrapeSpec()
+
+
+def scrape_spec(job: Job) -> ScrapeSpec:
+    """
+    Extraction for a scraper job: ``configuration["extract"]`` rules (compiled
+    once per spec and cached), else the built-in ``configuration["fields"]``.
+    """
+    configuration = job.configuration or {}
+    if configuration.get("extract"):
+        fingerprint, rules = rules_for_spec(configuration["extract"])
+        return ScrapeSpec(rules=rules, fingerprint=fingerprint)
+    fields = configuration.get("fields")
+    return ScrapeSpec(fields=tuple(fields)) if fields else DEFAULT_SCRAPE_SPEC
+
+
+def check_url(url: Any) -> None:
+    """Raise ``ValueError`` unless ``url`` is an absolute http(s) URL that can be requested."""
+    if not isinstance(url, str):
+        raise ValueError(f"'url' must be a string, not {url!r}")
+    try:
+        parts = urlsplit(url)
+        parts.port  # an out-of-range port raises here
+        httpx.URL(url)
+    except (ValueError, httpx.InvalidURL) as e:
+        raise ValueError(f"Invalid url {url!r}: {e}")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid url {url!r}: expected an absolute http(s) URL")
+
+
+def validate_configuration(configuration: Optional[Dict[str, Any]]) -> None:
+    """Raise ``ValueError`` if a scraper configuration's URL or extraction settings are invalid."""
+    configuration = configuration or {}
+    if "url" in configuration:
+        check_url(configuration["url"])
+    if configuration.get("extract"):
+        compile_rules(configuration["extract"])
+    fields = configuration.get("fields") or []
+    if not isinstance(fields, list):
+        raise ValueError("'fields' must be a list")
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown extraction fields: {', '.join(sorted(unknown))}")
+
+
+def _incremental_decoder(encoding: Optional[str]) -> codecs.IncrementalDecoder:
+    try:
+        return codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+class StreamingPage:
+    """
+    Decode and extract a response body chunk by chunk.
+
+    Bytes are decoded incrementally and fed to the spec's extractor, so the
+    body is never held in memory or decoded as a whole. ``feed`` returns True
+    once the extractor has everything it needs or ``max_bytes`` have been
+    read, telling the caller to stop downloading.
+    """
+
+    def __init__(
+        self,
+        encoding: Optional[str],
+        spec: ScrapeSpec = DEFAULT_SCRAPE_SPEC,
+        max_bytes: Optional[int] = None,
+        extractor: Any = None,
+    ) -> None:
+        self.extractor = extractor or spec.extractor()
+        self.decoder = _incremental_decoder(encoding)
+        self.max_bytes = max_bytes or settings.SCRAPE_MAX_BYTES
+        self.bytes_read = 0
+        self.truncated = False
+
+    @property
+    def stopped_early(self) -> bool:
+        return self.extractor.done
+
+    @property
+    def done(self) -> bool:
+        return self.extractor.done or self.truncated
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.done:
+            return True
+        room = self.max_bytes - self.bytes_read
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+        self.extractor.feed(self.decoder.decode(chunk))
+        return self.done
+
+    def result(self) -> Dict[str, Any]:
+        if not self.extractor.done:
+            self.extractor.feed(self.decoder.decode(b"", final=True))
+        return self.extractor.result()
+
+    def body_metrics(self) -> Dict[str, Any]:
+        return {
+            "bytes_read": self.bytes_read,
+            "truncated": self.truncated,
+            "stopped_early": self.stopped_early,
+        }
+
+
+def reported_length(headers: Mapping[str, str], bytes_read: int) -> int:
+    """Body length from ``Content-Length`` when it describes the decoded body, else bytes read."""
+    length = headers.get("content-length")
+    if length and length.isdigit() and not headers.get("content-encoding"):
+        return int(length)
+    return bytes_read
+
+
+def build_run_output(
+    url: str, status_code: int, content_length: int, page: Dict[str, Any]
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Summary, logs and metrics recorded on a successful scrape's ``JobRun``."""
+    title = page["title"]
+    links = page["links"]
+    images = page["images"]
+    meta_description = page["meta_description"]
+    first_paragraph = page["first_paragraph"]
+
+    summary = f"Scraped {url}: Title='{title}', Found {len(links)} links, {len(images)} images"
+
+    logs = f"""HTTP {status_code}
+Title: {title}
+Meta Description: {meta_description[:100] if meta_description else 'N/A'}
+Body length: {content_length} bytes
+Links found: {len(links)}
+Images found: {len(images)}
+First paragraph: {first_paragraph}"""
+
+    metrics = {
+        "content_length": content_length,
+        "title": title,
+        "meta_description": meta_description,
+        "links_count": len(links),
+        "images_count": len(images),
+        "links": links[:10],  # Store first 10 links
+        "images": images[:5],  # Store first 5 images
+        "first_paragraph": first_paragraph,
+        "url": url
+    }
+    return summary, logs, metrics
+
+
+def _preview(value: Any) -> str:
+    if value is None:
+        return "N/A"
+    if isinstance(value, list):
+        return f"{len(value)} values: {', '.join(value[:3])}"[:100]
+    return value[:100]
+
+
+def build_rule_output(
+    url: str, status_code: int, content_length: int, data: Dict[str, Any]
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Summary, logs and metrics for a scrape using the job's extraction rules."""
+    found = sum(1 for value in data.values() if value)
+    summary = f"Scraped {url}: Extracted {found} of {len(data)} fields"
+    lines = [f"HTTP {status_code}", f"Body length: {content_length} bytes"]
+    lines += [f"{name}: {_preview(value)}" for name, value in data.items()]
+    metrics = {
+        "content_length": content_length,
+        "data": data,
+        "url": url,
+    }
+    return summary, "\n".join(lines), metrics
+
+
+def _http2_enabled() -> bool:
+    if not settings.SCRAPE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("SCRAPE_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def build_async_client(user_agent: Optional[str] = None, max_connections: Optional[int] = None) -> httpx.AsyncClient:
+    """Keep-alive client sized for the configured scrape concurrency (or ``max_connections``)."""
+    max_connections = max_connections or settings.SCRAPE_CONCURRENCY
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+    return httpx.AsyncClient(
+        http2=_http2_enabled(),
+        limits=limits,
+        follow_redirects=True,
+        headers={"User-Agent": user_agent} if user_agent else None,
+        timeout=settings.SCRAPE_TIMEOUT_SECONDS,
+    )
+
+
+class StreamedResponse(NamedTuple):
+    status_code: int
+    headers: httpx.Headers
+    encoding: Optional[str]
+    reader: Any
+    first_byte_at: float  # time.perf_counter() when the response headers arrived
+
+
+async def stream_into(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    open_reader: Callable[[httpx.Response], Any],
+) -> StreamedResponse:
+    """
+    Stream one response into the reader ``open_reader(response)`` returns,
+    feeding chunks until its ``feed`` returns True. HTTP errors (other than
+    304) are raised.
+    """
+    async with client.stream("GET", url, headers=headers) as response:
+        first_byte_at = time.perf_counter()
+        raise_for_status(response)
+        reader = open_reader(response)
+        async for chunk in response.aiter_bytes(settings.SCRAPE_CHUNK_BYTES):
+            if reader.feed(chunk):
+                break
+    return StreamedResponse(response.status_code, response.headers, response.encoding, reader, first_byte_at)
+
+
+async def fetch_many(
+    urls: Sequence[str],
+    client: httpx.AsyncClient,
+    per_host: Optional[int] = None,
+    request_headers: Optional[Sequence[Dict[str, str]]] = None,
+    open_reader: Optional[Callable[[int, httpx.Response], Any]] = None,
+) -> List[FetchResult]:
+    """
+    Fetch ``urls`` concurrently, at most ``per_host`` in flight per host.
+
+    Overall concurrency is bounded by the client's connection pool.
+    ``request_headers`` optionally gives extra headers per URL (e.g.
+    conditional-GET validators). Failures are returned as results with
+    ``error`` set rather than raised, so one bad URL doesn't sink the rest of
+    the batch.
+
+    Bodies are streamed. With ``open_reader``, each response is handed to
+    ``open_reader(index, response)`` and its chunks to the returned reader's
+    ``feed`` until that returns True; the reader comes back on the result and
+    ``content`` is left empty. Otherwise ``content`` holds at most
+    ``SCRAPE_MAX_BYTES`` of the body.
+    """
+    per_host = per_host or settings.SCRAPE_PER_HOST_CONCURRENCY
+    host_limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+    request_headers = request_headers or [{} for _ in urls]
+
+    async def fetch(index: int, url: str, headers: Dict[str, str]) -> FetchResult:
+        try:
+            async with host_limits[urlsplit(url).netloc]:
+                async with client.stream("GET", url, headers=headers) as response:
+                    raise_for_status(response)
+                    reader = open_reader(index, response) if open_reader else None
+                    content = bytearray()
+                    async for chunk in response.aiter_bytes(settings.SCRAPE_CHUNK_BYTES):
+                        if reader is not None:
+                            if reader.feed(chunk):
+                                break
+                        else:
+                            content += chunk[:settings.SCRAPE_MAX_BYTES - len(content)]
+                            if len(content) >= settings.SCRAPE_MAX_BYTES:
+                                break
+                    return FetchResult(
+                        url, response.status_code, bytes(content), response.encoding,
+                        dict(response.headers), None, reader,
+                    )
+        except Exception as e:
+            # Anything, down to a URL that doesn't parse, fails only its own item.
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            return FetchResult(url, status, b"", None, {}, str(e) or e.__class__.__name__, None, e)
+
+    return await asyncio.gather(
+        *(fetch(index, url, headers) for index, (url, headers) in enumerate(zip(urls, request_headers)))
+    )
@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of pipeline step outputs.
+
+A step's cache key hashes what determines its output: its job's type and
+configuration, and the output hashes of the steps it depends on. A step
+whose key is in the cache is not run again; it completes with the cached
+output hash, so its dependents can hit the cache in turn. Changing one
+step's job therefore re-runs that step and whatever depends on it, and
+nothing else.
+
+The key can't see external state, so steps whose job reads it (scrapers and
+API syncs, ``EXTERNAL_JOB_TYPES``) are not cached unless the step sets
+``"cache": true``; otherwise a root scrape would return its first result
+forever. They still run every time and record their output hash, so the
+steps downstream of an unchanged page or API response still hit the cache.
+
+A step's output is its job run's summary and metrics, minus the per-attempt
+bookkeeping (timing, retries, HTTP cache and body stats) that differs
+between two runs producing the same result.
+
+Entries are small JSON files under ``PIPELINE_CACHE_DIR``, which every
+worker and API process must share. A hit refreshes the entry's mtime, and
+writes evict the least recently used entries once the directory is over
+``PIPELINE_CACHE_MAX_BYTES``.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+from app.core.config import settings
+from app.models.job import Job, JobType
+from app.models.run import JobRun
+
+logger = logging.getLogger(__name__)
+
+# Job types whose output depends on more than their configuration and inputs.
+EXTERNAL_JOB_TYPES = frozenset({JobType.SCRAPER, JobType.API_SYNC})
+
+# Run metrics that describe how an attempt went rather than what it produced.
+VOLATILE_METRICS = ("timing", "attempts", "throttled", "cache", "body")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cacheable(job: Job, cache: Optional[bool] = None) -> bool:
+    """Whether a step running ``job`` is cached: ``cache`` if the step sets it, else by job type."""
+    return cache if cache is not None else job.type not in EXTERNAL_JOB_TYPES
+
+
+def step_key(job: Job, upstream: Mapping[str, str]) -> str:
+    """Cache key for running ``job`` after steps with the given output hashes (by step name)."""
+    return _digest({"type": job.type.value, "configuration": job.configuration or {}, "upstream": dict(upstream)})
+
+
+def step_output(run: JobRun) -> Dict[str, Any]:
+    metrics = {key: value for key, value in (run.metrics or {}).items() if key not in VOLATILE_METRICS}
+    return {"summary": run.summary, "metrics": metrics}
+
+
+def output_hash(output: Mapping[str, Any]) -> str:
+    return _digest(output)
+
+
+class StepCache:
+    """Step outputs on the local filesystem with size-based LRU eviction."""
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable step cache entry {key}: {e}")
+            return None
+        return entry
+
+    def put(self, key: str, entry: Mapping[str, Any]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        # Write then rename, so readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the cache fits; returns how many."""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.root) as it:
+                for item in it:
+                    if not item.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+                    total += stat.st_size
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+
+_cache: Optional[StepCache] = None
+
+
+def get_step_cache() -> StepCache:
+    global _cache
+    if _cache is None:
+        _cache = StepCache(settings.PIPELINE_CACHE_DIR, settings.PIPELINE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def lookup(key: str) -> Optional[Dict[str, Any]]:
+    if not settings.PIPELINE_CACHE_ENABLED:
+        return None
+    return get_step_cache().get(key)
+
+
+def store(key: str, output: Mapping[str, Any], job_run_id: Optional[int]) -> str:
+    """Cache a step's output under ``key``; returns its output hash."""
+    digest = output_hash(output)
+    if settings.PIPELINE_CACHE_ENABLED:
+        try:
+            get_step_cache().put(key, {"output_hash": digest, "job_run_id": job_run_id, "output": dict(output)})
+        except OSError as e:
+            logger.warning(f"Could not cache step output {key}: {e}")
+    return digest
@@ -1,17 +1,34 @@
 from datetime import datetime
+import logging
 import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
-from sqlmodel import Session
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from celery import chord, group
+from sqlmodel import Session, select
 
+from app.core.config import settings
 from app.core.db import engine
-from app.models.job import Job, JobStatus
+from app.models.job import Job, JobStatus, JobType
 from app.models.run import JobRun, RunStatus
 
+from . import aio, artifacts, job_locks, rate_limit, resources, rollups, run_events
 from .celery_app import celery_app
+from .crawl import SeenUrls, crawl_extractor, crawl_settings, next_frontier, normalize_url, page_entry, split_links
+from .results import ignore_persisted, task_result
+from .retries import backoff_delay, is_retryable, record_attempt, retry_policy
+from .routing import queue_for
+from .scrape_cache import BodyReader, cache_key, conditional_headers, load_validators
+from .scraping import (
+    ScrapeSpec,
+    StreamingPage,
+    fetch_many,
+    reported_length,
+    scrape_spec,
+    stream_into,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def _update_job_after_run(
@@ -21,7 +38,14 @@ def _update_job_after_run(
     status: RunStatus,
     exit_code: int,
     summary: str,
+    commit: bool = True,
 ) -> None:
+    """
+    Record ``run`` as finished and release the job's run lock. With
+    ``commit=False`` the caller saves the run and then releases the lock
+    itself (``job_locks.finish_run``), so the next run can't start before
+    this one is written.
+    """
     now = datetime.utcnow()
     run.finished_at = now
     if run.started_at:
@@ -29,31 +53,72 @@ def _update_job_after_run(
     run.status = status
     run.exit_code = exit_code
     run.summary = summary
+    try:
+        artifacts.offload(session, run)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Run {run.run_key}: keeping output inline, artifact store failed: {e}")
 
-    job.last_run_at = now
-    job.last_duration_ms = run.duration_ms
-    job.last_exit_code = exit_code
-    job.status = JobStatus.COMPLETED if status == RunStatus.COMPLETED else JobStatus.FAILED
+    if _write_behind(session, run):
+        # The run-event writer updates the job and the rollups from the
+        # run's final event.
+        if commit:
+            _save_runs(session, [run])
+    else:
+        job.last_run_at = now
+        job.last_duration_ms = run.duration_ms
+        job.last_exit_code = exit_code
+        job.status = JobStatus.COMPLETED if status == RunStatus.COMPLETED else JobStatus.FAILED
+
+        session.add(run)
+        session.add(job)
+        rollups.record(session, [rollups.finished(run)])
+        if commit:
+            session.commit()
+    if commit:
+        job_locks.finish_run(job)
+
+
+def _write_behind(session: Session, run: JobRun) -> bool:
+    """
+    Whether ``run`` goes through the run-event writer (``RUN_WRITE_BEHIND``,
+    see ``app.worker.run_events``). Runs the session already tracks, like a
+    crawl's, are always written directly.
+    """
+    return run_events.enabled() and run not in session
+
+
+def _save_runs(session: Session, runs: List[JobRun]) -> None:
+    """Write the current state of ``runs``, along with anything else pending in ``session``."""
+    queued = [run for run in runs if _write_behind(session, run)]
+    if queued:
+        run_events.record(session, queued)
+    session.add_all([run for run in runs if run not in queued])
+    if session.new or session.dirty:
+        session.commit()
 
-    session.add(run)
-    session.add(job)
-    session.commit()
 
+def _new_run(job: Job) -> JobRun:
+    return JobRun(job_id=job.id, run_key=run_events.new_run_key())
 
-@celery_app.task(acks_late=True)
-def test_task(job_id: int, word: str) -> str:
+
+def _wait_for_lock(task, **kwargs):
+    """Re-queue a task whose job still has a run going (see ``app.worker.job_locks``)."""
+    return task.retry(countdown=rate_limit.requeue_delay(settings.JOB_LOCK_RETRY_SECONDS), **kwargs)
+
+
+@celery_app.task(acks_late=True, bind=True, max_retries=None, ignore_result=ignore_persisted())
+def test_task(self, job_id: int, word: str) -> Any:
     """Simple demo task that records a JobRun."""
     with Session(engine) as session:
         job = session.get(Job, job_id)
         if not job:
             # Fallback: just run without persistence
             time.sleep(5)
-            return f"test task (orphan) return {word}"
+            return task_result(RunStatus.COMPLETED, None, f"test task (orphan) return {word}")
+        if not job_locks.acquire_run(job):
+            raise _wait_for_lock(self)
 
-        run = JobRun(job_id=job.id)
-        session.add(run)
-        session.commit()
-        session.refresh(run)
+        run = _start_attempt(session, job, run_events.assigned_run_key(self.request))
 
         # Simulate work
         time.sleep(5)
@@ -61,86 +126,448 @@ def test_task(job_id: int, word: str) -> str:
         summary = f"Test task for job '{job.name}' completed. Payload='{word}'."
         _update_job_after_run(session, job, run, RunStatus.COMPLETED, 0, summary)
 
-        return summary
+        return task_result(RunStatus.COMPLETED, job_id, summary)
 
 
-@celery_app.task(acks_late=True, bind=True)
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type(httpx.RequestError),
-)
-def scrape_task(self, job_id: int, url: str) -> str:
-    with Session(engine) as session:
+def _record_output(run: JobRun, logs: str, metrics: Dict[str, Any]) -> None:
+    """Set a successful attempt's output, keeping what earlier attempts recorded."""
+    for key in ("attempts", "throttled"):
+        if run.metrics and run.metrics.get(key):
+            metrics[key] = run.metrics[key]
+    run.logs = (run.logs or "") + logs
+    run.metrics = metrics
+
+
+def _schedule_retry(session: Session, job: Job, run: JobRun, error: BaseException) -> Optional[float]:
+    """
+    Record a failed attempt; returns the retry delay, or None when the error
+    isn't retryable or the job's retry policy is exhausted.
+    """
+    try:
+        policy = retry_policy(job)
+    except ValueError:
+        policy = None
+    delay = None
+    if policy is not None and is_retryable(error, policy) and run.attempts - 1 < policy.max_retries:
+        delay = backoff_delay(policy, run.attempts - 1, error)
+    record_attempt(run, error, delay)
+    return delay
+
+
+def _start_attempt(session: Session, job: Job, run_key: Optional[str], throttled: int = 0) -> JobRun:
+    """
+    The run a retried task continues, or a new run for a first attempt. A
+    key with no stored run yet (a retry that got here before the write-behind
+    writer, or a first attempt whose key was assigned by its sender) starts
+    the run under that key.
+    """
+    run = None
+    if run_key is not None:
+        run = session.exec(select(JobRun).where(JobRun.run_key == run_key)).first()
+    if run is None and run_key is not None:
+        run = JobRun(job_id=job.id, run_key=run_key)
+    elif run is None or run.status != RunStatus.RUNNING:
+        run = _new_run(job)
+    else:
+        run.attempts += 1
+        if run_events.enabled():
+            session.expunge(run)
+    if throttled:
+        run.metrics = {**(run.metrics or {}), "throttled": (run.metrics or {}).get("throttled", 0) + throttled}
+    _save_runs(session, [run])
+    return run
+
+
+def _throttle(job: Job, url: str) -> Tuple[float, Optional[rate_limit.Lease]]:
+    try:
+        limits = rate_limit.limits_for(job, url)
+    except ValueError as e:
+        logger.warning(f"Ignoring invalid rate limit for job {job.id}: {e}")
+        limits = []
+    return rate_limit.acquire(limits)
+
+
+@celery_app.task(acks_late=True, bind=True, max_retries=None, ignore_result=ignore_persisted())
+def scrape_task(self, job_id: int, url: str, run_key: Optional[str] = None, throttled: int = 0) -> Any:
+    """
+    Scrape ``url`` for a job. Failed attempts are retried through Celery with
+    the job's retry policy (see ``app.worker.retries``); ``run_key`` carries the
+    ``JobRun`` across attempts.
+
+    The fetch first has to pass the host and job rate limits (see
+    ``app.worker.rate_limit``); when throttled the task re-queues itself with
+    the limiter's wait instead of holding the worker, and ``throttled``
+    counts how often that happened before the attempt ran.
+
+    ``metrics["timing"]`` records setup time, time to first byte and whether
+    the attempt was the worker process's first task (see ``app.worker.resources``).
+    """
+    task_started = time.perf_counter()
+    with Session(engine, expire_on_commit=False) as session:
         job = session.get(Job, job_id)
         if not job:
             # Fallback: behave like a simple scraper without persistence
-            ua = UserAgent()
-            headers = {"User-Agent": ua.random}
-            response = httpx.get(url, follow_redirects=True, headers=headers, timeout=10.0)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            title = soup.title.string if soup.title else "No title found"
-            return f"Scraped {url}: Title='{title}', Length={len(response.text)} bytes"
-
-        run = JobRun(job_id=job.id)
-        session.add(run)
-        session.commit()
-        session.refresh(run)
+            headers = {"User-Agent": resources.random_user_agent()}
+            response = aio.run(stream_into(
+                resources.async_client(), url, headers,
+                lambda r: StreamingPage(r.encoding, ScrapeSpec(fields=("title",))),
+            ))
+            title = response.reader.result()["title"]
+            length = reported_length(response.headers, response.reader.bytes_read)
+            return task_result(RunStatus.COMPLETED, None, f"Scraped {url}: Title='{title}', Length={length} bytes")
+
+        wait, lease = _throttle(job, url)
+        if lease is None:
+            raise self.retry(
+                countdown=rate_limit.requeue_delay(wait),
+                kwargs={"run_key": run_key, "throttled": throttled + 1},
+            )
+        # Retries continue their run and already hold the job's run lock.
+        if run_key is None and not job_locks.acquire_run(job):
+            rate_limit.release(lease)
+            raise _wait_for_lock(self, kwargs={"run_key": None, "throttled": throttled})
+
+        run = _start_attempt(session, job, run_key or run_events.assigned_run_key(self.request), throttled)
 
         try:
-            ua = UserAgent()
-            headers = {"User-Agent": ua.random}
-
-            response = httpx.get(url, follow_redirects=True, headers=headers, timeout=10.0)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, "html.parser")
-            title = soup.title.string if soup.title else "No title found"
-            
-            # Extract more data for display
-            links = [a.get("href", "") for a in soup.find_all("a", href=True)][:20]  # First 20 links
-            images = [img.get("src", "") for img in soup.find_all("img", src=True)][:10]  # First 10 images
-            meta_description = ""
-            meta_tag = soup.find("meta", attrs={"name": "description"})
-            if meta_tag:
-                meta_description = meta_tag.get("content", "")
-            
-            # Get first paragraph of text
-            paragraphs = soup.find_all("p")
-            first_paragraph = paragraphs[0].get_text(strip=True)[:200] if paragraphs else ""
-            
-            summary = f"Scraped {url}: Title='{title}', Found {len(links)} links, {len(images)} images"
-
-            run.logs = f"""HTTP {response.status_code}
-Title: {title}
-Meta Description: {meta_description[:100] if meta_description else 'N/A'}
-Body length: {len(response.text)} bytes
-Links found: {len(links)}
-Images found: {len(images)}
-First paragraph: {first_paragraph}"""
-
-            run.metrics = {
-                "content_length": len(response.text),
-                "title": title,
-                "meta_description": meta_description,
-                "links_count": len(links),
-                "images_count": len(images),
-                "links": links[:10],  # Store first 10 links
-                "images": images[:5],  # Store first 5 images
-                "first_paragraph": first_paragraph,
-                "url": url
-            }
+            spec = scrape_spec(job)
+            key = cache_key(url, spec)
+            validators = load_validators(session, [key])
+            # Hand the connection back for the fetch: the io queue runs many
+            # more threads than the pool has connections.
+            session.commit()
+            headers = {"User-Agent": resources.random_user_agent(), **conditional_headers(validators.get(key))}
+
+            request_started = time.perf_counter()
+            response = aio.run(stream_into(
+                resources.async_client(), url, headers,
+                lambda r: BodyReader(validators, url, r.encoding, spec),
+            ))
+            summary, logs, metrics = response.reader.finish(session, response.status_code, response.headers)
 
+            metrics["timing"] = resources.task_timing(task_started, request_started, response.first_byte_at)
+            _record_output(run, logs, metrics)
             _update_job_after_run(session, job, run, RunStatus.COMPLETED, 0, summary)
-            return summary
+            return task_result(RunStatus.COMPLETED, job_id, summary)
         except Exception as e:
-            # If it's the last attempt, mark as failed but return a friendly message
-            if self.request.retries == 2:  # 0-indexed, so 2 is the 3rd attempt
-                summary = f"Failed to scrape {url} after retries: {str(e)}"
-                run.logs = (run.logs or "") + f"\nError: {summary}"
-                _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary)
-                return summary
-            # Otherwise trigger retry
-            raise e
+            session.rollback()
+            delay = _schedule_retry(session, job, run, e)
+            if delay is not None:
+                _save_runs(session, [run])
+                # Re-queued with a countdown: the worker slot is free while we wait.
+                raise self.retry(exc=e, countdown=delay, kwargs={"run_key": run.run_key})
+            summary = f"Failed to scrape {url} after {run.attempts} attempt(s): {str(e)}"
+            _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary)
+            return task_result(RunStatus.FAILED, job_id, summary)
+        finally:
+            rate_limit.release(lease)
+
+
+@celery_app.task(acks_late=True, ignore_result=ignore_persisted())
+def scrape_batch_task(items: List[Tuple[int, str]]) -> Any:
+    """
+    Scrape many ``(job_id, url)`` pairs concurrently in one task.
+
+    All pages are fetched on the process's I/O loop through its shared
+    keep-alive ``httpx.AsyncClient`` with a per-host concurrency cap, and the resulting ``JobRun`` rows are inserted
+    and finalised in two bulk commits (or two pushes of run events) instead of
+    two per job. Pages throttled
+    by the shared rate limits are handed back as single scrape tasks.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        job_ids = {job_id for job_id, _ in items}
+        jobs = {job.id: job for job in session.exec(select(Job).where(Job.id.in_(job_ids))).all()}
+        pending: List[Tuple[Job, str]] = []
+        leases: List[rate_limit.Lease] = []
+        throttled: List[Tuple[Job, str, float]] = []
+        locked: List[Tuple[Job, str]] = []
+        for job_id, url in items:
+            if job_id not in jobs:
+                continue
+            wait, lease = _throttle(jobs[job_id], url)
+            if lease is None:
+                throttled.append((jobs[job_id], url, wait))
+            elif not job_locks.acquire_run(jobs[job_id]):
+                rate_limit.release(lease)
+                locked.append((jobs[job_id], url))
+            else:
+                pending.append((jobs[job_id], url))
+                leases.append(lease)
+        for job, url, wait in throttled:
+            scrape_task.apply_async(
+                (job.id, url), {"throttled": 1},
+                countdown=rate_limit.requeue_delay(wait), queue=queue_for(job.type),
+            )
+        # Their job still has a run going; they wait for it as single tasks.
+        for job, url in locked:
+            scrape_task.apply_async(
+                (job.id, url),
+                countdown=rate_limit.requeue_delay(settings.JOB_LOCK_RETRY_SECONDS), queue=queue_for(job.type),
+            )
+        deferred = f"{len(throttled)} throttled, {len(locked)} waiting for a previous run"
+        if not pending:
+            return task_result(RunStatus.COMPLETED, None, f"Batch scrape: nothing to fetch, {deferred}")
+        try:
+            return task_result(RunStatus.COMPLETED, None, _scrape_batch(session, pending) + f", {deferred}")
+        finally:
+            for lease in leases:
+                rate_limit.release(lease)
+
+
+def _finish_runs(pending: List[Tuple[Job, str]], runs: List[JobRun]) -> None:
+    """Release the run locks of the batch's saved, finished runs; retrying runs keep theirs."""
+    for (job, _), run in zip(pending, runs):
+        if run.finished_at is not None:
+            job_locks.finish_run(job)
+
 
+def _scrape_batch(session: Session, pending: List[Tuple[Job, str]]) -> str:
+    """Fetch and record the admitted ``(job, url)`` pairs of a batch."""
+    runs = [_new_run(job) for job, _ in pending]
+    _save_runs(session, runs)
+
+    failed = 0
+    specs: Dict[int, ScrapeSpec] = {}
+    for index, ((job, url), run) in enumerate(zip(pending, runs)):
+        try:
+            specs[index] = scrape_spec(job)
+        except ValueError as e:
+            failed += 1
+            summary = f"Failed to scrape {url}: invalid extraction configuration: {e}"
+            run.logs = f"Error: {summary}"
+            _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary, commit=False)
+    to_fetch = list(specs)
+    keys = {index: cache_key(pending[index][1], specs[index]) for index in to_fetch}
+    validators = load_validators(session, keys.values())
+    # Not holding a connection while the pages download, as in scrape_task.
+    session.commit()
+
+    def open_reader(position: int, response: httpx.Response) -> BodyReader:
+        index = to_fetch[position]
+        return BodyReader(validators, pending[index][1], response.encoding, specs[index])
+
+    user_agent = resources.random_user_agent()
+    try:
+        results = aio.run(fetch_many(
+            [pending[index][1] for index in to_fetch],
+            resources.async_client(),
+            request_headers=[
+                {"User-Agent": user_agent, **conditional_headers(validators.get(keys[index]))} for index in to_fetch
+            ],
+            open_reader=open_reader,
+        )) if to_fetch else []
+    except Exception as e:
+        # fetch_many reports per-URL failures itself; this is the loop or the
+        # client failing. Finish the batch's runs rather than leave them
+        # RUNNING with their run locks held.
+        logger.exception(f"Batch scrape of {len(to_fetch)} page(s) failed")
+        for index in to_fetch:
+            (job, url), run = pending[index], runs[index]
+            summary = f"Failed to scrape {url}: {str(e) or e.__class__.__name__}"
+            run.logs = f"Error: {summary}"
+            _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary, commit=False)
+        _save_runs(session, runs)
+        _finish_runs(pending, runs)
+        return f"Batch scrape: 0 succeeded, {len(pending)} failed, 0 retrying"
+
+    retries: List[Tuple[Job, str, JobRun, float]] = []
+    for index, result in zip(to_fetch, results):
+        (job, url), run = pending[index], runs[index]
+        if result.error:
+            delay = _schedule_retry(session, job, run, result.exception)
+            if delay is not None:
+                retries.append((job, url, run, delay))
+                continue
+            failed += 1
+            summary = f"Failed to scrape {url}: {result.error}"
+            _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary, commit=False)
+            continue
+        summary, logs, metrics = result.reader.finish(session, result.status_code, result.headers)
+        _record_output(run, logs, metrics)
+        _update_job_after_run(session, job, run, RunStatus.COMPLETED, 0, summary, commit=False)
+    _save_runs(session, runs)
+    _finish_runs(pending, runs)
+
+    # Retryable failures leave the batch and come back as single scrape
+    # tasks after their backoff, continuing the same run.
+    for job, url, run, delay in retries:
+        scrape_task.apply_async((job.id, url), {"run_key": run.run_key}, countdown=delay, queue=queue_for(job.type))
+
+    succeeded = len(pending) - failed - len(retries)
+    return f"Batch scrape: {succeeded} succeeded, {failed} failed, {len(retries)} retrying"
+
+
+@celery_app.task(acks_late=True, bind=True, max_retries=None, ignore_result=ignore_persisted())
+def crawl_task(self, job_id: int, url: str) -> Any:
+    """
+    Start a crawl for a scraper job with ``configuration["crawl"]``: create
+    its ``JobRun`` and queue the first wave (see ``app.worker.crawl``). The
+    job's run lock is held until the last wave has been collected.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        job = session.get(Job, job_id)
+        if not job:
+            return task_result(RunStatus.FAILED, job_id, f"Crawl of {url}: job {job_id} not found")
+        if not job_locks.acquire_run(job):
+            raise _wait_for_lock(self)
+
+        run = _new_run(job)
+        root = normalize_url(url, "")
+        try:
+            crawl = crawl_settings(job.configuration)
+            scrape_spec(job)
+            if root is None:
+                raise ValueError(f"not an http(s) URL: {url!r}")
+        except ValueError as e:
+            summary = f"Failed to crawl {url}: {e}"
+            run.logs = f"Error: {summary}"
+            _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary)
+            return task_result(RunStatus.FAILED, job_id, summary)
+
+        run.metrics = {
+            "crawl": {
+                "root": root,
+                "max_depth": crawl.max_depth,
+                "max_pages": crawl.max_pages,
+                "depth": 0,
+                "pages": 0,
+                "failed": 0,
+                "frontier": 1,
+            },
+            "pages": [],
+        }
+        session.add(run)
+        session.commit()
+
+    seen = SeenUrls()
+    seen.add(root)
+    _dispatch_crawl_wave(run.id, job_id, root, [root], 0, seen)
+    return task_result(RunStatus.RUNNING, job_id, f"Crawl of {root} started (run {run.id})")
+
+
+def _dispatch_crawl_wave(run_id: int, job_id: int, root: str, urls: List[str], depth: int, seen: SeenUrls) -> None:
+    """Fan one depth level out as page tasks, collected by one chord callback."""
+    queue = queue_for(JobType.SCRAPER)
+    header = group(crawl_page_task.s(job_id, url, depth).set(queue=queue) for url in urls)
+    callback = crawl_collect_task.s(run_id, job_id, root, depth, seen.dumps()).set(queue=queue)
+    # A failed page task or callback means the callback never finishes the
+    # run, so the errback does, releasing the job's run lock.
+    callback.on_error(crawl_failed_task.s(run_id, job_id))
+    chord(header)(callback)
+
+
+@celery_app.task(acks_late=True, bind=True, max_retries=None)
+def crawl_page_task(self, job_id: int, url: str, depth: int, attempt: int = 0) -> Dict[str, Any]:
+    """
+    Fetch and extract one crawl page. Errors are returned, not raised, so a
+    bad page can't fail the wave's chord; throttling and retryable errors
+    re-queue the task like ``scrape_task`` does.
+    """
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+    if job is None:
+        return {"url": url, "depth": depth, "error": f"job {job_id} not found"}
+
+    wait, lease = _throttle(job, url)
+    if lease is None:
+        raise self.retry(countdown=rate_limit.requeue_delay(wait))
+
+    try:
+        spec = scrape_spec(job)
+        headers = {"User-Agent": resources.random_user_agent()}
+        response = aio.run(stream_into(
+            resources.async_client(), url, headers,
+            lambda r: StreamingPage(r.encoding, spec, extractor=crawl_extractor(spec)),
+        ))
+        result, links = split_links(spec, response.reader.result())
+        content_length = reported_length(response.headers, response.reader.bytes_read)
+        _, _, metrics = spec.build_output(url, response.status_code, content_length, result)
+        return {
+            "url": url,
+            "depth": depth,
+            "entry": page_entry(url, depth, response.status_code, metrics),
+            "links": links,
+        }
+    except Exception as e:
+        try:
+            policy = retry_policy(job)
+        except ValueError:
+            policy = None
+        if policy is not None and is_retryable(e, policy) and attempt < policy.max_retries:
+            raise self.retry(countdown=backoff_delay(policy, attempt, e), kwargs={"attempt": attempt + 1})
+        return {"url": url, "depth": depth, "error": (str(e) or e.__class__.__name__).splitlines()[0]}
+    finally:
+        rate_limit.release(lease)
+
+
+@celery_app.task(acks_late=True, ignore_result=ignore_persisted())
+def crawl_collect_task(
+    results: List[Dict[str, Any]], run_id: int, job_id: int, root: str, depth: int, seen_data: str
+) -> Any:
+    """
+    Chord callback for a crawl wave: merge its pages into the run, then queue
+    the next depth level or finish the run.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        run = session.get(JobRun, run_id)
+        job = session.get(Job, job_id)
+        if run is None or job is None or run.status != RunStatus.RUNNING:
+            return task_result(RunStatus.FAILED, job_id, f"Crawl run {run_id}: no longer running")
+
+        metrics = dict(run.metrics or {})
+        state = dict(metrics.get("crawl", {}))
+        pages = list(metrics.get("pages", []))
+        links: List[Tuple[str, str]] = []
+        for result in results:
+            if result.get("error"):
+                state["failed"] = state.get("failed", 0) + 1
+                pages.append({"url": result["url"], "depth": result["depth"], "error": result["error"]})
+            else:
+                pages.append(result["entry"])
+                links.extend((result["url"], href) for href in result["links"])
+
+        try:
+            crawl = crawl_settings(job.configuration)
+        except ValueError:
+            crawl = None
+        seen = SeenUrls.loads(seen_data)
+        frontier: List[str] = []
+        if crawl is not None and depth < crawl.max_depth:
+            frontier = next_frontier(crawl, root, seen, links, crawl.max_pages - len(pages))
+
+        state.update({"depth": depth, "pages": len(pages), "frontier": len(frontier), "seen": len(seen)})
+        metrics["crawl"] = state
+        metrics["pages"] = pages
+        run.metrics = metrics
+
+        if frontier:
+            session.add(run)
+            session.commit()
+            _dispatch_crawl_wave(run_id, job_id, root, frontier, depth + 1, seen)
+            return task_result(
+                RunStatus.RUNNING, job_id, f"Crawl run {run_id}: depth {depth} done, {len(frontier)} pages queued"
+            )
+
+        failed = state.get("failed", 0)
+        fetched = len(pages) - failed
+        run.logs = "\n".join(
+            f"[depth {page['depth']}] {page['url']}: " + (page.get("error") or f"HTTP {page.get('status_code')}")
+            for page in pages
+        )
+        summary = f"Crawled {root}: {fetched} pages fetched, {failed} failed, {depth + 1} levels"
+        status = RunStatus.COMPLETED if fetched else RunStatus.FAILED
+        _update_job_after_run(session, job, run, status, 0 if fetched else 1, summary)
+        return task_result(status, job_id, summary)
+
+
+@celery_app.task
+def crawl_failed_task(request, exc, traceback, run_id: int, job_id: int) -> None:
+    """Errback for a crawl wave's chord: fail the run if the wave's callback didn't finish it."""
+    with Session(engine, expire_on_commit=False) as session:
+        run = session.get(JobRun, run_id)
+        job = session.get(Job, job_id)
+        if run is None or job is None or run.status != RunStatus.RUNNING:
+            return
+        summary = f"Crawl run {run_id} failed: {(str(exc) or exc.__class__.__name__).splitlines()[0]}"
+        run.logs = f"Error: {summary}"
+        _update_job_after_run(session, job, run, RunStatus.FAILED, 1, summary)
@@ -0,0 +1,139 @@
+"""
+Run output inline in ``JobRun`` vs offloaded to the artifact store.
+
+Records ``--runs`` crawl-like runs of ``--pages`` pages each (the page list in
+``metrics["pages"]``, one log line per page) twice: inline, as before, and
+offloaded by ``app.worker.artifacts``. Reports the average run row size, the
+size and time of a ``read_job_runs`` response (50 runs), and the time a
+downstream step takes to count the pages that returned HTTP 200: decoding the
+run's metrics JSON vs searching the memory-mapped artifact. Uses
+``DATABASE_URL`` (a throwaway SQLite file by default) and a throwaway
+artifact directory.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_artifacts --runs 50 --pages 2000
+    python -m benchmarks.bench_artifacts --compress
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_artifacts.db")
+
+from sqlmodel import Session, SQLModel, select  # noqa: E402
+
+import app.models.scrape  # noqa: E402,F401
+import app.models.user  # noqa: E402,F401
+from app.core.config import settings  # noqa: E402
+from app.core.db import engine  # noqa: E402
+from app.models.artifact import Artifact  # noqa: E402
+from app.models.job import Job, JobType  # noqa: E402
+from app.models.run import JobRun, JobRunRead, RunStatus  # noqa: E402
+from app.worker import artifacts  # noqa: E402
+from app.worker.run_events import new_run_key  # noqa: E402
+
+
+def crawl_output(pages: int, rng: random.Random):
+    entries = [
+        {
+            "url": f"https://shop.example.com/catalogue/item-{index}",
+            "depth": rng.randint(0, 3),
+            "status_code": rng.choice((200, 200, 200, 200, 404, 500)),
+            "title": f"Item {index} | Example Shop - Best prices online",
+            "links_count": rng.randint(10, 300),
+            "content_length": rng.randint(5_000, 200_000),
+        }
+        for index in range(pages)
+    ]
+    logs = "\n".join(f"[depth {page['depth']}] {page['url']}: HTTP {page['status_code']}" for page in entries)
+    return entries, logs
+
+
+def record_runs(job_id: int, runs: int, pages: int, offload: bool) -> None:
+    rng = random.Random(1)
+    with Session(engine) as session:
+        for _ in range(runs):
+            entries, logs = crawl_output(pages, rng)
+            run = JobRun(
+                job_id=job_id, run_key=new_run_key(), status=RunStatus.COMPLETED,
+                summary=f"Crawled: {pages} pages", logs=logs,
+                metrics={"crawl": {"pages": pages}, "pages": entries},
+            )
+            if offload:
+                artifacts.offload(session, run)
+            session.add(run)
+        session.commit()
+
+
+def row_bytes(job_id: int) -> float:
+    with Session(engine) as session:
+        runs = session.exec(select(JobRun).where(JobRun.job_id == job_id)).all()
+        return sum(len(json.dumps(run.metrics)) + len(run.logs or "") for run in runs) / len(runs)
+
+
+def read_job_runs(job_id: int):
+    """Bytes and seconds for the endpoint's query plus response serialization."""
+    started = time.perf_counter()
+    with Session(engine) as session:
+        runs = session.exec(
+            select(JobRun).where(JobRun.job_id == job_id).order_by(JobRun.started_at.desc()).limit(50)
+        ).all()
+        body = json.dumps([JobRunRead.model_validate(run).model_dump(mode="json") for run in runs])
+    return len(body), time.perf_counter() - started
+
+
+def count_ok_inline(job_id: int):
+    started = time.perf_counter()
+    with Session(engine) as session:
+        metrics = session.exec(select(JobRun.metrics).where(JobRun.job_id == job_id)).all()
+        ok = sum(1 for run_metrics in metrics for page in run_metrics["pages"] if page["status_code"] == 200)
+    return ok, time.perf_counter() - started
+
+
+def count_ok_artifacts(job_id: int):
+    started = time.perf_counter()
+    ok = 0
+    with Session(engine) as session:
+        stored = session.exec(select(Artifact).where(Artifact.job_id == job_id, Artifact.name == "pages")).all()
+        for artifact in stored:
+            with artifacts.open_artifact(artifact) as reader:
+                ok += sum(1 for _ in reader.matching_lines(b'"status_code":200'))
+    return ok, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--compress", action="store_true", help="gzip artifacts (ARTIFACT_COMPRESS)")
+    args = parser.parse_args()
+
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+    settings.ARTIFACT_DIR = tempfile.mkdtemp()
+    settings.ARTIFACT_COMPRESS = args.compress
+    with Session(engine) as session:
+        inline_job, offload_job = Job(name="inline", type=JobType.SCRAPER), Job(name="offload", type=JobType.SCRAPER)
+        session.add_all([inline_job, offload_job])
+        session.commit()
+        inline_id, offload_id = inline_job.id, offload_job.id
+    record_runs(inline_id, args.runs, args.pages, offload=False)
+    record_runs(offload_id, args.runs, args.pages, offload=True)
+
+    print(f"{args.runs} runs x {args.pages} pages, artifacts {'gzipped' if args.compress else 'uncompressed'}\n")
+    print(f"{'':>10} {'row KB':>8} {'runs API KB':>12} {'runs API ms':>12} {'count 200 ms':>13}")
+    for label, job_id, count in (("inline", inline_id, count_ok_inline), ("artifacts", offload_id, count_ok_artifacts)):
+        size, seconds = read_job_runs(job_id)
+        ok, count_seconds = count(job_id)
+        print(
+            f"{label:>10} {row_bytes(job_id) / 1024:>8.1f} {size / 1024:>12.1f} "
+            f"{seconds * 1000:>12.1f} {count_seconds * 1000:>13.1f}   ({ok} pages with HTTP 200)"
+        )
+
+
+if __name__ == "__main__":
+    main()
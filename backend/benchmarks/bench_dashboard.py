@@ -0,0 +1,188 @@
+"""
+Dashboard endpoints over a growing ``JobRun`` table: rollups and SQL aggregation vs loading rows.
+
+Seeds ``--runs`` runs (1M by default) spread over the last ``--span-days``
+days, in ``--checkpoints`` equal steps, rebuilding the run rollups after
+each (see ``app.worker.rollups``). At each checkpoint it times
+``/dashboard/summary``, ``/dashboard/runs-per-day`` (from the daily
+rollups) and an hourly job trend, and measures their peak Python memory
+(``tracemalloc``). For comparison it also runs runs-per-day as a GROUP BY
+over ``JobRun`` and the original implementations, which loaded every job,
+pipeline and run in the window to count them in Python. The rollup
+endpoints should stay flat as the table grows. Uses ``DATABASE_URL`` (a
+throwaway SQLite file by default).
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_dashboard --runs 1000000 --checkpoints 4
+    python -m benchmarks.bench_dashboard --skip-legacy
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_dashboard.db")
+
+from sqlalchemy import func, insert  # noqa: E402
+from sqlmodel import Session, SQLModel, select  # noqa: E402
+
+import app.models.scrape  # noqa: E402,F401
+import app.models.user  # noqa: E402,F401
+from app.api.v1.endpoints.dashboard import _failed, dashboard_summary, job_trend, runs_per_day  # noqa: E402
+from app.core.db import as_datetime, date_trunc, engine  # noqa: E402
+from app.models.job import Job, JobType  # noqa: E402
+from app.models.pipeline import Pipeline, PipelineStatus  # noqa: E402
+from app.models.run import JobRun, RunStatus  # noqa: E402
+from app.worker import rollups  # noqa: E402
+
+JOBS = 200
+INSERT_BATCH = 50_000
+
+
+def legacy_summary(session: Session) -> Dict[str, Any]:
+    """``dashboard_summary`` before SQL aggregation."""
+    total_jobs = session.exec(select(Job)).all()
+    total_pipelines = session.exec(select(Pipeline)).all()
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    todays_runs = session.exec(select(JobRun).where(JobRun.started_at >= today_start)).all()
+    failures_today = [r for r in todays_runs if r.exit_code and r.exit_code != 0]
+    failure_rate = len(failures_today) / len(todays_runs) * 100 if todays_runs else 0.0
+    active = [p for p in total_pipelines if p.status in {PipelineStatus.RUNNING, PipelineStatus.DEGRADED}]
+    return {
+        "total_jobs": len(total_jobs),
+        "active_pipelines": len(active),
+        "todays_runs": len(todays_runs),
+        "failure_rate": round(failure_rate, 2),
+    }
+
+
+def legacy_runs_per_day(session: Session, days: int) -> List[Dict[str, Any]]:
+    """``runs_per_day`` before SQL aggregation."""
+    start = datetime.utcnow() - timedelta(days=days)
+    runs = session.exec(select(JobRun).where(JobRun.started_at >= start)).all()
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for r in runs:
+        day = r.started_at.date().isoformat()
+        bucket = buckets.setdefault(day, {"date": day, "total": 0, "failed": 0})
+        bucket["total"] += 1
+        if r.exit_code and r.exit_code != 0:
+            bucket["failed"] += 1
+    return [
+        buckets.get(day, {"date": day, "total": 0, "failed": 0})
+        for day in ((start + timedelta(days=i)).date().isoformat() for i in range(days))
+    ]
+
+
+def scan_runs_per_day(session: Session, days: int) -> List[Dict[str, Any]]:
+    """``runs_per_day`` as a GROUP BY over ``JobRun``, before rollups."""
+    start = datetime.utcnow() - timedelta(days=days)
+    day_of = date_trunc(session, "day", JobRun.started_at)
+    rows = session.exec(
+        select(day_of, func.count(), _failed).where(JobRun.started_at >= start).group_by(day_of)
+    ).all()
+    return [
+        {"date": as_datetime(day_start).date().isoformat(), "total": total, "failed": failed}
+        for day_start, total, failed in rows
+    ]
+
+
+def seed_jobs(session: Session) -> List[int]:
+    jobs = [Job(name=f"job-{index}", type=JobType.CUSTOM) for index in range(JOBS)]
+    session.add_all(jobs)
+    session.add_all(Pipeline(name=f"pipeline-{index}", status=PipelineStatus.IDLE) for index in range(20))
+    session.commit()
+    return [job.id for job in jobs]
+
+
+def seed_runs(job_ids: List[int], count: int, span_days: int, rng: random.Random) -> None:
+    now = datetime.utcnow()
+    span_seconds = span_days * 86400
+    with engine.begin() as connection:
+        for offset in range(0, count, INSERT_BATCH):
+            rows = []
+            for _ in range(min(INSERT_BATCH, count - offset)):
+                started_at = now - timedelta(seconds=rng.uniform(0, span_seconds))
+                failed = rng.random() < 0.05
+                duration_ms = rng.randint(50, 30_000)
+                rows.append({
+                    "job_id": rng.choice(job_ids),
+                    "status": RunStatus.FAILED if failed else RunStatus.COMPLETED,
+                    "started_at": started_at,
+                    "finished_at": started_at + timedelta(milliseconds=duration_ms),
+                    "duration_ms": duration_ms,
+                    "exit_code": 1 if failed else 0,
+                    "attempts": 1,
+                    "metrics": {},
+                })
+            connection.execute(insert(JobRun), rows)
+
+
+def measure(call: Callable[[Session], Any]):
+    """Seconds and peak traced MB for one call on a fresh session."""
+    with Session(engine) as session:
+        tracemalloc.start()
+        started = time.perf_counter()
+        call(session)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=1_000_000)
+    parser.add_argument("--checkpoints", type=int, default=4)
+    parser.add_argument("--span-days", type=int, default=90)
+    parser.add_argument("--days", type=int, default=30, help="runs-per-day window")
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(args.seed)
+    with Session(engine) as session:
+        job_ids = seed_jobs(session)
+
+    trend_job = job_ids[0]
+    cases = [
+        ("summary", lambda session: dashboard_summary(session=session, current_user=None)),
+        ("runs-per-day", lambda session: runs_per_day(days=args.days, session=session, current_user=None)),
+        ("job trend (hourly)", lambda session: job_trend(
+            trend_job, granularity=rollups.Granularity.HOUR, days=args.days, session=session, current_user=None
+        )),
+        ("runs-per-day (scan)", lambda session: scan_runs_per_day(session, args.days)),
+    ]
+    if not args.skip_legacy:
+        cases += [
+            ("summary (legacy)", legacy_summary),
+            ("runs-per-day (legacy)", lambda session: legacy_runs_per_day(session, args.days)),
+        ]
+
+    print(f"runs spread over {args.span_days} days, runs-per-day over {args.days} days\n")
+    print(f"{'runs':>10} {'endpoint':>22} {'ms':>9} {'peak MB':>8}")
+    seeded = 0
+    step = args.runs // args.checkpoints
+    for checkpoint in range(args.checkpoints):
+        count = step if checkpoint < args.checkpoints - 1 else args.runs - seeded
+        seed_runs(job_ids, count, args.span_days, rng)
+        seeded += count
+        # Seeded rows bypass _update_job_after_run, so the rollups are rebuilt.
+        started = time.perf_counter()
+        with Session(engine) as session:
+            rollups.rebuild(session)
+            session.commit()
+        print(f"{seeded:>10} {'(rollup rebuild)':>22} {(time.perf_counter() - started) * 1000:>9.1f}")
+        for name, call in cases:
+            seconds, peak_mb = measure(call)
+            print(f"{seeded:>10} {name:>22} {seconds * 1000:>9.1f} {peak_mb:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
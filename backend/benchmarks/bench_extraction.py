@@ -0,0 +1,123 @@
+"""
+HTML extraction benchmark: full BeautifulSoup tree vs. targeted extractor.
+
+Generates a corpus of large HTML documents with different shapes and, for
+each, measures CPU time and peak traced memory of the previous
+``BeautifulSoup(..., "html.parser")`` extraction and of ``extract_page``.
+The app no longer depends on BeautifulSoup; install it to run this
+benchmark (``pip install beautifulsoup4``).
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_extraction --sizes-kb 100 1000 5000
+"""
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from app.worker.extraction import extract_page  # noqa: E402
+
+
+def legacy_extract(html: str) -> Dict[str, Any]:
+    """Extraction as done before the targeted parser."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title else "No title found"
+    links = [a.get("href", "") for a in soup.find_all("a", href=True)][:20]
+    images = [img.get("src", "") for img in soup.find_all("img", src=True)][:10]
+    meta_description = ""
+    meta_tag = soup.find("meta", attrs={"name": "description"})
+    if meta_tag:
+        meta_description = meta_tag.get("content", "")
+    paragraphs = soup.find_all("p")
+    first_paragraph = paragraphs[0].get_text(strip=True)[:200] if paragraphs else ""
+    return {
+        "title": title,
+        "meta_description": meta_description,
+        "links": links,
+        "images": images,
+        "first_paragraph": first_paragraph,
+    }
+
+
+def _document(body_unit: Callable[[int], str], size_kb: int) -> str:
+    head = (
+        "<!doctype html><html><head><title>Fixture</title>"
+        '<meta name="description" content="Benchmark fixture"></head><body>'
+    )
+    parts: List[str] = [head]
+    length = len(head)
+    i = 0
+    while length < size_kb * 1024:
+        unit = body_unit(i)
+        parts.append(unit)
+        length += len(unit)
+        i += 1
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def corpus(size_kb: int) -> List[Tuple[str, str]]:
+    return [
+        (
+            "article",
+            _document(
+                lambda i: f'<p>Paragraph {i} with <a href="/a/{i}">a link</a> and <img src="/i/{i}.jpg"></p>',
+                size_kb,
+            ),
+        ),
+        (
+            "link-list",
+            _document(lambda i: f'<li><a href="/item/{i}">Item {i}</a> <img src="/i/{i}.png"></li>', size_kb),
+        ),
+        (
+            "text-heavy",
+            _document(lambda i: f"<p>Paragraph {i}. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>", size_kb),
+        ),
+        (
+            "sparse-media",
+            # Links/images are rare and there are no paragraphs: nothing stops the extractor early.
+            _document(
+                lambda i: (f'<div class="row"><span>{i}</span></div>' if i % 2000 else f'<a href="/{i}">x</a><img src="{i}">'),
+                size_kb,
+            ),
+        ),
+    ]
+
+
+def measure(fn: Callable[[str], Dict[str, Any]], html: str) -> Tuple[float, float]:
+    """CPU milliseconds (untraced run) and peak traced MiB (separate run)."""
+    gc.collect()
+    start = time.process_time()
+    fn(html)
+    cpu_ms = (time.process_time() - start) * 1000
+
+    gc.collect()
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / (1024 * 1024)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'document':>14} {'KB':>6} {'soup ms':>9} {'soup MB':>8} {'extract ms':>11} {'extract MB':>11}")
+    for size_kb in args.sizes_kb:
+        for name, html in corpus(size_kb):
+            soup_ms, soup_mb = measure(legacy_extract, html)
+            ext_ms, ext_mb = measure(extract_page, html)
+            print(f"{name:>14} {size_kb:>6} {soup_ms:>9.1f} {soup_mb:>8.1f} {ext_ms:>11.1f} {ext_mb:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+I/O execution mode benchmark: one blocking fetch per process vs coroutines.
+
+Simulates N single-URL scrape tasks against a local server with a fixed
+latency per request. ``prefork`` runs them one at a time per process, as a
+prefork child does; ``asyncio`` runs them from a thread pool of carriers
+whose fetches all go through the process's I/O loop (``app.worker.aio``), as
+a ``threads``-pool worker on the I/O queue does. Reports tasks per second
+for a single process. No database is used.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_io_mode --tasks 500 --latency-ms 100 --concurrency 20
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings  # noqa: E402
+from app.worker import aio, resources  # noqa: E402
+from app.worker.scraping import StreamingPage, stream_into  # noqa: E402
+from benchmarks.bench_scrape import local_server, make_page  # noqa: E402
+
+
+def scrape(url: str) -> None:
+    headers = {"User-Agent": resources.random_user_agent()}
+    response = aio.run(stream_into(resources.async_client(), url, headers, lambda r: StreamingPage(r.encoding)))
+    response.reader.result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--latency-ms", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    settings.WORKER_IO_CONCURRENCY = args.concurrency
+
+    with local_server(make_page(), args.latency_ms) as base_url:
+        urls = [f"{base_url}/page/{i}" for i in range(args.tasks)]
+        scrape(urls[0])  # warm up
+
+        print(f"{'mode':>8} {'tasks':>6} {'seconds':>8} {'tasks/s':>8}")
+        prefork_urls = urls[: max(args.tasks // 10, 1)]
+        start = time.perf_counter()
+        for url in prefork_urls:
+            scrape(url)
+        elapsed = time.perf_counter() - start
+        print(f"{'prefork':>8} {len(prefork_urls):>6} {elapsed:>8.2f} {len(prefork_urls) / elapsed:>8.1f}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as carriers:
+            list(carriers.map(scrape, urls))
+        elapsed = time.perf_counter() - start
+        print(f"{'asyncio':>8} {args.tasks:>6} {elapsed:>8.2f} {args.tasks / elapsed:>8.1f}")
+    resources.shutdown()
+
+
+if __name__ == "__main__":
+    main()
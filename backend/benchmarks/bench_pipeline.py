@@ -0,0 +1,166 @@
+"""
+Pipeline latency benchmark: DAG execution vs its critical path.
+
+Builds a layered pipeline (``--layers`` x ``--width`` steps, each depending
+on one to three steps of the layer before) whose steps are jobs that sleep
+for a random 0.1-0.5s, and runs it on an in-process Celery worker (memory
+broker, thread pool). Reports the run's wall time next to its critical path
+and the sum of its step durations, i.e. what running the steps one after the
+other would take. With ``--rerun`` the last step's job is then changed and the
+pipeline run again, which should only re-run that step (see
+``app.worker.step_cache``). Uses ``DATABASE_URL`` (a throwaway SQLite file by
+default) and a throwaway step cache.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_pipeline --layers 4 --width 4 --concurrency 16
+    python -m benchmarks.bench_pipeline --layers 10 --width 1 --rerun
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_pipeline.db")
+
+from celery.signals import task_prerun  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+import app.models.scrape  # noqa: E402,F401
+import app.models.user  # noqa: E402,F401
+from app.core.config import settings  # noqa: E402
+from app.core.db import engine  # noqa: E402
+from app.models.job import Job, JobType  # noqa: E402
+from app.models.pipeline import Pipeline  # noqa: E402
+from app.models.run import PipelineRun, RunStatus  # noqa: E402
+from app.worker import registry  # noqa: E402
+from app.worker.celery_app import celery_app, record_queue_wait  # noqa: E402
+from app.worker.pipelines import critical_path_ms, parse_steps, start_pipeline  # noqa: E402
+from app.worker.results import task_result  # noqa: E402
+from app.worker.routing import all_queues  # noqa: E402
+from app.worker.tasks import _new_run, _save_runs, _update_job_after_run  # noqa: E402
+
+
+@celery_app.task(acks_late=True)
+def sleep_task(job_id: int, name: str):
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        seconds = job.configuration["seconds"]
+        run = _new_run(job)
+        _save_runs(session, [run])
+        time.sleep(seconds)
+        _update_job_after_run(session, job, run, RunStatus.COMPLETED, 0, f"{name} slept")
+    return task_result(RunStatus.COMPLETED, job_id, f"{name} slept")
+
+
+def start_worker(concurrency: int) -> None:
+    worker = celery_app.Worker(
+        pool="threads", concurrency=concurrency, queues=all_queues(), loglevel="ERROR", quiet=True,
+        redirect_stdouts=False, without_heartbeat=True, without_mingle=True, without_gossip=True,
+    )
+    threading.Thread(target=worker.start, daemon=True).start()
+
+
+def serialize_sqlite_transactions() -> None:
+    """SQLite ignores the callbacks' row lock; take the write lock up front instead."""
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    engine.dispose()
+
+
+def build_steps(session: Session, layers: int, width: int, rng: random.Random):
+    """Steps and their sleep times in ms."""
+    steps = []
+    sleeps = {}
+    previous = []
+    for layer in range(layers):
+        current = []
+        for index in range(width):
+            name = f"l{layer}-s{index}"
+            job = Job(
+                name=name, type=JobType.CUSTOM,
+                configuration={"seconds": round(rng.uniform(0.1, 0.5), 2), "overlap": "allow"},
+            )
+            session.add(job)
+            session.flush()
+            depends_on = rng.sample(previous, min(len(previous), rng.randint(1, 3))) if previous else []
+            steps.append({"name": name, "job_id": job.id, "depends_on": depends_on})
+            sleeps[name] = int(job.configuration["seconds"] * 1000)
+            current.append(name)
+        previous = current
+    return steps, sleeps
+
+
+def run_to_end(session: Session, pipeline: Pipeline):
+    """Run ``pipeline``; returns the finished ``PipelineRun`` and the wall time in ms."""
+    start = time.perf_counter()
+    run = start_pipeline(session, pipeline)
+    session.commit()  # end the read transaction, which holds SQLite's write lock here
+    while True:
+        with Session(engine) as poll:
+            run = poll.get(PipelineRun, run.id)
+            if run.status != RunStatus.RUNNING:
+                return run, (time.perf_counter() - start) * 1000
+        time.sleep(0.02)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rerun", action="store_true", help="change the last step and run again")
+    args = parser.parse_args()
+
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+    settings.JOB_LOCK_BACKEND = "local"
+    settings.PIPELINE_CACHE_DIR = tempfile.mkdtemp()
+    if engine.url.get_backend_name() == "sqlite":
+        serialize_sqlite_transactions()
+    celery_app.conf.update(
+        broker_url="memory://",
+        broker_transport_options={**celery_app.conf.broker_transport_options, "polling_interval": 0.005},
+        result_backend="cache+memory://",
+        task_always_eager=False,
+    )
+    # Queue wait stats live in the broker's Redis.
+    task_prerun.disconnect(record_queue_wait)
+    registry.register(JobType.CUSTOM, sleep_task)
+    start_worker(args.concurrency)
+
+    with Session(engine, expire_on_commit=False) as session:
+        steps, sleeps = build_steps(session, args.layers, args.width, random.Random(args.seed))
+        pipeline = Pipeline(name="bench", steps=steps)
+        session.add(pipeline)
+        session.commit()
+        run, elapsed_ms = run_to_end(session, pipeline)
+
+        print(f"{args.layers * args.width} steps, {args.concurrency} worker threads: {run.summary}\n")
+        print(f"{'wall time':>16} {elapsed_ms:>8.0f} ms")
+        print(f"{'critical path':>16} {run.metrics['critical_path_ms']:>8} ms")
+        print(f"{'  of sleeps only':>16} {critical_path_ms(parse_steps(steps), sleeps):>8} ms")
+        print(f"{'sum of steps':>16} {run.metrics['sum_of_steps_ms']:>8} ms")
+
+        if args.rerun:
+            last = session.get(Job, steps[-1]["job_id"])
+            last.configuration = {**last.configuration, "seconds": last.configuration["seconds"] + 0.01}
+            session.add(last)
+            session.commit()
+            run, elapsed_ms = run_to_end(session, pipeline)
+            print(f"\nafter changing {last.name}: {run.summary}, cache {run.metrics['cache']}\n")
+            print(f"{'wall time':>16} {elapsed_ms:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
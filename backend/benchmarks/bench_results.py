@@ -0,0 +1,105 @@
+"""
+Celery result-backend footprint per 100k runs, before and after the result policy.
+
+Encodes the result ``scrape_task`` leaves in the backend for each run, the
+way the Redis backend stores it (``celery-task-meta-<id>`` key, JSON meta),
+under three policies: ``full`` (the run summary, as before), ``compact``
+(a ``(status, job_id)`` tuple) and ``ignored`` (the default: no result for
+tasks that record a ``JobRun``). Reports key + value bytes per 100k runs and
+how much stays resident at a given run rate until ``result_expires`` clears
+it. Per-key Redis overhead isn't included unless ``--redis-url`` is given, in
+which case a sample is written to that Redis and ``used_memory`` is measured
+(then deleted).
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_results --runs-per-second 20
+    python -m benchmarks.bench_results --redis-url redis://localhost:6379/15 --sample 10000
+"""
+import argparse
+import os
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings  # noqa: E402
+from app.worker.celery_app import celery_app  # noqa: E402
+
+RUNS = 100_000
+# Celery's own default for result_expires, in effect before the policy.
+DEFAULT_EXPIRES_SECONDS = 24 * 3600
+
+
+def summary(index: int) -> str:
+    url = f"https://shop.example.com/catalogue/category/products/item-{index}"
+    return f"Scraped {url}: Title='Item {index} | Example Shop - Best prices online', Found 148 links, 36 images"
+
+
+def encoded(result, task_id: str):
+    backend = celery_app.backend
+    meta = backend._get_result_meta(result=result, state="SUCCESS", traceback=None, request=None)
+    meta["task_id"] = task_id
+    return backend.get_key_for_task(task_id), backend.encode(meta)
+
+
+def policy_results(policy: str, index: int):
+    if policy == "full":
+        return summary(index)
+    return ("completed", index)
+
+
+def payload_bytes(policy: str) -> int:
+    if policy == "ignored":
+        return 0
+    total = 0
+    for index in range(RUNS):
+        key, value = encoded(policy_results(policy, index), uuid.uuid4().hex)
+        total += len(key) + len(value)
+    return total
+
+
+def live_bytes_per_run(redis_url: str, policy: str, sample: int) -> float:
+    import redis
+
+    if policy == "ignored":
+        return 0.0
+    client = redis.Redis.from_url(redis_url)
+    keys = []
+    before = client.info("memory")["used_memory"]
+    with client.pipeline(transaction=False) as pipe:
+        for index in range(sample):
+            key, value = encoded(policy_results(policy, index), uuid.uuid4().hex)
+            keys.append(key)
+            pipe.set(key, value, ex=DEFAULT_EXPIRES_SECONDS)
+        pipe.execute()
+    used = client.info("memory")["used_memory"] - before
+    for start in range(0, len(keys), 1000):
+        client.delete(*keys[start:start + 1000])
+    return used / sample
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs-per-second", type=float, default=20.0)
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--sample", type=int, default=10_000)
+    args = parser.parse_args()
+    celery_app.conf.result_backend = args.redis_url or "redis://localhost:6379/0"
+
+    policies = (
+        ("full", DEFAULT_EXPIRES_SECONDS),
+        ("compact", settings.CELERY_RESULT_EXPIRES_SECONDS),
+        ("ignored", settings.CELERY_RESULT_EXPIRES_SECONDS),
+    )
+    print(f"{'policy':>8} {'MB/100k runs':>13} {'TTL s':>7} {'resident MB':>12}  (at {args.runs_per_second:g} runs/s)")
+    for policy, expires in policies:
+        if args.redis_url:
+            per_run = live_bytes_per_run(args.redis_url, policy, args.sample)
+        else:
+            per_run = payload_bytes(policy) / RUNS
+        resident = per_run * args.runs_per_second * expires
+        print(f"{policy:>8} {per_run * RUNS / 1e6:>13.2f} {expires:>7} {resident / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
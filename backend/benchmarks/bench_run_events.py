@@ -0,0 +1,93 @@
+"""
+Run bookkeeping benchmark: direct writes vs the run-event writer.
+
+Records N runs the way ``test_task`` does (load the job, start a run, finish
+it) from a pool of worker threads, with no work in between, so the numbers
+are the cost of the database writes alone. ``direct`` writes and commits each
+run at start and again at finish; ``write-behind`` emits run events that a
+writer thread applies in batches (``app.worker.run_events``, local backend).
+Reports committed runs per second, counted until the last run is in the
+database. Uses ``DATABASE_URL`` (a throwaway SQLite file by default); point
+it at Postgres to see its commit latency.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_run_events --runs 2000 --workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_run_events.db")
+
+from sqlalchemy import func  # noqa: E402
+from sqlmodel import Session, SQLModel, select  # noqa: E402
+
+import app.models.scrape  # noqa: E402,F401
+import app.models.user  # noqa: E402,F401
+from app.core.config import settings  # noqa: E402
+from app.core.db import engine  # noqa: E402
+from app.models.job import Job, JobType  # noqa: E402
+from app.models.run import JobRun, RunStatus  # noqa: E402
+from app.worker import run_events  # noqa: E402
+from app.worker.tasks import _new_run, _save_runs, _update_job_after_run  # noqa: E402
+
+
+def record_run(job_id: int) -> None:
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        run = _new_run(job)
+        _save_runs(session, [run])
+        _update_job_after_run(session, job, run, RunStatus.COMPLETED, 0, "done")
+
+
+def finished_runs() -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(JobRun).where(JobRun.status != RunStatus.RUNNING)).one()
+
+
+def measure(job_ids, runs: int, workers: int) -> float:
+    before = finished_runs()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(record_run, (job_ids[i % len(job_ids)] for i in range(runs))))
+    while finished_runs() < before + runs:
+        time.sleep(0.01)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+    settings.RUN_EVENTS_BACKEND = "local"
+    settings.RUN_EVENTS_BATCH_SIZE = args.batch_size
+    settings.RUN_EVENTS_FLUSH_SECONDS = args.flush_seconds
+    with Session(engine) as session:
+        jobs = [
+            Job(name=f"bench-{i}", type=JobType.SCRAPER, schedule="* * * * *", configuration={"overlap": "allow"})
+            for i in range(args.jobs)
+        ]
+        session.add_all(jobs)
+        session.commit()
+        job_ids = [job.id for job in jobs]
+
+    print(f"{engine.url.get_backend_name()}, {args.runs} runs, {args.workers} workers\n")
+    print(f"{'mode':>12} {'seconds':>8} {'runs/s':>8}")
+    for name, write_behind in (("direct", False), ("write-behind", True)):
+        settings.RUN_WRITE_BEHIND = write_behind
+        elapsed = measure(job_ids, args.runs, args.workers)
+        print(f"{name:>12} {elapsed:>8.2f} {args.runs / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Scheduler tick latency benchmark.
+
+Seeds a throwaway SQLite database with N scheduled jobs, of which a small
+fraction are due, and times one ``check_and_enqueue_jobs`` tick against the
+previous full-scan implementation. Celery is replaced with a no-op enqueue so
+only the database work is measured.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_scheduler --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_DB_DIR = tempfile.mkdtemp(prefix="dataflow-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}"
+
+from croniter import croniter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session, SQLModel, delete, select  # noqa: E402
+
+from app.core.db import engine  # noqa: E402
+from app.models import Job, JobStatus, JobType  # noqa: E402
+from app.services import scheduler  # noqa: E402
+
+
+class _NoopTask:
+    def delay(self, *args, **kwargs):
+        return None
+
+
+def _noop_enqueue_many(signatures, chunk_size=500) -> int:
+    return sum(1 for _ in signatures)
+
+
+def legacy_check_and_enqueue_jobs() -> None:
+    """The pre-index implementation: full table scan, one commit per job."""
+    with Session(engine) as session:
+        jobs = session.exec(select(Job)).all()
+        now = datetime.utcnow()
+        for job in jobs:
+            if not job.schedule:
+                continue
+            if job.next_run_at and job.next_run_at <= now:
+                _NoopTask().delay(job.id, job.name)
+                job.last_run_at = now
+                job.status = JobStatus.RUNNING
+                job.next_run_at = croniter(job.schedule, now).get_next(datetime)
+                session.add(job)
+                session.commit()
+
+
+def seed(n: int, due_fraction: float) -> None:
+    now = datetime.utcnow()
+    due_every = max(1, int(1 / due_fraction)) if due_fraction else n + 1
+    rows = [
+        {
+            "name": f"job-{i}",
+            "type": JobType.CUSTOM,
+            "schedule": "*/5 * * * *",
+            "configuration": {},
+            "status": JobStatus.IDLE,
+            "next_run_at": now - timedelta(seconds=1) if i % due_every == 0 else now + timedelta(hours=1),
+        }
+        for i in range(n)
+    ]
+    with Session(engine) as session:
+        session.exec(delete(Job))
+        for start in range(0, n, 10_000):
+            session.exec(insert(Job), params=rows[start:start + 10_000])
+        session.commit()
+
+
+def time_tick(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--due-fraction", type=float, default=0.01)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+    scheduler.registry.enqueue_many = _noop_enqueue_many
+
+    print(f"{'jobs':>8} {'due':>6} {'legacy ms':>10} {'indexed ms':>11}")
+    for n in args.sizes:
+        due = int(n * args.due_fraction)
+        legacy = "-"
+        if not args.skip_legacy:
+            seed(n, args.due_fraction)
+            legacy = f"{time_tick(legacy_check_and_enqueue_jobs):.1f}"
+        seed(n, args.due_fraction)
+        indexed = time_tick(scheduler.check_and_enqueue_jobs)
+        print(f"{n:>8} {due:>6} {legacy:>10} {indexed:>11.1f}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Dispatch-rate simulation for cron load smoothing.
+
+Replays one hour of dispatches for N jobs on the common ``*/5 * * * *`` and
+``0 * * * *`` schedules, once without a spread window and once per given
+window, and prints the resulting per-second dispatch histogram summary. No
+database or broker is touched.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_spread --jobs 10000 --windows 30 120
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings  # noqa: E402
+from app.models import Job, JobType  # noqa: E402
+from app.services.scheduler import DispatchHistogram, _next_runs  # noqa: E402
+
+SCHEDULES = ["*/5 * * * *", "0 * * * *"]
+
+
+def simulate(jobs, window: int, start: datetime, hours: int = 1) -> dict:
+    settings.SCHEDULER_SPREAD_SECONDS = window
+    histogram = DispatchHistogram(window_seconds=hours * 3600 + 3600)
+    end = start + timedelta(hours=hours)
+    next_runs = _next_runs(jobs, start)
+    by_id = {job.id: job for job in jobs}
+    while next_runs:
+        due_ids = [job_id for job_id, at in next_runs.items() if at and at <= end]
+        if not due_ids:
+            break
+        for job_id in due_ids:
+            at = next_runs[job_id]
+            histogram.record(1, at=at.timestamp())
+            next_runs[job_id] = _next_runs([by_id[job_id]], at)[job_id]
+        next_runs = {k: v for k, v in next_runs.items() if v and v <= end}
+    return histogram.snapshot()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=2_000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[30, 120])
+    args = parser.parse_args()
+
+    jobs = [
+        Job(id=i + 1, name=f"job-{i}", type=JobType.CUSTOM, schedule=SCHEDULES[i % 2], configuration={})
+        for i in range(args.jobs)
+    ]
+    start = datetime(2024, 1, 1)
+
+    print(f"{'window s':>9} {'runs':>7} {'active s':>9} {'peak/s':>7} {'mean/s':>7}")
+    for window in [0, *args.windows]:
+        summary = simulate(jobs, window, start)
+        print(
+            f"{window:>9} {summary['total_runs']:>7} {summary['active_seconds']:>9} "
+            f"{summary['peak_per_second']:>7} {summary['mean_per_active_second']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-task setup and time-to-first-byte benchmark, cold vs warm worker.
+
+Runs N single-URL fetches against a local HTTP server the way ``scrape_task``
+did before worker warm-start (a new ``UserAgent`` and a new HTTP client per
+task) and the way it does now (the process-wide resources built by
+``resources.warm_up``, fetching on the process's I/O loop). Reports the
+one-off warm-up cost and, per task, the setup time, time to first byte and
+total time. No database is used.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_warm_start --tasks 200 --latency-ms 5
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx  # noqa: E402
+from fake_useragent import UserAgent  # noqa: E402
+
+from app.worker import aio, resources  # noqa: E402
+from app.worker.scraping import StreamingPage, stream_into  # noqa: E402
+from benchmarks.bench_scrape import local_server, make_page  # noqa: E402
+
+
+def cold_task(url: str):
+    started = time.perf_counter()
+    headers = {"User-Agent": UserAgent().random}
+    request_started = time.perf_counter()
+    with httpx.stream("GET", url, follow_redirects=True, headers=headers, timeout=10.0) as response:
+        first_byte = time.perf_counter()
+        page = StreamingPage(response.encoding)
+        for chunk in response.iter_bytes():
+            if page.feed(chunk):
+                break
+        page.result()
+    return request_started - started, first_byte - request_started, time.perf_counter() - started
+
+
+def warm_task(url: str):
+    started = time.perf_counter()
+    headers = {"User-Agent": resources.random_user_agent()}
+    request_started = time.perf_counter()
+    response = aio.run(stream_into(resources.async_client(), url, headers, lambda r: StreamingPage(r.encoding)))
+    response.reader.result()
+    return request_started - started, response.first_byte_at - request_started, time.perf_counter() - started
+
+
+def summarize(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return statistics.mean(ms), ms[len(ms) // 2], ms[int(len(ms) * 0.95)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=5)
+    args = parser.parse_args()
+
+    with local_server(make_page(), args.latency_ms) as base_url:
+        urls = [f"{base_url}/page/{i}" for i in range(args.tasks)]
+
+        start = time.perf_counter()
+        resources.user_agents()
+        resources.async_client()
+        print(f"warm-up (once per process): {(time.perf_counter() - start) * 1000:.1f}ms\n")
+
+        print(f"{'mode':>5} {'metric':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, task in (("cold", cold_task), ("warm", warm_task)):
+            results = [task(url) for url in urls]
+            for index, metric in enumerate(("setup", "ttfb", "total")):
+                mean, p50, p95 = summarize([r[index] for r in results])
+                print(f"{name:>5} {metric:>8} {mean:>8.2f} {p50:>8.2f} {p95:>8.2f}")
+    resources.shutdown()
+
+
+if __name__ == "__main__":
+    main()
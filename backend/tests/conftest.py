@@ -0,0 +1,54 @@
+"""
+Shared fixtures. Tests run against a throwaway SQLite database, set up
+before ``app`` is imported; run them from ``backend/`` with::
+
+    python -m pytest
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+import pytest  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from app.core.db import engine  # noqa: E402
+
+engine.echo = False
+
+
+@pytest.fixture
+def db():
+    """Empty tables for the test, dropped afterwards."""
+    import app.models.scheduler  # noqa: F401
+
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+class Clock:
+    """A settable ``datetime.utcnow``."""
+
+    def __init__(self) -> None:
+        self.now = datetime(2026, 1, 1, 12, 0, 0)
+
+    def advance(self, seconds: float) -> None:
+        self.now += timedelta(seconds=seconds)
+
+    def patch(self, monkeypatch: pytest.MonkeyPatch, module) -> None:
+        """Make ``module.datetime.utcnow()`` return ``self.now``."""
+        clock = self
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def utcnow(cls) -> datetime:
+                return clock.now
+
+        monkeypatch.setattr(module, "datetime", FrozenDatetime)
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
@@ -0,0 +1,32 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel
+
+import app.models  # noqa: F401
+from app.core import db
+from app.models.run import JobRun
+
+
+def test_upgrade_adds_columns_and_indexes_to_existing_tables():
+    engine = db.engine
+    SQLModel.metadata.drop_all(engine)
+    with engine.begin() as connection:
+        # jobrun as the first release created it.
+        connection.execute(text(
+            "CREATE TABLE jobrun (id INTEGER PRIMARY KEY, job_id INTEGER, status VARCHAR, started_at DATETIME, "
+            "finished_at DATETIME, duration_ms INTEGER, exit_code INTEGER, summary VARCHAR, logs VARCHAR, "
+            "metrics JSON)"
+        ))
+        connection.execute(text("INSERT INTO jobrun (id, job_id, status, metrics) VALUES (1, 1, 'COMPLETED', '{}')"))
+    try:
+        db.init_db()
+        db.init_db()  # a second run is a no-op
+
+        inspector = inspect(engine)
+        assert {"attempts", "run_key"} <= {c["name"] for c in inspector.get_columns("jobrun")}
+        indexes = {index["name"] for index in inspector.get_indexes("jobrun")}
+        assert {"ix_jobrun_started_at_exit_code", "ix_jobrun_run_key"} <= indexes
+        assert "ix_job_next_run_at" in {index["name"] for index in inspector.get_indexes("job")}
+        with Session(engine) as session:
+            assert session.get(JobRun, 1).attempts == 1
+    finally:
+        SQLModel.metadata.drop_all(engine)
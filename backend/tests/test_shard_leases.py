@@ -0,0 +1,99 @@
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.scheduler import SchedulerLease, SchedulerMember
+from app.services import shard_leases
+from app.services.shard_leases import ShardLeaseManager
+
+SHARDS = 8
+LEASE_SECONDS = 30
+
+
+@pytest.fixture
+def managers(db, clock, monkeypatch):
+    """Factory for lease managers on a shared fake clock, using the lease settings."""
+    clock.patch(monkeypatch, shard_leases)
+    monkeypatch.setattr(settings, "SCHEDULER_SHARDS", SHARDS)
+    monkeypatch.setattr(settings, "SCHEDULER_LEASE_SECONDS", LEASE_SECONDS)
+    return lambda *instance_ids: [ShardLeaseManager(instance_id) for instance_id in instance_ids]
+
+
+def heartbeat_all(managers, rounds=2):
+    for _ in range(rounds):
+        for manager in managers:
+            manager.heartbeat()
+
+
+def lease_owners():
+    with Session(shard_leases.engine) as session:
+        return {lease.shard: lease.owner for lease in session.exec(select(SchedulerLease)).all()}
+
+
+def assert_partitioned(managers):
+    """Every shard is owned by exactly one manager, as the lease rows say."""
+    owned = [manager.owned for manager in managers]
+    assert set().union(*owned) == set(range(SHARDS))
+    assert sum(map(len, owned)) == SHARDS
+    assert lease_owners() == {shard: m.instance_id for m in managers for shard in m.owned}
+
+
+def test_single_instance_owns_every_shard(managers):
+    (a,) = managers("a")
+
+    assert a.heartbeat() == set(range(SHARDS))
+    assert_partitioned([a])
+
+
+def test_shards_are_split_fairly(managers):
+    instances = managers("a", "b", "c")
+
+    heartbeat_all(instances)
+
+    assert_partitioned(instances)
+    assert sorted(len(m.owned) for m in instances) == [2, 3, 3]
+
+
+def test_rebalances_when_a_member_joins(managers, clock):
+    a, b = managers("a", "b")
+    a.heartbeat()
+    assert a.owned == set(range(SHARDS))
+
+    clock.advance(1)
+    # Nothing is free yet: the newcomer waits for a to hand back its surplus.
+    assert b.heartbeat() == set()
+    clock.advance(1)
+    assert len(a.heartbeat()) == SHARDS // 2
+    clock.advance(1)
+    assert len(b.heartbeat()) == SHARDS // 2
+
+    assert_partitioned([a, b])
+
+
+def test_expired_leases_are_taken_over(managers, clock):
+    a, b = managers("a", "b")
+    heartbeat_all([a, b])
+    a_shards = set(a.owned)
+
+    # a stops heartbeating; its leases hold until SCHEDULER_LEASE_SECONDS pass.
+    clock.advance(LEASE_SECONDS - 1)
+    assert b.heartbeat().isdisjoint(a_shards)
+
+    clock.advance(1)
+    assert b.heartbeat() == set(range(SHARDS))
+    assert set(lease_owners().values()) == {"b"}
+
+
+def test_release_frees_leases_at_once(managers, clock):
+    a, b = managers("a", "b")
+    heartbeat_all([a, b])
+
+    a.release()
+
+    assert a.owned == set()
+    with Session(shard_leases.engine) as session:
+        assert session.get(SchedulerMember, "a") is None
+    assert "a" not in lease_owners().values()
+    # No waiting for the lease to expire.
+    clock.advance(1)
+    assert b.heartbeat() == set(range(SHARDS))